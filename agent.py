@@ -2,16 +2,122 @@ import os
 from mistralai import Mistral
 import discord
 import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+import httpx
+
+import metrics
+from deadlines import CALL_TIMEOUT, HedgePolicy, effective_deadline
+from ratelimit import FairSemaphore, TokenBucket, backoff_delay
+from response_cache import ResponseCache, cache_key
+from tokens import estimate_tokens
+
+logger = logging.getLogger("discord")
 
 MISTRAL_MODEL = "mistral-large-latest"
 SYSTEM_PROMPT = "You are a helpful assistant."
 
+# Model tiers and which roles use which tier. Short control steps (the search decision and
+# the moderator's continue/end call) and history summaries run on the small model by default, everything
+# else on the large one. Override with MISTRAL_ROLE_TIERS, e.g. "Search=small,Moderator=large".
+MODEL_TIERS = {
+    "large": os.getenv("MISTRAL_LARGE_MODEL", MISTRAL_MODEL),
+    "small": os.getenv("MISTRAL_SMALL_MODEL", "mistral-small-latest"),
+}
+
+
+def parse_role_tiers(value):
+    """Parse "Role=tier,..." into a dict, rejecting tiers that aren't in MODEL_TIERS"""
+    tiers = {}
+    for pair in value.split(","):
+        if "=" not in pair:
+            continue
+        role, tier = (part.strip() for part in pair.split("=", 1))
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"MISTRAL_ROLE_TIERS: unknown tier {tier!r} for {role}, expected one of {', '.join(MODEL_TIERS)}")
+        tiers[role] = tier
+    return tiers
+
+
+# Checked here so a typo fails at startup rather than on the first request for that role
+ROLE_TIERS = parse_role_tiers(os.getenv("MISTRAL_ROLE_TIERS", "Search=small,Moderator=small,Summarizer=small"))
+
+# Roles whose prompts ask for a single JSON object. Their requests use Mistral's JSON mode
+# so the reply always parses.
+JSON_ROLES = {"Moderator"}
+
+# Client-side limits, kept a little under the workspace quota
+MAX_REQUESTS_PER_SECOND = float(os.getenv("MISTRAL_REQUESTS_PER_SECOND", "1"))
+MAX_TOKENS_PER_MINUTE = int(os.getenv("MISTRAL_TOKENS_PER_MINUTE", "500000"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MISTRAL_MAX_CONCURRENT", "4"))
+# Completion size assumed when reserving tokens before a request is sent
+COMPLETION_TOKEN_ESTIMATE = 400
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Connections kept open to the API, with room for hedged duplicates on top of the concurrency cap
+HTTP_MAX_CONNECTIONS = MAX_CONCURRENT_REQUESTS * 2
+HTTP_CONNECT_TIMEOUT = 10.0
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+
+
+class AgentError(Exception):
+    """Raised when Mistral can't produce a completion"""
+
+
+class RateLimitError(AgentError):
+    """Mistral kept rejecting the request for exceeding the rate limit"""
+
+
+class APIError(AgentError):
+    """Mistral returned an error that retrying didn't fix"""
+
+
+class DeadlineExceeded(AgentError):
+    """The call, or the session it belongs to, ran out of time"""
+
+
+def _error_status(e):
+    status = getattr(e, "status_code", None)
+    if status is None and "rate limit exceeded" in str(e).lower():
+        status = 429
+    return status
+
+
+def _retry_after(e):
+    response = getattr(e, "raw_response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
 
 class MistralAgent:
     def __init__(self):
         MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 
-        self.client = Mistral(api_key=MISTRAL_API_KEY)
+        # One pooled HTTP client for every request, so connections are reused instead of
+        # set up per call. warm_up() opens the first one before any command needs it
+        self.api_key = MISTRAL_API_KEY
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(CALL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        # MISTRAL_SERVER_URL optionally points at another API base, e.g. a proxy or a local fake server
+        server_url = os.getenv("MISTRAL_SERVER_URL") or None
+        self.client = Mistral(api_key=MISTRAL_API_KEY, server_url=server_url, async_client=self.http)
+        self.hedging = HedgePolicy()
+        self.request_bucket = TokenBucket(MAX_REQUESTS_PER_SECOND, max(1.0, MAX_REQUESTS_PER_SECOND))
+        self.token_bucket = TokenBucket(MAX_TOKENS_PER_MINUTE / 60, MAX_TOKENS_PER_MINUTE)
+        self.concurrency = FairSemaphore(MAX_CONCURRENT_REQUESTS)
+        self.cache = ResponseCache(RESPONSE_CACHE_PATH or None)
 
     async def run(self, message: discord.Message):
         # The simplest form of an agent
@@ -21,17 +127,234 @@ class MistralAgent:
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": message.content},
         ]
+        return await self.complete(messages)
+
+    async def stream(self, message: discord.Message):
+        # Same as run, but yields the response piece by piece as Mistral generates it
+        # so callers can show output before the whole completion is done
 
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": message.content},
+        ]
+        async for content in self.complete_stream(messages):
+            yield content
+
+    async def warm_up(self):
+        # Open a connection to the API (DNS, TCP and TLS) so the first command doesn't
+        # pay for it. Any response will do, failures only mean the first call connects itself
+        server_url, _ = self.client.sdk_configuration.get_server_details()
         try:
+            await self.http.get(f"{server_url}/v1/models", headers={"Authorization": f"Bearer {self.api_key}"})
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not warm up the Mistral connection: {e!r}")
+
+    async def close(self):
+        await self.http.aclose()
+
+    def model_for(self, role):
+        return MODEL_TIERS[ROLE_TIERS.get(role, "large")]
+
+    async def complete(self, messages, user_id=None, role="default", use_cache=False, validate=None,
+                       timeout=CALL_TIMEOUT):
+        # Send a full list of system/user/assistant messages and return the response text
+        # role picks the model tier and labels the call for metrics and caching, use_cache
+        # lets identical prompts for the same role be answered from the response cache.
+        # If the role runs on a smaller model and validate(response) is False, the request
+        # is escalated to the large model. The whole call, retries included, has to finish
+        # within timeout seconds and before the deadline of the session it runs in, if any
+
+        deadline = effective_deadline(timeout)
+        return await self._within(deadline, role, self._complete_escalating(messages, user_id, role, use_cache, validate))
+
+    async def _complete_escalating(self, messages, user_id, role, use_cache, validate):
+        model = self.model_for(role)
+        response = await self._complete_cached(messages, user_id, role, model, use_cache, validate)
+        if validate is not None and model != MODEL_TIERS["large"] and not validate(response):
+            metrics.llm_escalations.inc(role=role)
+            response = await self._complete_cached(messages, user_id, role, MODEL_TIERS["large"], use_cache, validate)
+        return response
+
+    async def _complete_cached(self, messages, user_id, role, model, use_cache, validate):
+        if not use_cache:
+            return await self._complete(messages, user_id, role, model)
+
+        key = cache_key(model, role, messages)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = await self._complete(messages, user_id, role, model)
+        if validate is None or validate(response):
+            await self.cache.put(key, response)
+        return response
+
+    async def _complete(self, messages, user_id, role, model):
+        attempt = 0
+        with metrics.timed(metrics.llm_latency, role=role):
+            while True:
+                try:
+                    return await self._hedged(
+                        role, (role, model), lambda sent: self._request(messages, user_id, role, model, sent)
+                    )
+                except Exception as e:
+                    metrics.llm_errors.inc(role=role)
+                    delay = self._retry_delay(e, attempt)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _request(self, messages, user_id, role, model, sent):
+        # One attempt at a completion. sent is set once the request has its slot and quota
+        async with self.concurrency.slot(user_id):
+            await self._wait_for_quota(messages)
+            sent.set()
+            start = time.perf_counter()
             response = await self.client.chat.complete_async(
-                model=MISTRAL_MODEL,
+                model=model,
                 messages=messages,
+                response_format={"type": "json_object"} if role in JSON_ROLES else None,
             )
+            self.hedging.observe((role, model), time.perf_counter() - start)
+            metrics.record_usage(response.usage, role=role)
             return response.choices[0].message.content
 
-        except Exception as e:
-            if "rate limit exceeded" in str(e).lower():
-                await asyncio.sleep(5)
-                return await self.run(message)
+    async def complete_stream(self, messages, user_id=None, role="default", timeout=CALL_TIMEOUT):
+        # Streaming version of complete. Retries (and hedges) only happen before the first
+        # chunk, otherwise the caller would see duplicated text. The deadline covers the
+        # whole stream, so a stalled stream fails with DeadlineExceeded instead of hanging
+
+        model = self.model_for(role)
+        deadline = effective_deadline(timeout)
+        attempt = 0
+        start = time.perf_counter()
+        with metrics.timed(metrics.llm_latency, role=role):
+            while True:
+                try:
+                    stack, response, first = await self._within(deadline, role, self._hedged(
+                        role, (role, model, "stream"),
+                        lambda sent: self._open_stream(messages, user_id, role, model, sent),
+                        discard=lambda opened: opened[0].aclose(),
+                    ))
+                    break
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    metrics.llm_errors.inc(role=role)
+                    delay = self._retry_delay(e, attempt)
+                attempt += 1
+                await self._within(deadline, role, asyncio.sleep(delay))
+
+            # stack holds the concurrency slot and the open response until the stream is done
+            async with stack:
+                if first is None:
+                    return
+                metrics.llm_first_token.observe(time.perf_counter() - start, role=role)
+                yield first
+                try:
+                    while True:
+                        try:
+                            chunk = await self._within(deadline, role, anext(response))
+                        except StopAsyncIteration:
+                            return
+                        metrics.record_usage(chunk.data.usage, role=role)
+                        content = chunk.data.choices[0].delta.content
+                        if isinstance(content, str) and content:
+                            yield content
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    metrics.llm_errors.inc(role=role)
+                    raise APIError(f"Mistral stream failed part way through: {e}") from e
+
+    async def _open_stream(self, messages, user_id, role, model, sent):
+        # Start a streamed completion and read it up to the first piece of content.
+        # Returns (stack, response, first content or None); closing stack closes the
+        # response and frees the concurrency slot
+        stack = AsyncExitStack()
+        try:
+            await stack.enter_async_context(self.concurrency.slot(user_id))
+            await self._wait_for_quota(messages)
+            sent.set()
+            start = time.perf_counter()
+            response = await self.client.chat.stream_async(
+                model=model,
+                messages=messages,
+            )
+            await stack.enter_async_context(response)
+            async for chunk in response:
+                metrics.record_usage(chunk.data.usage, role=role)
+                content = chunk.data.choices[0].delta.content
+                if isinstance(content, str) and content:
+                    self.hedging.observe((role, model, "stream"), time.perf_counter() - start)
+                    return stack, response, content
+            return stack, response, None
+        except BaseException:
+            await stack.aclose()
+            raise
+
+    async def _hedged(self, role, key, attempt, discard=None):
+        # Run attempt(sent) and return its result. If hedging is on and the attempt is
+        # still running the hedge delay after its request went out, start a duplicate and
+        # return whichever succeeds first; the other is cancelled. discard is awaited with
+        # any result that arrives but isn't used, so it can release what it holds
+        sent = asyncio.Event()
+        tasks = [asyncio.create_task(attempt(sent))]
+        winner = None
+        try:
+            delay = self.hedging.delay(key)
+            if delay is not None:
+                # Time spent queueing for a slot or quota doesn't count towards the delay
+                sent_waiter = asyncio.create_task(sent.wait())
+                await asyncio.wait([tasks[0], sent_waiter], return_when=asyncio.FIRST_COMPLETED)
+                sent_waiter.cancel()
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.hedging.try_acquire():
+                    metrics.llm_hedges.inc(role=role, outcome="sent")
+                    tasks.append(asyncio.create_task(attempt(asyncio.Event())))
+
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+            if winner is None:
+                # Everything failed, report the original request's error
+                return tasks[0].result()
+            if winner is not tasks[0]:
+                metrics.llm_hedges.inc(role=role, outcome="won")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None and discard:
+                    await discard(task.result())
+
+    async def _within(self, deadline, role, awaitable):
+        # Await awaitable, raising DeadlineExceeded if deadline passes first
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                return await awaitable
+        except TimeoutError as e:
+            metrics.llm_timeouts.inc(role=role)
+            raise DeadlineExceeded(f"Mistral {role} call ran past its deadline") from e
+
+    async def _wait_for_quota(self, messages):
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        await self.request_bucket.acquire()
+        await self.token_bucket.acquire(prompt_tokens + COMPLETION_TOKEN_ESTIMATE)
+
+    def _retry_delay(self, e, attempt):
+        """Return how long to wait before retrying e, or raise a typed error if we shouldn't"""
+        status = _error_status(e)
+        retryable = status in RETRYABLE_STATUS_CODES or isinstance(e, httpx.TransportError)
+        if not retryable:
+            raise APIError(f"Mistral request failed: {e}") from e
+        if attempt >= MAX_RETRIES:
+            if status == 429:
+                raise RateLimitError(f"Mistral rate limit still exceeded after {attempt} retries") from e
+            raise APIError(f"Mistral request failed after {attempt} retries: {e}") from e
 
-            return "Error: Unable to process request due to API rate limit."
\ No newline at end of file
+        retry_after = _retry_after(e)
+        if status == 429 and retry_after is not None:
+            # Hold back every request, not just this one, until the server says it's ready
+            self.request_bucket.pause(retry_after)
+        return backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP, retry_after)
@@ -0,0 +1,77 @@
+import os
+from functools import cached_property
+
+from agent import MistralAgent
+from jobs import JobQueue
+from memory import MemoryStore
+from retrieval import PageFetcher
+from scheduler import ReminderScheduler
+from search_service import SearchService
+from state_store import StateStore
+
+# Reminders and conversation memory are kept here across restarts, unless STATE_DB_PATH
+# says otherwise. Set it to "" to keep them in memory only.
+DEFAULT_STATE_DB_PATH = "bot_state.sqlite3"
+
+
+class App:
+    """
+    The services the bot's commands share: the Mistral agent, search and page fetching,
+    persistent state, memory and the multiagent job queue. Each one is built the first time
+    it's used, so creating an App (or importing a module that creates one) opens no clients,
+    files or databases, and tools that only need the agent never touch the rest.
+    """
+
+    def __init__(self, state_db_path=None, deliver_reminder=None):
+        # Read when the App is built, not at import, so a .env loaded after importing applies
+        if state_db_path is None:
+            state_db_path = os.getenv("STATE_DB_PATH", DEFAULT_STATE_DB_PATH)
+        self.state_db_path = state_db_path
+        # async callable that receives a due reminder dict, required for reminder_scheduler
+        self.deliver_reminder = deliver_reminder
+
+    @cached_property
+    def agent(self):
+        return MistralAgent()
+
+    @cached_property
+    def search_service(self):
+        return SearchService()
+
+    @cached_property
+    def page_fetcher(self):
+        return PageFetcher()
+
+    @cached_property
+    def state_store(self):
+        return StateStore(self.state_db_path) if self.state_db_path else None
+
+    @cached_property
+    def user_memories(self):
+        return MemoryStore(compact=True, store=self.state_store)
+
+    @cached_property
+    def multiagent_jobs(self):
+        return JobQueue()
+
+    @cached_property
+    def reminder_scheduler(self):
+        return ReminderScheduler(self.deliver_reminder, store=self.state_store)
+
+    def started(self, name):
+        """Whether the named service has been built yet"""
+        return name in self.__dict__
+
+    async def close(self):
+        """Close whichever services were started, the state store last since the others write to it"""
+        if self.started("reminder_scheduler"):
+            await self.reminder_scheduler.stop()
+        if self.started("page_fetcher"):
+            await self.page_fetcher.close()
+        if self.started("agent"):
+            await self.agent.close()
+            self.agent.cache.close()
+        if self.started("search_service"):
+            self.search_service.shutdown()
+        if self.started("state_store") and self.state_store is not None:
+            await self.state_store.close()
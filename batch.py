@@ -0,0 +1,147 @@
+"""
+Headless batch runner for the multiagent pipeline.
+
+Reads questions from a JSONL file, one object per line:
+    {"id": "q1", "question": "How should a small team plan a project?", "search": false}
+id defaults to the line number and search to --search. Up to --concurrency sessions run at
+once through one shared agent, so they're held to the same Mistral rate limits, concurrency
+cap and deadlines as the bot. Each finished question is written as a JSON line with its
+ending, final answer, wall time, token usage and number of Mistral calls, in the order they
+finish. A summary goes to stderr at the end.
+
+Run from the repo root, e.g.:
+    python batch.py questions.jsonl -o results.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+# Load .env before the project modules below, which read their settings when imported
+load_dotenv()
+
+import metrics
+from agent import MAX_CONCURRENT_REQUESTS
+from app import App
+from discord_output import TranscriptSender
+from multiagent import run_session
+
+logger = logging.getLogger("discord")
+
+
+def read_questions(path, use_search):
+    """Yield (item, error) for each non-blank line of the question file"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if isinstance(item, str):
+                    item = {"question": item}
+                if not item.get("question"):
+                    raise ValueError("no question")
+            except (ValueError, AttributeError) as e:
+                yield {"id": number}, f"Invalid line {number}: {e}"
+                continue
+            item.setdefault("id", number)
+            item.setdefault("search", use_search)
+            item["line"] = number
+            yield item, None
+
+
+async def run_question(app, item, include_transcript):
+    """Run one multiagent session and return its result record"""
+    sender = TranscriptSender()
+    record = {"id": item["id"], "question": item["question"]}
+    start = time.perf_counter()
+    with metrics.tracing() as trace:
+        try:
+            # The line number stands in for the user, so sessions share Mistral slots round-robin
+            result = await run_session(app, item["line"], sender, item["question"], bool(item["search"]))
+            record.update(ending=result.ending, answer=result.answer, iterations=result.iterations, error=None)
+        except Exception as e:
+            logger.error(f"Question {item['id']} failed: {e!r}")
+            record.update(ending="error", answer=None, iterations=None, error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["tokens"] = dict(trace.tokens)
+    record["llm_calls"] = sum(1 for span in trace.spans if span[0] == metrics.llm_latency.name)
+    if include_transcript:
+        record["transcript"] = sender.messages
+    return record
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_batch(args, app=None):
+    app = app or App(state_db_path="")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    records = []
+
+    def write(record):
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        records.append(record)
+
+    async def produce():
+        for item, error in read_questions(args.input, args.search):
+            if error is not None:
+                write({**item, "ending": "error", "error": error})
+            else:
+                await queue.put(item)
+        for _ in range(args.concurrency):
+            await queue.put(None)
+
+    async def work():
+        while (item := await queue.get()) is not None:
+            write(await run_question(app, item, args.transcript))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(args.concurrency)))
+    finally:
+        await app.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    seconds = [r["seconds"] for r in records if "seconds" in r]
+    endings = Counter(r["ending"] for r in records)
+    prompt_tokens = sum(r.get("tokens", {}).get("prompt", 0) for r in records)
+    completion_tokens = sum(r.get("tokens", {}).get("completion", 0) for r in records)
+    print(f"{len(records)} questions in {elapsed:.1f}s ({len(records) / elapsed * 60:.1f}/min), "
+          f"concurrency {args.concurrency}", file=sys.stderr)
+    if seconds:
+        print(f"  per question p50={percentile(seconds, 50):.2f}s p95={percentile(seconds, 95):.2f}s "
+              f"max={max(seconds):.2f}s", file=sys.stderr)
+    print(f"  tokens in/out={prompt_tokens}/{completion_tokens} "
+          f"mistral calls={sum(r.get('llm_calls', 0) for r in records)}", file=sys.stderr)
+    print("  endings: " + " ".join(f"{ending}={count}" for ending, count in sorted(endings.items())), file=sys.stderr)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("-o", "--output", help="JSONL file for results (default stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="multiagent sessions run at once (default MISTRAL_MAX_CONCURRENT)")
+    parser.add_argument("--search", action="store_true", help="search first for questions that don't say")
+    parser.add_argument("--transcript", action="store_true", help="include each session's messages in its result")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Startup and memory comparison of the bot's gateway modes against a local fake Discord gateway.
+
+Each mode runs in its own subprocess so RSS figures don't mix. The bot from bot.py is
+logged into a FakeDiscordGateway with the given number of guilds and members, and the
+script reports time to on_ready, gateway traffic, cached members and messages, and RSS
+after startup and after replaying presence and message chatter. The fake gateway runs in
+the same process as the bot, which adds the same small overhead to every mode.
+With --shards, time to ready includes discord.py's pacing between shard IDENTIFYs.
+
+Run from the repo root, e.g.:
+    python benchmarks/bench_gateway.py --guilds 20 --members 5000
+    python benchmarks/bench_gateway.py --modes lean --shards 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeDiscordGateway
+
+READY_TIMEOUT = 300
+
+
+def rss_mb():
+    """Current resident set size, falling back to the peak where /proc isn't available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def measure(args):
+    gateway = FakeDiscordGateway(guilds=args.guilds, members_per_guild=args.members,
+                                 channels_per_guild=args.channels)
+    await gateway.start()
+    gateway.install()
+
+    # bot.py reads its gateway settings from the environment when it's imported
+    os.environ.update(DISCORD_GATEWAY_MODE=args.mode, DISCORD_SHARD_COUNT=args.shards,
+                      MISTRAL_API_KEY="fake", RESPONSE_CACHE_PATH="", STATE_DB_PATH="", METRICS_PORT="")
+    baseline = rss_mb()
+    import bot as bot_module
+    bot = bot_module.bot
+
+    received = 0
+
+    async def count_message(message):
+        nonlocal received
+        received += 1
+
+    bot.add_listener(count_message, "on_message")
+
+    start = time.perf_counter()
+    runner = asyncio.create_task(bot.start("fake-token"))
+    ready_waiter = asyncio.create_task(bot.wait_until_ready())
+    await asyncio.wait([runner, ready_waiter], timeout=READY_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+    if runner.done():
+        # Login or the gateway connection failed
+        ready_waiter.cancel()
+        runner.result()
+    if not ready_waiter.done():
+        raise TimeoutError(f"bot not ready after {READY_TIMEOUT}s")
+    ready = time.perf_counter() - start
+    ready_bytes = gateway.stats["bytes"]
+    ready_rss = rss_mb()
+
+    expected = await gateway.emit_events(args.messages, args.presences)
+    while received < expected:
+        await asyncio.sleep(0.05)
+
+    result = {
+        "mode": args.mode,
+        "shards": args.shards or "1",
+        "ready_seconds": ready,
+        "ready_kb": ready_bytes / 1024,
+        "total_kb": gateway.stats["bytes"] / 1024,
+        "events": gateway.stats["events"],
+        "member_chunks": gateway.stats["member_chunks"],
+        "cached_members": sum(len(guild.members) for guild in bot.guilds),
+        "cached_messages": len(bot.cached_messages),
+        "baseline_rss_mb": baseline,
+        "ready_rss_mb": ready_rss,
+        "final_rss_mb": rss_mb(),
+    }
+    await bot.close()
+    runner.cancel()
+    await gateway.stop()
+    return result
+
+
+def run_mode(args, mode):
+    command = [sys.executable, __file__, "--child", "--modes", mode, "--guilds", str(args.guilds),
+               "--members", str(args.members), "--channels", str(args.channels),
+               "--messages", str(args.messages), "--presences", str(args.presences)]
+    if args.shards:
+        command += ["--shards", args.shards]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="full,lean", help="comma separated gateway modes to compare")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--members", type=int, default=5000, help="members per guild")
+    parser.add_argument("--channels", type=int, default=10, help="text channels per guild")
+    parser.add_argument("--messages", type=int, default=200, help="messages replayed per guild after ready")
+    parser.add_argument("--presences", type=int, default=500, help="presence updates replayed per guild after ready")
+    parser.add_argument("--shards", default="", help='DISCORD_SHARD_COUNT for the bot, e.g. "auto" or 4')
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.mode = args.modes
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    print(f"{args.guilds} guilds x {args.members} members, {args.messages} messages and "
+          f"{args.presences} presence updates per guild after ready")
+    print(f"{'mode':<6} {'shards':>6} {'ready':>7} {'ready KB':>9} {'total KB':>9} {'events':>7} "
+          f"{'members':>8} {'messages':>8} {'RSS ready':>10} {'RSS final':>10}")
+    for mode in args.modes.split(","):
+        r = run_mode(args, mode)
+        print(f"{r['mode']:<6} {r['shards']:>6} {r['ready_seconds']:>6.2f}s {r['ready_kb']:>9.0f} "
+              f"{r['total_kb']:>9.0f} {r['events']:>7} {r['cached_members']:>8} {r['cached_messages']:>8} "
+              f"{r['ready_rss_mb']:>8.1f}MB {r['final_rss_mb']:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Micro-benchmark for prompt assembly.
+
+Simulates a multiagent conversation and, for every role turn, builds the prompt both with
+the original string-concatenating build_*_context functions (copied below) and with
+PromptBuilder. Reports total build time and how many prompt bytes each approach creates.
+The legacy functions produce a fresh string holding the whole prompt on every call, while
+PromptBuilder only creates the new history messages and the short per-turn message.
+
+Run from the repo root: python benchmarks/bench_prompts.py [iterations] [response_chars]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from prompts import PromptBuilder
+
+ROLES = ["Brainstormer", "Critic", "Synthesizer", "Moderator"]
+
+
+def build_search_context(log, iteration, iteration_limit):
+    """
+    First prompt: The Search Agent decides if it needs to do a Google search.
+    It may respond with 'DO_SEARCH: <query>' if it wants you to gather info,
+    or it may respond with a direct answer if no search is needed.
+    """
+    context = "[System]\n"
+    context += (
+        "You are the Search agent. Your role is to determine if a web search is required "
+        "to gather factual information. If you decide to do a search, respond with a line "
+        "starting with 'DO_SEARCH:' followed by the query terms. If no search is needed, "
+        "just provide a direct answer.\n"
+    )
+    context += f"Iteration limit: {iteration_limit}.\n"
+    context += "[Conversation History]\n"
+    context += "\n".join(log) + "\n"
+    context += "Search Agent:\n"
+    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
+    return context
+
+def build_brainstormer_context(log, iteration, iteration_limit):
+    context = "[System]\n"
+    context += ("You are the Brainstormer agent. Your task is to generate creative and analytical ideas "
+                "to address the user's query. Use the full conversation history below to build on previous ideas and refine your suggestions. "
+                "If search results are included in the conversation, treat them as accurate and current information. "
+                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+                "Don't overcomplicate problems - when an answer is clear, answer directly without trying to find hidden meanings. "
+                "Only use deeper reasoning when questions are genuinely complex or difficult. ")
+    context += f"You have an iteration limit of {iteration_limit} rounds; if this is the final round, provide a summary of your best proposals.\n"
+    context += "[Conversation History]\n"
+    context += "\n".join(log) + "\n"
+    context += "Brainstormer:\n"
+    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
+    return context
+
+def build_critic_context(log, iteration, iteration_limit):
+    context = "[System]\n"
+    context += ("You are the Critic agent. Your task is to evaluate the brainstormed ideas, flag any flaws or inaccuracies, "
+                "and suggest improvements. Use the full conversation history below to ensure your feedback is thorough and relevant. "
+                "If search results are included in the conversation, treat them as accurate and current information - do not question their validity. "
+                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+                "Don't overcomplicate problems - when an answer is clear, focus on direct feedback without trying to find hidden meanings. "
+                "Only use deeper critical analysis when questions are genuinely complex or difficult. ")
+    context += f"The iteration limit is {iteration_limit} rounds; if this is the final round, emphasize the key points that need to be resolved.\n"
+    context += "[Conversation History]\n"
+    context += "\n".join(log) + "\n"
+    context += "Critic:\n"
+    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
+    return context
+
+def build_synthesizer_context(log, iteration, iteration_limit):
+    context = "[System]\n"
+    context += ("You are the Synthesizer agent. Your task is to transform the brainstormed ideas and critiques into concrete, "
+                "actionable steps or solutions. Focus on practicality and implementation details. "
+                "Consider both the creative suggestions from the Brainstormer and the concerns raised by the Critic. "
+                "If search results are included in the conversation, incorporate this factual information into your synthesis. "
+                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+                "Prioritize specific, implementable solutions over theoretical discussions. "
+                "If technical details are relevant, include them concisely.")
+    context += f"The iteration limit is {iteration_limit} rounds; if this is the final round, focus on the most viable solution.\n"
+    context += "[Conversation History]\n"
+    context += "\n".join(log) + "\n"
+    context += "Synthesizer:\n"
+    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
+    return context
+
+def build_moderator_context(log, iteration, iteration_limit):
+    context = "[System]\n"
+    context += ("You are the Moderator agent. Your role is to manage the dialogue between the Brainstormer and Critic and Synthesizer agents. "
+                "Review the full conversation history below and determine who should contribute next. Ensure that the conversation stays "
+                "on track and converges to a coherent answer. "
+                "If search results are included in the conversation, ensure they are properly incorporated as factual information. "
+                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+                "You don't need to use all iterations - if a clear answer has been reached, end the conversation early. It is critical that you do not overcomplicate or over-iterate, \
+                    but also do not end the conversation prematurely if what the Synthesizer provided is not yet complete.")
+    context += f"The iteration limit is {iteration_limit} rounds.\n"
+    context += "[Conversation History]\n"
+    context += "\n".join(log) + "\n"
+    context += "Moderator:\n"
+    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
+    context += ("If the conversation should continue, provide your thoughts. "
+                "If the conversation is complete, end with 'CONVO_OVER. SUMMARY: [your summary of the key points and conclusion. \
+                    If the question was simple, keep this to 1-2 sentences. If the question was complex/technical, you can write 5-6 sentences. \
+                    Note that this summary is to be displayed to the user, so you shouldn't mention things about the thought process, just the answer]'")
+    return context
+
+LEGACY_BUILDERS = {
+    "Brainstormer": build_brainstormer_context,
+    "Critic": build_critic_context,
+    "Synthesizer": build_synthesizer_context,
+    "Moderator": build_moderator_context,
+}
+
+
+def bench_legacy(iterations, response):
+    log = ["User: What is the best way to learn machine learning?"]
+    elapsed = 0.0
+    created = 0
+    for iteration in range(1, iterations + 1):
+        for role in ROLES:
+            start = time.perf_counter()
+            prompt = LEGACY_BUILDERS[role](log, iteration, iterations)
+            elapsed += time.perf_counter() - start
+            # The joined history plus the final prompt string are both new on every call
+            created += len(prompt) + sum(len(entry) + 1 for entry in log)
+            log.append(f"{role}: {response}")
+    return elapsed, created
+
+
+def bench_builder(iterations, response):
+    log = PromptBuilder(["User: What is the best way to learn machine learning?"])
+    elapsed = 0.0
+    created = 0
+    seen = {}
+    for iteration in range(1, iterations + 1):
+        for role in ROLES:
+            start = time.perf_counter()
+            messages = log.messages(role, iteration, iterations)
+            elapsed += time.perf_counter() - start
+            # Count only message contents that weren't part of this role's previous prompt
+            previous = seen.get(role, set())
+            created += sum(len(m["content"]) for m in messages if id(m) not in previous)
+            seen[role] = {id(m) for m in messages}
+            log.append(f"{role}: {response}")
+    return elapsed, created
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    response_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 800
+    response = ("word " * (response_chars // 5)).strip()
+    repeats = 200
+
+    legacy_time = builder_time = 0.0
+    for _ in range(repeats):
+        t, legacy_bytes = bench_legacy(iterations, response)
+        legacy_time += t
+        t, builder_bytes = bench_builder(iterations, response)
+        builder_time += t
+
+    print(f"{iterations} iterations, {response_chars} char responses, {repeats} runs")
+    print(f"  legacy build_*_context: {legacy_time / repeats * 1e6:.1f}us per run, "
+          f"{legacy_bytes / 1024:.1f}KiB of prompt text created per run")
+    print(f"  PromptBuilder:          {builder_time / repeats * 1e6:.1f}us per run, "
+          f"{builder_bytes / 1024:.1f}KiB of prompt text created per run")
+
+
+if __name__ == "__main__":
+    main()
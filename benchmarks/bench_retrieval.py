@@ -0,0 +1,116 @@
+"""
+Benchmark for the search evidence stage against a local fixture web server.
+
+Serves article pages from FakeWebServer (plus an oversized, a slow and a non-HTML page to
+exercise the size cap, timeout and content-type checks), runs gather_evidence over them
+and compares the evidence it selects with the original snippet-only keyword ranking
+(copied below): prompt tokens, how much of each is about the question, and time spent
+fetching, indexing and scoring.
+
+Run from the repo root: python benchmarks/bench_retrieval.py [pages] [timeout]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from retrieval import BM25Index, PageFetcher, gather_evidence, split_passages, tokenize
+from tokens import estimate_tokens
+from fakes import FakeResult, FakeSearchBackend, FakeWebServer
+
+QUESTION = "How should a small team approach project planning?"
+QUERY = "project planning small team"
+
+
+def legacy_results_text(user_question, search_results):
+    """The snippet-only ranking build_search_results_context used before the retrieval stage"""
+    text = "[Processed Search Results]\n"
+    highly_relevant = []
+    somewhat_relevant = []
+    question_keywords = set(user_question.lower().split())
+    for res in search_results[:5]:
+        title_and_desc = (res.title + " " + res.description).lower()
+        keyword_matches = sum(1 for keyword in question_keywords if keyword in title_and_desc)
+        if keyword_matches >= 2:
+            highly_relevant.append(res)
+        else:
+            somewhat_relevant.append(res)
+    text += "Most Relevant Information:\n"
+    for i, res in enumerate(highly_relevant, 1):
+        text += f"{i}. {res.title}\n   Key Points: {res.description}\n\n"
+    text += "Additional Information:\n"
+    for i, res in enumerate(somewhat_relevant, 1):
+        text += f"{i}. {res.title}\n   Details: {res.description}\n\n"
+    text += "Key Facts:\n"
+    all_text = " ".join(res.description for res in search_results[:5])
+    sentences = [s.strip() for s in all_text.split('.') if s.strip()]
+    fact_sentences = [s for s in sentences if any(keyword in s.lower() for keyword in question_keywords)]
+    for fact in fact_sentences[:5]:
+        text += f"- {fact}.\n"
+    return text
+
+
+def on_topic_share(texts, question):
+    """Share of sentences that mention at least two of the question's terms"""
+    terms = set(tokenize(question))
+    sentences = [s for text in texts for s in text.split(". ") if s.strip()]
+    if not sentences:
+        return 0.0
+    hits = sum(1 for s in sentences if len(terms & set(tokenize(s))) >= 2)
+    return hits / len(sentences)
+
+
+async def run(pages, timeout):
+    server = FakeWebServer(slow_delay=timeout * 3)
+    await server.start()
+    backend = FakeSearchBackend(latency=0, base_url=server.url)
+    results = backend(QUERY, pages)
+    results += [
+        FakeResult(f"{server.url}/large?q=project+planning", "Large page", "A very long page."),
+        FakeResult(f"{server.url}/slow?q=project+planning", "Slow page", "A page that never loads in time."),
+        FakeResult(f"{server.url}/file", "A PDF", "Not an HTML page."),
+    ]
+    fetcher = PageFetcher(timeout=timeout)
+
+    start = time.perf_counter()
+    evidence = await gather_evidence(f"{QUESTION} {QUERY}", results, fetcher, top_results=len(results))
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await gather_evidence(f"{QUESTION} {QUERY}", results, fetcher, top_results=len(results))
+    warm = time.perf_counter() - start
+
+    # Index and query cost on their own, over everything the fetcher extracted
+    texts = [await fetcher.fetch(res.url) for res in results]
+    passages = [p for text in texts for p in split_passages(text)]
+    start = time.perf_counter()
+    index = BM25Index(passages)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(100):
+        index.top(QUESTION, 6)
+    query = (time.perf_counter() - start) / 100
+
+    legacy = legacy_results_text(QUESTION, results)
+    evidence_texts = [item.text for item in evidence]
+    print(f"{len(results)} results ({pages} articles + large, slow and non-HTML pages), fetch timeout {timeout}s")
+    print(f"  fetch + rank: cold {cold:.2f}s, warm (page cache) {warm * 1000:.1f}ms, fetcher stats {fetcher.stats}")
+    print(f"  index: {len(passages)} passages, {len(index.postings)} terms, build {build * 1000:.1f}ms, "
+          f"query {query * 1000:.2f}ms")
+    print(f"  legacy snippets: {estimate_tokens(legacy)} tokens, "
+          f"{on_topic_share([legacy], QUESTION):.0%} of sentences on topic")
+    print(f"  ranked evidence: {estimate_tokens(' '.join(evidence_texts))} tokens in {len(evidence)} passages, "
+          f"{on_topic_share(evidence_texts, QUESTION):.0%} of sentences on topic")
+    for item in evidence[:3]:
+        print(f"    [{item.source}] {item.score:.2f} {item.text[:110]}")
+
+    await fetcher.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    timeout = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    asyncio.run(run(pages, timeout))
@@ -0,0 +1,103 @@
+"""
+Benchmark for the reminder scheduler.
+
+Schedules a large number of reminders spread over a short window and reports how late
+each one fires, then measures CPU used while the scheduler is idle with reminders pending.
+For comparison it also times one tick of the old 30-second polling scan over the same list.
+
+Run from the repo root: python benchmarks/bench_scheduler.py [count] [spread_seconds]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scheduler import ReminderScheduler
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+
+def legacy_tick(reminders, current_time):
+    # The original check_reminders body: full scan plus list.remove per due item
+    due_reminders = [r for r in reminders if current_time >= r['due_time']]
+    for reminder in due_reminders:
+        reminders.remove(reminder)
+    return len(due_reminders)
+
+
+async def bench_firing(count, spread):
+    lateness = []
+    done = asyncio.Event()
+
+    async def deliver(reminder):
+        lateness.append((datetime.now() - reminder['due_time']).total_seconds())
+        if len(lateness) == count:
+            done.set()
+
+    scheduler = ReminderScheduler(deliver)
+    scheduler.start()
+
+    start = datetime.now()
+    for i in range(count):
+        due = start + timedelta(seconds=1 + random.random() * spread)
+        scheduler.add({'user_id': i, 'channel_id': 0, 'message': "bench", 'due_time': due})
+
+    await asyncio.wait_for(done.wait(), spread + 30)
+    await scheduler.stop()
+
+    print(f"fired {count} reminders over {spread}s")
+    print(f"  lateness p50={percentile(lateness, 50) * 1000:.2f}ms "
+          f"p99={percentile(lateness, 99) * 1000:.2f}ms max={max(lateness) * 1000:.2f}ms")
+
+
+async def bench_idle(count, idle_seconds=3):
+    async def deliver(reminder):
+        pass
+
+    scheduler = ReminderScheduler(deliver)
+    scheduler.start()
+    far = datetime.now() + timedelta(hours=1)
+    for i in range(count):
+        scheduler.add({'user_id': i, 'channel_id': 0, 'message': "bench", 'due_time': far + timedelta(seconds=i)})
+
+    await asyncio.sleep(0)
+    cpu_start = time.process_time()
+    await asyncio.sleep(idle_seconds)
+    cpu_used = time.process_time() - cpu_start
+    await scheduler.stop()
+
+    print(f"idle with {count} pending: {cpu_used * 1000:.2f}ms CPU over {idle_seconds}s")
+
+
+def bench_legacy(count):
+    now = datetime.now()
+    reminders = [
+        {'user_id': i, 'channel_id': 0, 'message': "bench", 'due_time': now + timedelta(seconds=random.random() * 60)}
+        for i in range(count)
+    ]
+    tick_time = now + timedelta(seconds=30)
+    start = time.perf_counter()
+    fired = legacy_tick(reminders, tick_time)
+    elapsed = time.perf_counter() - start
+    print(f"legacy polling tick over {count} pending ({fired} due): {elapsed * 1000:.1f}ms, "
+          f"up to 30000ms late")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    spread = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    asyncio.run(bench_firing(count, spread))
+    asyncio.run(bench_idle(count))
+    bench_legacy(min(count, 20_000))
+
+
+if __name__ == "__main__":
+    main()
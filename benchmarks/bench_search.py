@@ -0,0 +1,77 @@
+"""
+Benchmark for the async search service using a local fake backend.
+
+Fires a burst of concurrent lookups drawn from a skewed query distribution and reports
+per-call latency, cache hit rate, merged in-flight lookups and how far the event loop
+lagged behind while the (blocking) backend was running.
+
+Run from the repo root: python benchmarks/bench_search.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from search_service import SearchService
+from fakes import FakeSearchBackend
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def measure_loop_lag(stop, lags, interval=0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(requests, concurrency):
+    backend = FakeSearchBackend()
+    service = SearchService(backend=backend)
+    queries = [f"topic {i}" for i in range(50)]
+    weights = [1 / (i + 1) for i in range(len(queries))]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        query = random.choices(queries, weights)[0]
+        # Vary case and spacing to exercise query normalization
+        if random.random() < 0.5:
+            query = "  " + query.upper()
+        async with semaphore:
+            start = time.perf_counter()
+            await service.search(query)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    service.shutdown()
+
+    stats = service.stats
+    print(f"{requests} lookups, concurrency {concurrency}, {elapsed:.2f}s total")
+    print(f"  backend calls={backend.calls} hits={stats['hits']} merged={stats['merged']} "
+          f"misses={stats['misses']} hit rate={(stats['hits'] + stats['merged']) / requests:.1%}")
+    print(f"  latency p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"  event loop lag max={max(lags) * 1000:.1f}ms")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(run(requests, concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+"""
+Local stand-ins for the services the bot talks to, used by the benchmarks.
+
+- FakeMistralServer: an HTTP server speaking enough of Mistral's chat completions API
+  (plain and streamed) for the real mistralai client, with configurable latency,
+  token rate and injected 429s.
+- FakeChannel / FakeContext: record what the bot sends to Discord, with send latency.
+- FakeDiscordGateway: the Discord REST login endpoints plus a websocket gateway that
+  sends synthetic guilds, member chunks, presences and messages, for startup benchmarks.
+- FakeSearchBackend: blocking stand-in for googlesearch.
+- FakeWebServer: HTML result pages with page chrome around the content, plus oversized,
+  slow and non-HTML pages, for the page fetcher.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from aiohttp import web
+
+FakeResult = namedtuple("FakeResult", ["url", "title", "description"])
+
+
+class FakeMistralServer:
+    """
+    Serves POST /v1/chat/completions (and GET /v1/models). Each request waits
+    first_token_latency seconds, then produces completion_tokens words at tokens_per_second.
+    With probability rate_limit_probability it answers 429 with a Retry-After header instead,
+    and with probability slow_probability it stalls for slow_latency seconds before the
+    first token, like a request stuck behind a slow upstream.
+    Replies are shaped by the role being prompted so the bot's control flow is exercised:
+    the Search agent asks for a search and the Moderator answers in JSON, ending the
+    conversation with probability end_probability.
+    """
+
+    def __init__(self, first_token_latency=0.3, tokens_per_second=200, completion_tokens=80,
+                 rate_limit_probability=0.0, retry_after=0.5, end_probability=0.5,
+                 slow_probability=0.0, slow_latency=30.0, port=0):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.end_probability = end_probability
+        self.slow_probability = slow_probability
+        self.slow_latency = slow_latency
+        self.port = port
+        self.stats = {"requests": 0, "rate_limited": 0, "slow": 0, "prompt_chars": 0}
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        app.router.add_get("/v1/models", self._handle_models)
+        # Stop working on requests the client gave up on (deadlines, losing hedges)
+        self._runner = web.AppRunner(app, handler_cancellation=True)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _reply_text(self, messages):
+        last = messages[-1]["content"] if messages else ""
+        filler = " ".join(random.choice(["idea", "plan", "step", "detail", "result"]) for _ in range(self.completion_tokens))
+        if last.endswith("Search Agent:") and "[Processed Search Results]" not in last:
+            return "DO_SEARCH: fake search query"
+        if last.endswith("Moderator:"):
+            if random.random() < self.end_probability:
+                return json.dumps({"decision": "end", "thoughts": filler + ".",
+                                   "summary": "The fake conversation reached an answer."})
+            return json.dumps({"decision": "continue", "thoughts": filler + ".", "summary": ""})
+        return filler + "."
+
+    async def _handle_models(self, request):
+        return web.json_response({"object": "list", "data": []})
+
+    async def _handle(self, request):
+        body = await request.json()
+        self.stats["requests"] += 1
+        messages = body.get("messages", [])
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        self.stats["prompt_chars"] += prompt_chars
+
+        if random.random() < self.rate_limit_probability:
+            self.stats["rate_limited"] += 1
+            return web.json_response(
+                {"message": "Requests rate limit exceeded"}, status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        if random.random() < self.slow_probability:
+            self.stats["slow"] += 1
+            await asyncio.sleep(self.slow_latency)
+        await asyncio.sleep(self.first_token_latency)
+        text = self._reply_text(messages)
+        words = text.split(" ")
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_chars // 4 + len(words),
+        }
+        base = {"id": "fake", "model": body.get("model", "fake"), "created": int(time.time())}
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(words) / self.tokens_per_second)
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        try:
+            await self._stream_words(response, words, base, usage)
+        except ConnectionResetError:
+            # The client went away mid-stream, e.g. a cancelled run
+            pass
+        return response
+
+    async def _stream_words(self, response, words, base, usage):
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            last = i == len(words) - 1
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece},
+                             "finish_reason": "stop" if last else None}],
+            }
+            if last:
+                chunk["usage"] = usage
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(1 / self.tokens_per_second)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+        self.id = next(channel.ids)
+
+    async def edit(self, content):
+        await self.channel._request()
+        self.channel.edits += 1
+        self.content = content
+        return self
+
+
+class FakeChannel:
+    """
+    Records every message sent to it, each send or edit taking latency seconds. Like
+    Discord, it allows rate_limit requests per rate_period seconds per channel; requests
+    over that count as rate_limited (a 429) and wait until the window frees up, the way
+    discord.py retries them.
+    """
+
+    def __init__(self, channel_id, latency=0.05, rate_limit=5, rate_period=5.0):
+        self.id = channel_id
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.messages = []
+        self.edits = 0
+        self.rate_limited = 0
+        self.ids = itertools.count(1)
+        self._recent = deque()
+
+    async def _request(self):
+        now = time.monotonic()
+        while self._recent and self._recent[0] <= now - self.rate_period:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            self.rate_limited += 1
+            await asyncio.sleep(self._recent[0] + self.rate_period - now)
+            return await self._request()
+        self._recent.append(now)
+        await asyncio.sleep(self.latency)
+
+    async def send(self, content=None, **kwargs):
+        await self._request()
+        if content is not None and len(content) > 2000:
+            raise ValueError("Must be 2000 or fewer in length.")
+        message = FakeMessage(self, content)
+        self.messages.append(message)
+        return message
+
+
+_message_ids = itertools.count(1)
+
+
+class FakeContext:
+    """Just enough of discord.ext.commands.Context for the bot's command callbacks"""
+
+    def __init__(self, channel, user_id, command):
+        self.channel = channel
+        self.author = SimpleNamespace(id=user_id, bot=False)
+        self.message = SimpleNamespace(id=next(_message_ids))
+        self.command = command
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeSearchBackend:
+    """
+    Blocking stand-in for googlesearch with a fixed latency. With base_url, result links
+    point at a FakeWebServer's article pages.
+    """
+
+    def __init__(self, latency=0.3, base_url=None):
+        self.latency = latency
+        self.base_url = base_url
+        self.calls = 0
+
+    def _url(self, query, i):
+        if self.base_url is None:
+            return f"https://example.com/{i}"
+        return f"{self.base_url}/page/{i}?q={'+'.join(query.split())}"
+
+    def __call__(self, query, num_results):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [
+            FakeResult(self._url(query, i), f"{query} result {i}", f"Details about {query}. Fact {i}.")
+            for i in range(num_results)
+        ]
+
+
+FILLER_SENTENCES = [
+    "The committee met on a Tuesday to review the quarterly budget and travel policy.",
+    "Weather in the region stayed mild for most of the season with occasional rain.",
+    "Historians still disagree about the origins of the old harbour district.",
+    "The museum extended its opening hours after a surge of summer visitors.",
+    "Local bakeries reported strong sales of seasonal pastries during the festival.",
+    "A new cycling lane was added along the river to ease commuter traffic.",
+]
+
+ON_TOPIC_SENTENCES = [
+    "Research on {query} shows that careful planning matters more than the choice of tools.",
+    "Teams working on {query} benefit from short weekly check-ins and a shared task board.",
+    "A common mistake in {query} is skipping the risk review before committing to deadlines.",
+    "Experts on {query} recommend splitting the work into milestones of two to three weeks.",
+    "Source {n} found that {query} goes better when one person owns each decision.",
+]
+
+
+class FakeWebServer:
+    """
+    Serves result pages for FakeSearchBackend. /page/{n}?q=... is an HTML article about the
+    query wrapped in navigation, scripts and a footer, where only a few paragraphs actually
+    mention the query terms. /large is larger than the fetcher's size cap, /slow answers
+    after slow_delay seconds and /file returns a non-HTML body.
+    """
+
+    def __init__(self, paragraphs=30, slow_delay=30, large_bytes=4 * 1024 * 1024, port=0):
+        self.paragraphs = paragraphs
+        self.slow_delay = slow_delay
+        self.large_bytes = large_bytes
+        self.port = port
+        self.stats = {"requests": 0}
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/page/{n}", self._page)
+        app.router.add_get("/large", self._large)
+        app.router.add_get("/slow", self._slow)
+        app.router.add_get("/file", self._file)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _article(self, query, n):
+        rng = random.Random(f"{query}-{n}")
+        paragraphs = []
+        for i in range(self.paragraphs):
+            sentences = rng.sample(FILLER_SENTENCES, 3)
+            if i % 7 == n % 7:
+                sentences.insert(1, ON_TOPIC_SENTENCES[(i + n) % len(ON_TOPIC_SENTENCES)].format(query=query, n=n))
+            paragraphs.append(f"<p>{' '.join(sentences)}</p>")
+        return (
+            "<html><head><title>Article</title><script>var tracking = {enabled: true};</script>"
+            "<style>body { font-family: sans-serif; }</style></head><body>"
+            "<header><nav><a href='/'>Home</a> <a href='/news'>News</a> <a href='/about'>About us and our team</a></nav></header>"
+            f"<article><h1>{query} explained</h1>{''.join(paragraphs)}</article>"
+            "<aside>Subscribe to our newsletter for weekly updates on everything that matters to you.</aside>"
+            "<footer>Copyright 2024 Example Media Group. All rights reserved. Terms and privacy policy.</footer>"
+            "</body></html>"
+        )
+
+    async def _page(self, request):
+        self.stats["requests"] += 1
+        query = request.query.get("q", "").replace("+", " ")
+        return web.Response(text=self._article(query, int(request.match_info["n"])), content_type="text/html")
+
+    async def _large(self, request):
+        self.stats["requests"] += 1
+        query = request.query.get("q", "").replace("+", " ")
+        article = self._article(query, 1)
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        try:
+            sent = 0
+            while sent < self.large_bytes:
+                await response.write(article.encode())
+                sent += len(article)
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def _slow(self, request):
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.slow_delay)
+        return web.Response(text=self._article(request.query.get("q", ""), 2), content_type="text/html")
+
+    async def _file(self, request):
+        self.stats["requests"] += 1
+        return web.Response(body=b"%PDF-1.4 fake", content_type="application/pdf")
+
+
+# Gateway intent bits, see discord.Intents
+INTENT_GUILD_MEMBERS = 1 << 1
+INTENT_GUILD_PRESENCES = 1 << 8
+INTENT_GUILD_MESSAGES = 1 << 9
+INTENT_MESSAGE_CONTENT = 1 << 15
+
+GATEWAY_LARGE_THRESHOLD = 250
+GATEWAY_CHUNK_SIZE = 1000
+BOT_USER_ID = 1 << 40
+
+
+def _snowflake(n):
+    return str((n << 22) + 1)
+
+
+def _json_response(data):
+    # discord.py only decodes bodies whose Content-Type is exactly application/json
+    return web.Response(body=json.dumps(data).encode(), headers={"Content-Type": "application/json"})
+
+
+def _user(user_id, name):
+    return {"id": str(user_id), "username": name, "discriminator": "0", "avatar": None, "global_name": name}
+
+
+class FakeDiscordGateway:
+    """
+    Serves the REST endpoints discord.py calls at login (/users/@me, /oauth2/applications/@me,
+    /gateway/bot) and a websocket gateway at /gateway. After IDENTIFY it sends READY and a
+    GUILD_CREATE for each of the shard's guilds, shaped by the intents the client asked for
+    the way Discord does it: presences only with the presences intent, the full member list
+    only through REQUEST_GUILD_MEMBERS chunks with the members intent, message content only
+    with the message content intent. emit_events() then replays presence updates and
+    messages to every connected shard. Byte and event counts are kept in stats.
+    """
+
+    def __init__(self, guilds=10, members_per_guild=1000, channels_per_guild=5, port=0):
+        self.guilds = guilds
+        self.members_per_guild = members_per_guild
+        self.channels_per_guild = channels_per_guild
+        self.port = port
+        self.stats = {"bytes": 0, "events": 0, "member_chunks": 0}
+        self._connections = []
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def gateway_url(self):
+        return f"ws://127.0.0.1:{self.port}/gateway"
+
+    def install(self):
+        """Point discord.py's REST base and default gateway at this server"""
+        import discord.gateway
+        import discord.http
+        import yarl
+        discord.http.Route.BASE = f"{self.url}/api/v10"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(self.gateway_url)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v10/users/@me", self._me)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self._application)
+        app.router.add_get("/api/v10/gateway/bot", self._gateway_bot)
+        app.router.add_get("/gateway", self._gateway)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for connection in self._connections:
+            await connection["ws"].close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _me(self, request):
+        return _json_response({**_user(BOT_USER_ID, "loadtest-bot"), "bot": True})
+
+    async def _application(self, request):
+        return _json_response({
+            "id": str(BOT_USER_ID), "name": "loadtest-bot", "icon": None, "description": "",
+            "rpc_origins": [], "bot_public": True, "bot_require_code_grant": False,
+            "owner": _user(BOT_USER_ID + 1, "owner"), "verify_key": "", "team": None, "flags": 0,
+        })
+
+    async def _gateway_bot(self, request):
+        return _json_response({
+            "url": self.gateway_url, "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 16},
+        })
+
+    async def _send(self, connection, op, data, event=None):
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if event is not None:
+            connection["seq"] += 1
+            payload["s"] = connection["seq"]
+            self.stats["events"] += 1
+        text = json.dumps(payload)
+        self.stats["bytes"] += len(text)
+        await connection["ws"].send_str(text)
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        connection = {"ws": ws, "seq": 0, "intents": 0, "shard": (0, 1)}
+        self._connections.append(connection)
+        await self._send(connection, 10, {"heartbeat_interval": 41250})
+        try:
+            async for message in ws:
+                payload = json.loads(message.data)
+                if payload["op"] == 1:
+                    await self._send(connection, 11, None)
+                elif payload["op"] == 2:
+                    await self._identify(connection, payload["d"])
+                elif payload["op"] == 8:
+                    await self._member_chunks(connection, payload["d"])
+        except ConnectionResetError:
+            pass
+        finally:
+            self._connections.remove(connection)
+        return ws
+
+    def _shard_guilds(self, connection):
+        shard_id, shard_count = connection["shard"]
+        return [g for g in range(self.guilds) if (int(_snowflake(g)) >> 22) % shard_count == shard_id]
+
+    async def _identify(self, connection, data):
+        connection["intents"] = data.get("intents", 0)
+        connection["shard"] = tuple(data.get("shard") or (0, 1))
+        guilds = self._shard_guilds(connection)
+        await self._send(connection, 0, {
+            "v": 10, "user": {**_user(BOT_USER_ID, "loadtest-bot"), "bot": True},
+            "guilds": [{"id": _snowflake(g), "unavailable": True} for g in guilds],
+            "session_id": f"fake-{id(connection)}", "resume_gateway_url": self.gateway_url,
+            "shard": list(connection["shard"]),
+            "application": {"id": str(BOT_USER_ID), "flags": 0},
+        }, "READY")
+        for g in guilds:
+            await self._send(connection, 0, self._guild(connection, g), "GUILD_CREATE")
+
+    def _member(self, g, m):
+        return {
+            "user": _user(int(_snowflake(g)) + m + 1, f"user{g}-{m}"),
+            "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+        }
+
+    def _guild(self, connection, g):
+        guild_id = _snowflake(g)
+        large = self.members_per_guild > GATEWAY_LARGE_THRESHOLD
+        # Discord only sends the online members of a large guild up front; the rest need chunking
+        initial = min(self.members_per_guild, GATEWAY_LARGE_THRESHOLD)
+        members = [self._member(g, m) for m in range(initial)]
+        presences = []
+        if connection["intents"] & INTENT_GUILD_PRESENCES:
+            presences = [{"user": {"id": member["user"]["id"]}, "status": "online", "activities": [],
+                          "client_status": {"desktop": "online"}} for member in members]
+        return {
+            "id": guild_id, "name": f"guild {g}", "icon": None, "owner_id": str(BOT_USER_ID + 1),
+            "region": "us-west", "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0,
+            "default_message_notifications": 0, "explicit_content_filter": 0, "mfa_level": 0,
+            "features": [], "emojis": [], "stickers": [], "premium_tier": 0, "nsfw_level": 0,
+            "roles": [{"id": guild_id, "name": "@everyone", "permissions": "1024", "position": 0,
+                       "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+            "channels": [{"id": str(int(guild_id) + 100_000 + c), "type": 0, "name": f"channel-{c}",
+                          "position": c, "permission_overwrites": []} for c in range(self.channels_per_guild)],
+            "members": members, "presences": presences, "voice_states": [], "threads": [],
+            "stage_instances": [], "guild_scheduled_events": [],
+            "member_count": self.members_per_guild, "large": large,
+            "joined_at": "2024-01-01T00:00:00+00:00", "unavailable": False,
+        }
+
+    async def _member_chunks(self, connection, data):
+        if not connection["intents"] & INTENT_GUILD_MEMBERS:
+            return
+        guild_id = data["guild_id"]
+        g = (int(guild_id) - 1) >> 22
+        chunk_count = max(1, -(-self.members_per_guild // GATEWAY_CHUNK_SIZE))
+        for index in range(chunk_count):
+            members = [self._member(g, m) for m in
+                       range(index * GATEWAY_CHUNK_SIZE, min(self.members_per_guild, (index + 1) * GATEWAY_CHUNK_SIZE))]
+            self.stats["member_chunks"] += 1
+            await self._send(connection, 0, {
+                "guild_id": guild_id, "members": members, "chunk_index": index,
+                "chunk_count": chunk_count, "nonce": data.get("nonce"),
+            }, "GUILD_MEMBERS_CHUNK")
+
+    async def emit_events(self, messages_per_guild=100, presences_per_guild=100):
+        """Replay chatter to every shard, returns the number of MESSAGE_CREATE events sent"""
+        sent = 0
+        timestamp = datetime.now(timezone.utc).isoformat()
+        for connection in list(self._connections):
+            intents = connection["intents"]
+            for g in self._shard_guilds(connection):
+                guild_id = _snowflake(g)
+                if intents & INTENT_GUILD_PRESENCES:
+                    for i in range(presences_per_guild):
+                        member = self._member(g, i % self.members_per_guild)
+                        await self._send(connection, 0, {
+                            "user": {"id": member["user"]["id"]}, "guild_id": guild_id,
+                            "status": random.choice(["online", "idle", "dnd"]), "activities": [],
+                            "client_status": {"desktop": "online"},
+                        }, "PRESENCE_UPDATE")
+                if not intents & INTENT_GUILD_MESSAGES:
+                    continue
+                for i in range(messages_per_guild):
+                    member = self._member(g, i % self.members_per_guild)
+                    content = f"chatter message {i} " * 5 if intents & INTENT_MESSAGE_CONTENT else ""
+                    await self._send(connection, 0, {
+                        "id": str(int(guild_id) + 1_000_000 + i), "type": 0,
+                        "channel_id": str(int(guild_id) + 100_000 + i % self.channels_per_guild),
+                        "guild_id": guild_id, "author": member["user"],
+                        "member": {k: v for k, v in member.items() if k != "user"},
+                        "content": content, "timestamp": timestamp, "edited_timestamp": None,
+                        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+                        "attachments": [], "embeds": [], "pinned": False,
+                    }, "MESSAGE_CREATE")
+                    sent += 1
+        return sent
@@ -0,0 +1,175 @@
+"""
+Offline load test for bot.py.
+
+Starts a local FakeMistralServer, points the bot's Mistral client at it, swaps the search
+backend for FakeSearchBackend (with result pages served by a FakeWebServer) and runs the
+command callbacks against fake Discord channels. N simulated users each run the chosen
+command a number of times concurrently, and the script reports latency percentiles, throughput, Mistral/Discord call counts and
+peak RSS, giving a baseline to compare performance changes against.
+
+Run from the repo root, e.g.:
+    python benchmarks/loadtest.py --command multiagent --users 20
+    python benchmarks/loadtest.py --command all --users 50 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import FakeChannel, FakeContext, FakeMistralServer, FakeSearchBackend, FakeWebServer
+
+COMMANDS = ["multiagent", "searchagent", "brainstorm", "remindme"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_bot(args):
+    # The agent reads its limits from the environment when it's imported
+    os.environ.setdefault("MISTRAL_API_KEY", "fake")
+    os.environ["MISTRAL_REQUESTS_PER_SECOND"] = str(args.rps)
+    os.environ["MISTRAL_MAX_CONCURRENT"] = str(args.concurrency)
+    os.environ["RESPONSE_CACHE_PATH"] = ""
+    os.environ["STATE_DB_PATH"] = ""
+    os.environ["MISTRAL_CALL_TIMEOUT"] = str(args.call_timeout)
+    os.environ["MISTRAL_HEDGE_PERCENTILE"] = args.hedge_percentile
+    os.environ["MISTRAL_HEDGE_BUDGET"] = str(args.hedge_budget)
+    import bot
+    return bot
+
+
+def question_for(command, user, run):
+    if command == "remindme":
+        return f"load test reminder {user}-{run} 0.01m"
+    if command == "multiagent" and user % 2 == 0:
+        return f"--search How should user {user} plan project {run}?"
+    return f"How should user {user} plan project {run}?"
+
+
+async def run_load(args):
+    server = FakeMistralServer(
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.token_rate,
+        completion_tokens=args.completion_tokens,
+        rate_limit_probability=args.rate_limit,
+        slow_probability=args.slow,
+        slow_latency=args.slow_latency,
+    )
+    await server.start()
+
+    os.environ["MISTRAL_SERVER_URL"] = server.url
+    bot = load_bot(args)
+    await bot.app.agent.warm_up()
+    web_server = FakeWebServer()
+    await web_server.start()
+    search_backend = FakeSearchBackend(latency=args.search_latency, base_url=web_server.url)
+    bot.app.search_service.backend = search_backend
+
+    channels = {}
+
+    def channel_for(user):
+        channel_id = user % args.channels
+        if channel_id not in channels:
+            channels[channel_id] = FakeChannel(channel_id, latency=args.discord_latency)
+        return channels[channel_id]
+
+    bot.bot.get_channel = lambda channel_id: channels.get(channel_id)
+    reminder_count = 0
+    bot.app.reminder_scheduler.start()
+
+    commands = COMMANDS if args.command == "all" else [args.command]
+    latencies = {command: [] for command in commands}
+    errors = {command: 0 for command in commands}
+
+    async def one_user(user):
+        nonlocal reminder_count
+        for run in range(args.runs):
+            command = commands[(user + run) % len(commands)]
+            callback = getattr(bot, "multiagent" if command == "multiagent" else
+                               "searchagent_cmd" if command == "searchagent" else command)
+            ctx = FakeContext(channel_for(user), user, callback)
+            start = time.perf_counter()
+            try:
+                if command == "remindme":
+                    await callback.callback(ctx, reminder_text=question_for(command, user, run))
+                    reminder_count += 1
+                else:
+                    await callback.callback(ctx, question=question_for(command, user, run))
+            except Exception as e:
+                errors[command] += 1
+                print(f"  {command} failed for user {user}: {e!r}")
+            latencies[command].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_user(user) for user in range(args.users)))
+    elapsed = time.perf_counter() - start
+
+    # Give reminders time to fire
+    if reminder_count:
+        await asyncio.sleep(1.5)
+    await bot.app.close()
+    await web_server.stop()
+    await server.stop()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{args.users} users x {args.runs} runs, {total} commands in {elapsed:.2f}s "
+          f"({total / elapsed:.2f} commands/s)")
+    for command in commands:
+        values = latencies[command]
+        if values:
+            print(f"  {command:<12} n={len(values):<4} p50={percentile(values, 50):.2f}s "
+                  f"p95={percentile(values, 95):.2f}s p99={percentile(values, 99):.2f}s errors={errors[command]}")
+    sends = sum(len(channel.messages) for channel in channels.values())
+    edits = sum(channel.edits for channel in channels.values())
+    print(f"  mistral requests={server.stats['requests']} rate limited={server.stats['rate_limited']} "
+          f"slow={server.stats['slow']} prompt chars={server.stats['prompt_chars']}")
+    hedges = bot.metrics.llm_hedges
+    print(f"  timeouts={sum(bot.metrics.llm_timeouts.values.values())} "
+          f"hedges sent={sum(v for k, v in hedges.values.items() if ('outcome', 'sent') in k)} "
+          f"won={sum(v for k, v in hedges.values.items() if ('outcome', 'won') in k)}")
+    rate_limited = sum(channel.rate_limited for channel in channels.values())
+    print(f"  discord sends={sends} edits={edits} rate limited={rate_limited} search calls={search_backend.calls} "
+          f"pages fetched={web_server.stats['requests']}")
+    exits = {reason: bot.metrics.multiagent_exits.get(reason=reason) for reason in ("converged", "moderator", "limit", "deadline")}
+    if any(exits.values()):
+        print("  multiagent endings: " + " ".join(f"{reason}={count}" for reason, count in exits.items()))
+    print(f"  peak RSS={peak_rss_mb():.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--command", choices=COMMANDS + ["all"], default="all")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=1, help="commands per user")
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--rps", type=float, default=50, help="client-side Mistral requests per second")
+    parser.add_argument("--concurrency", type=int, default=16, help="client-side Mistral concurrency cap")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=400, help="fake Mistral tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="probability of a fake 429")
+    parser.add_argument("--slow", type=float, default=0.0, help="probability of a stalled fake Mistral request")
+    parser.add_argument("--slow-latency", type=float, default=30.0, help="how long a stalled request stalls")
+    parser.add_argument("--call-timeout", type=float, default=60, help="MISTRAL_CALL_TIMEOUT for the bot")
+    parser.add_argument("--hedge-percentile", default="", help="MISTRAL_HEDGE_PERCENTILE for the bot, e.g. 95")
+    parser.add_argument("--hedge-budget", type=float, default=0.05, help="MISTRAL_HEDGE_BUDGET for the bot")
+    parser.add_argument("--discord-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run_load(args))
+
+
+if __name__ == "__main__":
+    main()
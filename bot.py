@@ -2,34 +2,99 @@ import os
 import discord
 import logging
 import asyncio
-from discord.ext import commands, tasks
+from discord.ext import commands
 from dotenv import load_dotenv
-from agent import MistralAgent
-from googlesearch import search
-from collections import defaultdict
+
+# Load .env before the project modules below, which read their settings when imported
+load_dotenv()
+
+import metrics
+from agent import AgentError, DeadlineExceeded
+from app import App
+from discord_output import sender_for
+from jobs import JobQueueFull
+from multiagent import (
+    build_brainstormer_context, build_critic_context, build_search_context, build_search_results_context,
+    run_session, search_evidence
+)
+from prompts import PromptBuilder, is_valid_search_decision
 from datetime import datetime, timedelta
 
 PREFIX = "!"
 
 logger = logging.getLogger("discord")
 
-load_dotenv()
+# "lean" subscribes only to what the prefix commands need. "full" is the old Intents.all()
+# setup, which also receives presences and members and chunks every guild at startup.
+GATEWAY_MODE = os.getenv("DISCORD_GATEWAY_MODE", "lean")
+# Messages kept in discord.py's cache in lean mode (the library default is 1000)
+MESSAGE_CACHE_SIZE = int(os.getenv("DISCORD_MESSAGE_CACHE_SIZE", "100"))
+# "" for a single gateway connection, "auto" for Discord's recommended shard count, or a number
+SHARD_COUNT = os.getenv("DISCORD_SHARD_COUNT", "")
+
+def build_bot():
+    """Create the bot with the intents, caches and sharding chosen by the settings above"""
+    if GATEWAY_MODE == "full":
+        options = {"intents": discord.Intents.all()}
+    else:
+        intents = discord.Intents.none()
+        # Guilds keeps the channel cache that reminder delivery looks channels up in
+        intents.guilds = True
+        intents.guild_messages = True
+        # Commands sent in a DM arrive through this intent, not guild_messages
+        intents.dm_messages = True
+        intents.message_content = True
+        options = {
+            "intents": intents,
+            "chunk_guilds_at_startup": False,
+            "member_cache_flags": discord.MemberCacheFlags.none(),
+            "max_messages": MESSAGE_CACHE_SIZE,
+        }
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=PREFIX, intents=intents)
+    bot_class = commands.Bot
+    if SHARD_COUNT:
+        bot_class = commands.AutoShardedBot
+        if SHARD_COUNT != "auto":
+            options["shard_count"] = int(SHARD_COUNT)
+    return bot_class(command_prefix=PREFIX, **options)
 
-agent = MistralAgent()
+bot = build_bot()
 
 token = os.getenv("DISCORD_TOKEN")
 
-user_memories = defaultdict(list)
-MAX_MEMORY_LENGTH = 10
-
-scheduled_reminders = []
-
-class FakeMessage:
-    def __init__(self, content):
-        self.content = content
+async def send_reminder(reminder):
+    """
+    Deliver a due reminder to the channel it was set in. Raises if it couldn't be sent,
+    so the scheduler logs it and keeps the stored reminder.
+    """
+    channel = bot.get_channel(reminder['channel_id'])
+    if channel is None:
+        # DM channels aren't cached until they're used again, e.g. after a restart
+        channel = await bot.fetch_channel(reminder['channel_id'])
+    mention = f"<@{reminder['user_id']}>"
+    message = await sender_for(channel).send(f"{mention} Reminder: {reminder['message']}")
+    if message is None:
+        raise RuntimeError(f"Couldn't post the reminder in channel {reminder['channel_id']}")
+
+# The agent, search, state and queues are created on first use, not at import
+app = App(deliver_reminder=send_reminder)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Set METRICS_PORT to "" to turn the metrics endpoint off
+METRICS_PORT = os.getenv("METRICS_PORT", "9108")
+metrics_server = None
+
+def service_size(name):
+    """len() of an app service for a gauge, 0 if it hasn't been built so a scrape never builds it"""
+    return len(getattr(app, name)) if app.started(name) else 0
+
+metrics.REGISTRY.gauge("bot_reminder_queue_depth", "Pending reminders", fn=lambda: service_size("reminder_scheduler"))
+metrics.REGISTRY.gauge("bot_multiagent_queue_depth", "Queued multiagent runs", fn=lambda: service_size("multiagent_jobs"))
+metrics.REGISTRY.gauge("bot_memory_users", "Users with conversation memory", fn=lambda: service_size("user_memories"))
+
+# Commands whose prompts are deterministic enough to answer from the response cache.
+# Set RESPONSE_CACHE_COMMANDS to a comma separated list to change this, or to "" to opt out.
+CACHED_COMMANDS = set(filter(None, os.getenv("RESPONSE_CACHE_COMMANDS", "brainstorm,critique,searchagent").split(",")))
 
 @bot.event
 async def on_ready():
@@ -37,8 +102,12 @@ async def on_ready():
     Called when the client is done preparing the data received from Discord.
     Prints a message on the terminal when the bot successfully connects.
     """
+    global metrics_server
     logger.info(f"{bot.user} has connected to Discord!")
-    check_reminders.start()
+    app.reminder_scheduler.start()
+    await app.agent.warm_up()
+    if METRICS_PORT and metrics_server is None:
+        metrics_server = await metrics.start_http_server(METRICS_HOST, int(METRICS_PORT))
 
 @bot.event
 async def on_message(message: discord.Message):
@@ -56,41 +125,47 @@ async def on_message(message: discord.Message):
         
     await bot.process_commands(message)
 
+@bot.event
+async def on_command_error(ctx, error):
+    """Report failures from the Mistral client to the user instead of failing silently"""
+    original = getattr(error, "original", error)
+    if isinstance(original, DeadlineExceeded):
+        logger.error(f"Deadline exceeded in !{ctx.command}: {original}")
+        await reply(ctx, "Sorry, that took too long to answer. Please try again, or ask a simpler question.")
+    elif isinstance(original, AgentError):
+        logger.error(f"Agent error in !{ctx.command}: {original}")
+        await reply(ctx, "Sorry, the AI service is unavailable right now. Please try again in a moment.")
+    elif isinstance(error, commands.CommandNotFound):
+        return
+    elif isinstance(error, commands.CheckFailure):
+        await reply(ctx, "You don't have permission to use this command.")
+    else:
+        logger.error(f"Error in !{ctx.command}: {error}", exc_info=original)
+
+async def reply(ctx, content):
+    """
+    Send content to the command's channel through its paced ChannelSender, split to fit
+    Discord's message limit, and wait until it has been posted
+    """
+    return await sender_for(ctx.channel, ctx.message.id).send(content)
+
+def use_cache_for(ctx):
+    """Whether this command's responses may come from the response cache"""
+    return ctx.command.name in CACHED_COMMANDS
+
 def get_user_memory(user_id):
-    """Retrieve the conversation memory for a specific user"""
-    return user_memories[user_id]
+    """Retrieve a snapshot of the conversation memory for a specific user"""
+    return PromptBuilder(app.user_memories.get(user_id))
 
-def add_to_memory(user_id, role, content):
+async def add_to_memory(user_id, role, content):
     """Add a new message to the user's conversation memory"""
-    user_memories[user_id].append(f"{role}: {content}")
-    if len(user_memories[user_id]) > MAX_MEMORY_LENGTH:
-        user_memories[user_id].pop(0)
-
-@tasks.loop(seconds=30)
-async def check_reminders():
-    """Check if any reminders are due and send messages"""
-    current_time = datetime.now()
-    
-    due_reminders = []
-    for reminder in scheduled_reminders:
-        if current_time >= reminder['due_time']:
-            due_reminders.append(reminder)
-    
-    for reminder in due_reminders:
-        try:
-            channel = bot.get_channel(reminder['channel_id'])
-            if channel:
-                mention = f"<@{reminder['user_id']}>"
-                await channel.send(f"{mention} Reminder: {reminder['message']}")
-        except Exception as e:
-            logger.error(f"Error sending reminder: {e}")
-        
-        scheduled_reminders.remove(reminder)
+    await app.user_memories.hydrate(user_id)
+    app.user_memories.add(user_id, role, content)
 
 @bot.command(name="remindme", help="Set a reminder. Format: !remindme [message] [time]h|m. Example: !remindme 'Submit report' 2h")
 async def remindme(ctx, *, reminder_text=None):
     if reminder_text is None:
-        await ctx.send("Please provide a reminder message and time. Format: `!remindme [message] [time]h|m`")
+        await reply(ctx, "Please provide a reminder message and time. Format: `!remindme [message] [time]h|m`")
         return
     
     try:
@@ -116,52 +191,52 @@ async def remindme(ctx, *, reminder_text=None):
             'message': message,
             'due_time': due_time
         }
-        scheduled_reminders.append(reminder)
+        app.reminder_scheduler.add(reminder)
         
         time_str = due_time.strftime("%H:%M:%S")
-        await ctx.send(f"I'll remind you about '{message}' at {time_str}.")
+        await reply(ctx, f"I'll remind you about '{message}' at {time_str}.")
     
     except Exception as e:
-        await ctx.send(f"Error setting reminder: {e}. Please use format: `!remindme [message] [time]h|m`")
+        await reply(ctx, f"Error setting reminder: {e}. Please use format: `!remindme [message] [time]h|m`")
 
 @bot.command(name="ping", help="Pings the bot.")
 async def ping(ctx, *, arg=None):
     if arg is None:
-        await ctx.send("Pong!")
+        await reply(ctx, "Pong!")
     else:
-        await ctx.send(f"Pong! Your argument was {arg}")
+        await reply(ctx, f"Pong! Your argument was {arg}")
 
 @bot.command(name="brainstorm", help="Get creative ideas from the Brainstormer agent.")
 async def brainstorm(ctx, *, question=None):
     if question is None:
-        await ctx.send("Please provide a question for the Brainstormer.")
+        await reply(ctx, "Please provide a question for the Brainstormer.")
         return
     
     user_id = ctx.author.id
-    add_to_memory(user_id, "User", question)
+    await add_to_memory(user_id, "User", question)
     
     conversation_log = get_user_memory(user_id)
     brainstormer_prompt = build_brainstormer_context(conversation_log, 1, 1)
-    response = await agent.run(FakeMessage(brainstormer_prompt))
+    response = await app.agent.complete(brainstormer_prompt, user_id=ctx.author.id, role="Brainstormer", use_cache=use_cache_for(ctx))
     
-    add_to_memory(user_id, "Brainstormer", response)
-    await ctx.send(f"**Brainstormer's Response:**\n{response}")
+    await add_to_memory(user_id, "Brainstormer", response)
+    await reply(ctx, f"**Brainstormer's Response:**\n{response}")
 
 @bot.command(name="critique", help="Get feedback from the Critic agent.")
 async def critique(ctx, *, idea=None):
     if idea is None:
-        await ctx.send("Please provide an idea for the Critic to evaluate.")
+        await reply(ctx, "Please provide an idea for the Critic to evaluate.")
         return
     
     user_id = ctx.author.id
-    add_to_memory(user_id, "User", idea)
+    await add_to_memory(user_id, "User", idea)
     
     conversation_log = get_user_memory(user_id)
     critic_prompt = build_critic_context(conversation_log, 1, 1)
-    response = await agent.run(FakeMessage(critic_prompt))
+    response = await app.agent.complete(critic_prompt, user_id=ctx.author.id, role="Critic", use_cache=use_cache_for(ctx))
     
-    add_to_memory(user_id, "Critic", response)
-    await ctx.send(f"**Critic's Response:**\n{response}")
+    await add_to_memory(user_id, "Critic", response)
+    await reply(ctx, f"**Critic's Response:**\n{response}")
 
 @bot.command(name="commands", help="Displays available commands.")
 async def custom_help(ctx):
@@ -170,12 +245,13 @@ async def custom_help(ctx):
 
 - `!help_roles` - Shows all available agent roles.
 - `!clear_memory` - Clears your conversation history with the bot.
+- `!cancel` - Cancels your queued or running multi-agent conversations.
 - `!remindme <message> <time>` - Sets a reminder. (e.g., `!remindme "Continue Brainstorming" 2h`).
 - `!ping` - Checks if the bot is online.
 
 Use `!help <command>` for details on a specific command.
 """
-    await ctx.send(help_text)
+    await reply(ctx, help_text)
 
 @bot.command(name="help_roles", help="Shows available agent roles and their functions.")
 async def help_roles(ctx):
@@ -199,93 +275,11 @@ async def help_roles(ctx):
    - Example: `!multiagent What's the best way to learn machine learning?`
    - Optional: Use `--search` to include web search in the response.
      - Example: `!multiagent --search Best ways to invest in stocks`
+   - Optional: Use `--trace` to get a timing breakdown of the run.
 
 Use `!help <command>` for details on a specific command.
 """
-    await ctx.send(help_text)
-
-def build_search_context(log, iteration, iteration_limit):
-    """
-    First prompt: The Search Agent decides if it needs to do a Google search.
-    It may respond with 'DO_SEARCH: <query>' if it wants you to gather info,
-    or it may respond with a direct answer if no search is needed.
-    """
-    context = "[System]\n"
-    context += (
-        "You are the Search agent. Your role is to determine if a web search is required "
-        "to gather factual information. If you decide to do a search, respond with a line "
-        "starting with 'DO_SEARCH:' followed by the query terms. If no search is needed, "
-        "just provide a direct answer.\n"
-    )
-    context += f"Iteration limit: {iteration_limit}.\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n"
-    context += "Search Agent:\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
-    return context
-
-
-def build_search_results_context(log, search_results, iteration, iteration_limit):
-    """
-    Second prompt: The Search Agent processes and organizes search results
-    to produce a comprehensive, insight-driven summary.
-    """
-    context = "[System]\n"
-    context += (
-        "You are the Search agent. Below is organized information returned by your Google search. "
-        "Synthesize a comprehensive answer that directly addresses the user's original question. "
-        "Focus on extracting key insights and presenting them in a logical flow. "
-        "Provide specific details and facts from multiple sources when available. "
-        "Your response should be 3-5 sentences, coherent and complete. "
-    )
-    
-    user_question = ""
-    for entry in reversed(log):
-        if entry.startswith("User:"):
-            user_question = entry[6:].strip()
-            break
-    
-    context += f"\n[Original Question]\n{user_question}\n\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n\n"
-
-    context += "[Processed Search Results]\n"
-    
-    highly_relevant = []
-    somewhat_relevant = []
-
-    question_keywords = set(user_question.lower().split())
-    for res in search_results[:5]:
-        title_and_desc = (res.title + " " + res.description).lower()
-        keyword_matches = sum(1 for keyword in question_keywords if keyword in title_and_desc)
-        
-        if keyword_matches >= 2:
-            highly_relevant.append(res)
-        else:
-            somewhat_relevant.append(res)
-    
-    context += "Most Relevant Information:\n"
-    for i, res in enumerate(highly_relevant, 1):
-        context += f"{i}. {res.title}\n   Key Points: {res.description}\n\n"
-    
-    context += "Additional Information:\n"
-    for i, res in enumerate(somewhat_relevant, 1):
-        context += f"{i}. {res.title}\n   Details: {res.description}\n\n"
-    
-    context += "Key Facts:\n"
-    all_text = " ".join(res.description for res in search_results[:5])
-    sentences = [s.strip() for s in all_text.split('.') if s.strip()]
-    fact_sentences = []
-    for sentence in sentences:
-        if any(keyword in sentence.lower() for keyword in question_keywords):
-            fact_sentences.append(sentence)
-    
-    for i, fact in enumerate(fact_sentences[:5], 1):
-        context += f"- {fact}.\n"
-    
-    context += "\nSearch Agent:\n"
-    return context
+    await reply(ctx, help_text)
 
 @bot.command(name="searchagent", help="Use the search agent to gather info from Google.")
 async def searchagent_cmd(ctx, *, question=None):
@@ -296,189 +290,157 @@ async def searchagent_cmd(ctx, *, question=None):
       3) Agent summarizes the search results.
     """
     if question is None:
-        await ctx.send("Please provide a query or question for the Search Agent.")
+        await reply(ctx, "Please provide a query or question for the Search Agent.")
         return
 
     user_id = ctx.author.id
-    add_to_memory(user_id, "User", question)
+    await add_to_memory(user_id, "User", question)
     
     conversation_log = get_user_memory(user_id)
     iteration_limit = 2
     current_iteration = 1
 
     search_prompt = build_search_context(conversation_log, current_iteration, iteration_limit)
-    initial_response = await agent.run(FakeMessage(search_prompt))
+    initial_response = await app.agent.complete(search_prompt, user_id=ctx.author.id, role="Search", use_cache=use_cache_for(ctx), validate=is_valid_search_decision)
     
-    add_to_memory(user_id, "SearchAgent", initial_response)
+    await add_to_memory(user_id, "SearchAgent", initial_response)
 
     if "DO_SEARCH:" in initial_response:
         search_query = initial_response.split("DO_SEARCH:")[1].strip()
 
-        await ctx.send(f"**Search Agent**: Performing Google search for: `{search_query}`")
+        await reply(ctx, f"**Search Agent**: Performing Google search for: `{search_query}`")
 
-        raw_results = list(search(search_query, num_results=5, advanced=True))
+        try:
+            evidence = await search_evidence(app, question, search_query)
+        except Exception as e:
+            logger.error(f"Error running search: {e}")
+            await reply(ctx, "**Search Agent**: The search failed, please try again later.")
+            return
 
         current_iteration += 1
+        conversation_log = get_user_memory(user_id)
         search_results_prompt = build_search_results_context(
-            conversation_log, raw_results, current_iteration, iteration_limit
+            conversation_log, evidence, current_iteration, iteration_limit
         )
-        final_summary = await agent.run(FakeMessage(search_results_prompt))
+        final_summary = await app.agent.complete(search_results_prompt, user_id=ctx.author.id, role="SearchSummary")
         
-        add_to_memory(user_id, "SearchAgent", final_summary)
-        await ctx.send("**Search Agent Summary**:\n" + final_summary)
+        await add_to_memory(user_id, "SearchAgent", final_summary)
+        await reply(ctx, "**Search Agent Summary**:\n" + final_summary)
     else:
-        await ctx.send("**Search Agent** did not request a search. Response:\n" + initial_response)
-
-
-def build_brainstormer_context(log, iteration, iteration_limit):
-    context = "[System]\n"
-    context += ("You are the Brainstormer agent. Your task is to generate creative and analytical ideas "
-                "to address the user's query. Use the full conversation history below to build on previous ideas and refine your suggestions. "
-                "If search results are included in the conversation, treat them as accurate and current information. "
-                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
-                "Don't overcomplicate problems - when an answer is clear, answer directly without trying to find hidden meanings. "
-                "Only use deeper reasoning when questions are genuinely complex or difficult. ")
-    context += f"You have an iteration limit of {iteration_limit} rounds; if this is the final round, provide a summary of your best proposals.\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n"
-    context += "Brainstormer:\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
-    return context
-
-def build_critic_context(log, iteration, iteration_limit):
-    context = "[System]\n"
-    context += ("You are the Critic agent. Your task is to evaluate the brainstormed ideas, flag any flaws or inaccuracies, "
-                "and suggest improvements. Use the full conversation history below to ensure your feedback is thorough and relevant. "
-                "If search results are included in the conversation, treat them as accurate and current information - do not question their validity. "
-                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
-                "Don't overcomplicate problems - when an answer is clear, focus on direct feedback without trying to find hidden meanings. "
-                "Only use deeper critical analysis when questions are genuinely complex or difficult. ")
-    context += f"The iteration limit is {iteration_limit} rounds; if this is the final round, emphasize the key points that need to be resolved.\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n"
-    context += "Critic:\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
-    return context
-
-def build_synthesizer_context(log, iteration, iteration_limit):
-    context = "[System]\n"
-    context += ("You are the Synthesizer agent. Your task is to transform the brainstormed ideas and critiques into concrete, "
-                "actionable steps or solutions. Focus on practicality and implementation details. "
-                "Consider both the creative suggestions from the Brainstormer and the concerns raised by the Critic. "
-                "If search results are included in the conversation, incorporate this factual information into your synthesis. "
-                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
-                "Prioritize specific, implementable solutions over theoretical discussions. "
-                "If technical details are relevant, include them concisely.")
-    context += f"The iteration limit is {iteration_limit} rounds; if this is the final round, focus on the most viable solution.\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n"
-    context += "Synthesizer:\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
-    return context
-
-def build_moderator_context(log, iteration, iteration_limit):
-    context = "[System]\n"
-    context += ("You are the Moderator agent. Your role is to manage the dialogue between the Brainstormer and Critic and Synthesizer agents. "
-                "Review the full conversation history below and determine who should contribute next. Ensure that the conversation stays "
-                "on track and converges to a coherent answer. "
-                "If search results are included in the conversation, ensure they are properly incorporated as factual information. "
-                "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
-                "You don't need to use all iterations - if a clear answer has been reached, end the conversation early. It is critical that you do not overcomplicate or over-iterate, \
-                    but also do not end the conversation prematurely if what the Synthesizer provided is not yet complete.")
-    context += f"The iteration limit is {iteration_limit} rounds.\n"
-    context += "[Conversation History]\n"
-    context += "\n".join(log) + "\n"
-    context += "Moderator:\n"
-    context += f"[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n"
-    context += ("If the conversation should continue, provide your thoughts. "
-                "If the conversation is complete, end with 'CONVO_OVER. SUMMARY: [your summary of the key points and conclusion. \
-                    If the question was simple, keep this to 1-2 sentences. If the question was complex/technical, you can write 5-6 sentences. \
-                    Note that this summary is to be displayed to the user, so you shouldn't mention things about the thought process, just the answer]'")
-    return context
+        await reply(ctx, "**Search Agent** did not request a search. Response:\n" + initial_response)
+
 
 @bot.command(name="multiagent", help="Ask Mistral a question using a multi-agent conversation. Use --search to include web search results.")
 async def multiagent(ctx, *, question=None):
     if question is None:
-        await ctx.send("Please provide an input for the multiagent conversation.")
+        await reply(ctx, "Please provide an input for the multiagent conversation.")
         return
         
     use_search = False
-    if question.startswith("--search "):
-        use_search = True
-        question = question[len("--search "):].strip()
+    use_trace = False
+    while question.startswith("--search ") or question.startswith("--trace "):
+        if question.startswith("--search "):
+            use_search = True
+            question = question[len("--search "):].strip()
+        else:
+            use_trace = True
+            question = question[len("--trace "):].strip()
     
-    conversation_log = [f"User: {question}"]
-    iteration_limit = 3
-    current_iteration = 1
-
-    await ctx.send("**Starting multi-agent conversation...**")
+    # Multiagent runs go through the job queue so they can't swamp the API quota, identical
+    # questions in the same channel share one run, and users can !cancel them
+    key = (ctx.channel.id, use_search, " ".join(question.lower().split()))
+    try:
+        job, is_new = app.multiagent_jobs.submit(
+            ctx.author.id, key, lambda: multiagent_session(ctx, question, use_search, use_trace)
+        )
+    except JobQueueFull as e:
+        await reply(ctx, str(e))
+        return
     
-    if use_search:
-        await ctx.send("**Searching for information first...**")
-        search_prompt = build_search_context(conversation_log, 1, 2)
-        search_decision = await agent.run(FakeMessage(search_prompt))
-        
-        if "DO_SEARCH:" in search_decision:
-            search_query = search_decision.split("DO_SEARCH:")[1].strip()
-            await ctx.send(f"**Search Agent**: Performing Google search for: `{search_query}`")
-            
-            raw_results = list(search(search_query, num_results=5, advanced=True))
-            
-            search_results_prompt = build_search_results_context(
-                conversation_log, raw_results, 2, 2
-            )
-            search_summary = await agent.run(FakeMessage(search_results_prompt))
-            
-            search_date = "as of today's date"
-            search_preamble = f"[The following information was gathered from a Google search {search_date} and should be considered accurate factual information]"
-            conversation_log.append(f"SearchResults: {search_preamble}\n{search_summary}")
-            await ctx.send(f"**Search Results**:\n{search_summary}")
-
-    divider = "\n--------------------------------\n"
+    if not is_new:
+        await reply(ctx, "That question is already being answered in this channel, follow along there.")
+    else:
+        position = app.multiagent_jobs.position(job)
+        if position:
+            await reply(ctx, f"Your multi-agent request is #{position} in the queue, it will start shortly.")
     
-    while current_iteration <= iteration_limit:
-        await ctx.send(f"**Iteration {current_iteration} of {iteration_limit}**")
-        
-        brainstormer_prompt = build_brainstormer_context(conversation_log, current_iteration, iteration_limit)
-        brainstormer_response = await agent.run(FakeMessage(brainstormer_prompt))
-        conversation_log.append(f"Brainstormer: {brainstormer_response}")
-        await ctx.send("**Brainstormer:**\n" + brainstormer_response + divider)
-        
-        critic_prompt = build_critic_context(conversation_log, current_iteration, iteration_limit)
-        critic_response = await agent.run(FakeMessage(critic_prompt))
-        conversation_log.append(f"Critic: {critic_response}")
-        await ctx.send("**Critic:**\n" + critic_response + divider)
-        
-        synthesizer_prompt = build_synthesizer_context(conversation_log, current_iteration, iteration_limit)
-        synthesizer_response = await agent.run(FakeMessage(synthesizer_prompt))
-        conversation_log.append(f"Synthesizer: {synthesizer_response}")
-        await ctx.send("**Synthesizer:**\n" + synthesizer_response + divider)
-        
-        moderator_prompt = build_moderator_context(conversation_log, current_iteration, iteration_limit)
-        moderator_response = await agent.run(FakeMessage(moderator_prompt))
-        conversation_log.append(f"Moderator: {moderator_response}")
-        await ctx.send("**Moderator:**\n" + moderator_response + divider)
-        
-        if "CONVO_OVER" in moderator_response:
-            try:
-                summary_text = moderator_response.split("SUMMARY:")[1].strip()
-                await ctx.send("```\n== FINAL RESPONSE ==\n```\n**" + summary_text + "**\n```\nEnd of multi-agent conversation\n```")
-            except IndexError:
-                await ctx.send("```\n== FINAL RESPONSE ==\n```\n**Conversation complete. No detailed summary provided.**\n```\nEnd of multi-agent conversation\n```")
-            break
-
-        current_iteration += 1
+    try:
+        await app.multiagent_jobs.wait(job)
+    except asyncio.CancelledError:
+        if not job.cancelled:
+            raise
+        if is_new:
+            await reply(ctx, "Multi-agent conversation cancelled.")
+        else:
+            # Merged into someone else's run, so let them know it won't be answered there
+            await reply(ctx, "The conversation answering your question was cancelled by the user who started it, please ask again.")
+    except Exception:
+        # The owner's command reports the error, merged requesters only wait on the result
+        if is_new:
+            raise
+
+async def multiagent_session(ctx, question, use_search, use_trace):
+    # Output is queued and sent in the background so Discord round-trips overlap with LLM calls
+    # Keyed by the command message so this session's output never merges with another's
+    sender = sender_for(ctx.channel, ctx.message.id)
+    with metrics.tracing() as trace, metrics.timed(metrics.command_latency, command="multiagent"):
+        try:
+            await run_session(app, ctx.author.id, sender, question, use_search)
+        finally:
+            await sender.drain()
     
-    if current_iteration > iteration_limit:
-        await ctx.send("**All iterations complete.**")
+    if use_trace:
+        await reply(ctx, f"**Timing trace:**\n```\n{trace.format()}\n```")
+
+@bot.command(name="cancel", help="Cancel your queued or running multi-agent conversations.")
+async def cancel(ctx):
+    cancelled = app.multiagent_jobs.cancel_user(ctx.author.id)
+    if cancelled:
+        await reply(ctx, f"Cancelling {cancelled} multi-agent conversation(s).")
+    else:
+        await reply(ctx, "You don't have any multi-agent conversations to cancel.")
+
+@bot.command(name="stats", help="Shows latency and usage statistics (admins only).")
+@commands.has_permissions(administrator=True)
+async def stats(ctx):
+    lines = ["**Bot Statistics:**", "```"]
+    for role in ("Search", "SearchSummary", "Brainstormer", "Critic", "Synthesizer", "Moderator"):
+        count, mean = metrics.llm_latency.summary(role=role)
+        if count:
+            prompt_tokens = metrics.llm_tokens.get(kind="prompt", role=role)
+            completion_tokens = metrics.llm_tokens.get(kind="completion", role=role)
+            lines.append(f"{role:<14} calls={count:<5} mean={mean:.2f}s tokens in/out={prompt_tokens}/{completion_tokens}")
+    count, mean = metrics.search_latency.summary()
+    lines.append(f"{'Search lookups':<14} calls={count:<5} mean={mean:.2f}s")
+    count, mean = metrics.discord_send_latency.summary(operation="send")
+    lines.append(f"{'Discord sends':<14} calls={count:<5} mean={mean:.2f}s")
+    cache = app.agent.cache.stats
+    lines.append(f"Response cache: {cache['memory_hits']} memory hits, {cache['disk_hits']} disk hits, {cache['misses']} misses")
+    lines.append(f"Pending reminders: {len(app.reminder_scheduler)}")
+    lines.append(f"Queued multi-agent runs: {len(app.multiagent_jobs)}")
+    exits = {reason: metrics.multiagent_exits.get(reason=reason) for reason in ("converged", "moderator", "limit", "deadline")}
+    lines.append("Multi-agent endings: " + ", ".join(f"{reason}={count}" for reason, count in exits.items()))
+    lines.append("```")
+    await reply(ctx, "\n".join(lines))
 
 @bot.command(name="clear_memory", help="Clear your conversation history with the bot.")
 async def clear_memory(ctx):
     user_id = ctx.author.id
-    if user_id in user_memories:
-        user_memories[user_id] = []
-        await ctx.send("Your conversation history has been cleared.")
+    await app.user_memories.hydrate(user_id)
+    if app.user_memories.clear(user_id):
+        await reply(ctx, "Your conversation history has been cleared.")
     else:
-        await ctx.send("You don't have any conversation history to clear.")
+        await reply(ctx, "You don't have any conversation history to clear.")
 
-bot.run(token)
\ No newline at end of file
+async def main():
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await app.close()
+
+if __name__ == "__main__":
+    discord.utils.setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+import os
+
+from tokens import estimate_tokens, extend_summary, truncate_to_tokens
+
+# Token budget for the conversation history sent with each multiagent prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2500"))
+# Turns kept verbatim at the end of the log, one full iteration of the four roles
+KEEP_RECENT_TURNS = 4
+SUMMARY_WORDS = 150
+# Compaction aims for this fraction of the budget so it isn't needed again on the very next turn
+COMPACT_TARGET = 0.6
+
+SUMMARY_PREFIX = "Summary:"
+# Entries that are never folded into the summary
+PINNED_PREFIXES = ("User:", "SearchResults:")
+
+
+def extractive_summary(previous_summary, turns, max_words=SUMMARY_WORDS):
+    """Local fallback summary: the first sentence of each turn, newest kept when over length"""
+    return extend_summary(previous_summary, turns, max_words=max_words)
+
+
+async def compact_log(log, summarize=None, budget=HISTORY_TOKEN_BUDGET, keep_recent=KEEP_RECENT_TURNS):
+    """
+    Keep a PromptBuilder's history under budget estimated tokens before the next prompt is sent.
+
+    When over budget, every turn except the user's question, search results and the newest
+    turns (at most keep_recent, and no more than fit in COMPACT_TARGET of the budget) is
+    folded into a single running summary entry. summarize is an async
+    callable (previous_summary, turns) -> str, typically an LLM call; without one, or if it
+    fails, a local extractive summary is used. If the log is still over budget after that,
+    the longest remaining turns are truncated. Returns True if the log was changed.
+    """
+    if log.tokens <= budget:
+        return False
+
+    entries = log.log
+    # Keep up to keep_recent of the newest turns verbatim, fewer if they alone would
+    # take up most of the budget, but always at least the latest one
+    target = budget * COMPACT_TARGET
+    split = len(entries) - 1
+    kept_tokens = estimate_tokens(entries[-1]) if entries else 0
+    while split > 0 and len(entries) - split < keep_recent:
+        candidate = estimate_tokens(entries[split - 1])
+        if entries[split - 1].startswith(PINNED_PREFIXES) or kept_tokens + candidate > target:
+            break
+        kept_tokens += candidate
+        split -= 1
+    split = max(split, 0)
+    older, recent = entries[:split], entries[split:]
+    pinned = [entry for entry in older if entry.startswith(PINNED_PREFIXES)]
+    previous_summary = " ".join(
+        entry[len(SUMMARY_PREFIX):].strip() for entry in older if entry.startswith(SUMMARY_PREFIX)
+    )
+    to_fold = [entry for entry in older if not entry.startswith(PINNED_PREFIXES + (SUMMARY_PREFIX,))]
+
+    summary = previous_summary
+    if to_fold:
+        summary = None
+        if summarize is not None:
+            try:
+                summary = await summarize(previous_summary, to_fold)
+            except Exception:
+                summary = None
+        if not summary:
+            summary = extractive_summary(previous_summary, to_fold)
+
+    new_log = pinned + ([f"{SUMMARY_PREFIX} {summary}"] if summary else []) + recent
+
+    # Still over budget: shorten the longest unpinned turns until it fits
+    total = sum(estimate_tokens(entry) for entry in new_log)
+    while total > budget:
+        candidates = [i for i, entry in enumerate(new_log) if not entry.startswith(PINNED_PREFIXES)]
+        if not candidates:
+            break
+        longest = max(candidates, key=lambda i: len(new_log[i]))
+        before = estimate_tokens(new_log[longest])
+        target = max(32, before - (total - budget))
+        if target >= before:
+            break
+        new_log[longest] = truncate_to_tokens(new_log[longest], target)
+        total += estimate_tokens(new_log[longest]) - before
+
+    log.reset(new_log)
+    return True
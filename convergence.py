@@ -0,0 +1,56 @@
+import math
+import os
+from collections import Counter
+
+from retrieval import tokenize
+
+# Cosine similarity between consecutive Synthesizer answers at which the run is treated as
+# settled and ends without asking the Moderator
+CONVERGENCE_THRESHOLD = float(os.getenv("MULTIAGENT_CONVERGENCE_THRESHOLD", "0.7"))
+
+_SUFFIXES = ("ing", "ed", "s")
+
+
+def stem(word):
+    """Strip a common inflection so "milestones" and "milestone" count as one term"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def term_vector(text):
+    """Sparse sublinear term-frequency vector of text's stemmed terms, as a dict of term -> weight"""
+    counts = Counter(stem(word) for word in tokenize(text))
+    return {term: 1 + math.log(count) for term, count in counts.items()}
+
+
+def cosine_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(weight * b.get(term, 0.0) for term, weight in a.items())
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm
+
+
+class ConvergenceDetector:
+    """
+    Tracks the Synthesizer's answers in one multiagent run. observe() compares each answer
+    with the previous one by cosine similarity of their term vectors; once that reaches
+    threshold the agents are repeating themselves and further rounds (or a Moderator call
+    to confirm it) are unlikely to change the answer.
+    """
+
+    def __init__(self, threshold=CONVERGENCE_THRESHOLD):
+        self.threshold = threshold
+        self.previous = None
+        self.similarity = 0.0
+
+    def observe(self, text):
+        """Record a new answer, returns True if it has converged with the previous one"""
+        vector = term_vector(text)
+        self.similarity = cosine_similarity(self.previous, vector) if self.previous is not None else 0.0
+        self.previous = vector
+        return self.similarity >= self.threshold
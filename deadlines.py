@@ -0,0 +1,99 @@
+import contextvars
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Longest a single agent.complete / complete_stream call may take, retries included
+CALL_TIMEOUT = float(os.getenv("MISTRAL_CALL_TIMEOUT", "60"))
+# Longest a whole !multiagent session may take
+SESSION_TIMEOUT = float(os.getenv("MULTIAGENT_DEADLINE", "300"))
+
+# Hedged requests: once a role has HEDGE_MIN_SAMPLES latencies on record, a request still
+# running after the HEDGE_PERCENTILE latency gets a duplicate, and whichever finishes first
+# wins. Empty turns hedging off. HEDGE_BUDGET caps duplicates as a share of all requests.
+HEDGE_PERCENTILE = os.getenv("MISTRAL_HEDGE_PERCENTILE", "")
+HEDGE_BUDGET = float(os.getenv("MISTRAL_HEDGE_BUDGET", "0.05"))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+
+class Deadline:
+    """A point in time (monotonic clock) by which some work has to be finished"""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+
+# The deadline of the session the current task is working for, if any
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Give everything awaited inside this block at most seconds; a surrounding scope can only make it shorter"""
+    deadline = effective_deadline(seconds)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def effective_deadline(seconds):
+    """A Deadline seconds from now, or the current scope's deadline if that comes first"""
+    deadline = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires < deadline.expires:
+        return outer
+    return deadline
+
+
+class HedgePolicy:
+    """
+    Decides when to send a duplicate of a slow request. Keeps a rolling window of observed
+    latencies per key (role) and reports the configured percentile of it as the hedge delay.
+    Hedges are drawn from a budget that grows by budget for every request sent, so they
+    never add more than that share of extra requests.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET,
+                 min_samples=HEDGE_MIN_SAMPLES, window=HEDGE_WINDOW):
+        self.percentile = float(percentile) if percentile else None
+        self.budget = budget
+        self.min_samples = min_samples
+        self.window = window
+        self.tokens = 1.0
+        self._samples = {}
+
+    def observe(self, key, seconds):
+        samples = self._samples.setdefault(key, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def delay(self, key):
+        """How long to wait before hedging a request for key, or None if it shouldn't be hedged"""
+        if self.percentile is None:
+            return None
+        self.tokens = min(max(1.0, self.budget * self.window), self.tokens + self.budget)
+        samples = self._samples.get(key)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        # A little jitter so requests that started together don't all hedge at once
+        return ordered[index] * random.uniform(1.0, 1.1)
+
+    def try_acquire(self):
+        """Take one hedge from the budget, returns False if it's used up"""
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
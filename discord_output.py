@@ -0,0 +1,349 @@
+import asyncio
+import contextvars
+import logging
+import time
+import weakref
+from collections import deque
+from contextlib import nullcontext
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger("discord")
+
+DISCORD_MESSAGE_LIMIT = 2000
+# Discord allows roughly 5 message edits per 5 seconds per channel
+STREAM_EDIT_INTERVAL = 1.2
+# Discord's per-channel limit on message sends and edits. The sender allows a burst of
+# CHANNEL_BURST and refills so that no CHANNEL_RATE_PERIOD window has more than CHANNEL_RATE_LIMIT
+CHANNEL_RATE_LIMIT = 5
+CHANNEL_RATE_PERIOD = 5.0
+CHANNEL_BURST = 2
+
+CODE_FENCE = "```"
+
+
+def find_split_point(text, limit):
+    """
+    Find where to cut text so the first part fits in limit, preferring a paragraph break,
+    then a line break, the end of a sentence and finally a space
+    """
+    if len(text) <= limit:
+        return len(text)
+    cut = text.rfind("\n\n", limit // 2, limit)
+    if cut > 0:
+        return cut + 2
+    for separator in ("\n", ". ", " "):
+        cut = text.rfind(separator, 0, limit)
+        if cut > 0:
+            return cut + len(separator)
+    return limit
+
+
+def split_message(text, limit=DISCORD_MESSAGE_LIMIT):
+    """
+    Split text into parts that each fit in a Discord message. A code block that has to be
+    cut is closed at the end of one part and reopened at the start of the next.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = find_split_point(text, limit - len(CODE_FENCE) - 1)
+        part, text = text[:cut], text[cut:]
+        if part.count(CODE_FENCE) % 2:
+            part += "\n" + CODE_FENCE
+            text = CODE_FENCE + "\n" + text
+        parts.append(part)
+    parts.append(text)
+    return parts
+
+
+class _Message:
+    __slots__ = ("blocks", "origin", "trace", "future", "sent", "queued", "rendered")
+
+    def __init__(self, blocks, origin, trace):
+        self.blocks = blocks
+        self.origin = origin
+        # The Trace of whoever queued this send or edit, its span is recorded there
+        self.trace = trace
+        self.future = asyncio.get_running_loop().create_future()
+        self.sent = False
+        self.queued = False
+        self.rendered = None
+
+    def render(self):
+        return "\n".join(block.content for block in self.blocks)
+
+
+class _Block:
+    """One send()'s content, as placed in a Discord message. Awaiting it gives that message"""
+
+    __slots__ = ("content", "message")
+
+    def __init__(self, content):
+        self.content = content
+        self.message = None
+
+    def __await__(self):
+        return self.message.future.__await__()
+
+
+class ChannelSender:
+    """
+    Ordered background send queue for one channel. send() and edit() return immediately
+    and a worker task performs the Discord calls one at a time in order, so callers can get
+    on with the next LLM call while messages go out.
+
+    Calls are paced by a token bucket matching the channel's rate limit instead of running
+    into 429s. While the worker waits, output coalesces: a send() that fits in the last
+    message from the same origin (e.g. one command or session) that hasn't gone out yet is
+    appended to it, and any number of edits to a message collapse into one. So the busier
+    the channel, the fewer REST calls each piece of output costs, while output from
+    different origins is never mixed into one message. Pacing stays channel-wide. Text
+    longer than a message is split with split_message.
+    Failed sends are logged and their messages resolve to None.
+    """
+
+    def __init__(self, channel, rate_limit=CHANNEL_RATE_LIMIT, rate_period=CHANNEL_RATE_PERIOD, burst=CHANNEL_BURST):
+        self.channel = channel
+        self.bucket = TokenBucket((rate_limit - burst) / rate_period, burst)
+        self._pending = deque()
+        # Each origin's newest message while it's still waiting to be sent
+        self._unsent = {}
+        self._worker = None
+
+    def send(self, content, origin=None):
+        """
+        Queue content to be posted, returns a handle for edit() that can be awaited for the
+        message. Content is only merged with earlier output of the same origin; None never merges.
+        """
+        parts = split_message(content)
+        for part in parts[:-1]:
+            self.send(part, origin)
+        block = _Block(parts[-1])
+
+        last = self._unsent.get(origin) if origin is not None else None
+        if last is not None and len(last.render()) + 1 + len(block.content) <= DISCORD_MESSAGE_LIMIT:
+            block.message = last
+            last.blocks.append(block)
+            metrics.discord_coalesced.inc()
+            return block
+
+        block.message = _Message([block], origin, metrics.current_trace())
+        if origin is not None:
+            self._unsent[origin] = block.message
+        self._enqueue(block.message)
+        return block
+
+    def edit(self, block, content):
+        """Replace the content of an earlier send()"""
+        if content == block.content:
+            return block
+        block.content = content
+        message = block.message
+        if message.sent and not message.queued:
+            message.trace = metrics.current_trace()
+            self._enqueue(message)
+        return block
+
+    def room(self, block):
+        """How long block's content can grow before its message goes over Discord's limit"""
+        others = sum(len(other.content) + 1 for other in block.message.blocks if other is not block)
+        return DISCORD_MESSAGE_LIMIT - others
+
+    async def drain(self):
+        """Wait until everything queued so far has been sent"""
+        while self._worker is not None and not self._worker.done():
+            await asyncio.shield(self._worker)
+
+    def _enqueue(self, message):
+        message.queued = True
+        self._pending.append(message)
+        if self._worker is None or self._worker.done():
+            # A fresh context, so nothing the worker does is attributed to the session that
+            # happened to start it; each message carries its own trace
+            self._worker = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        while self._pending:
+            message = self._pending[0]
+            if message.sent and message.render() == message.rendered:
+                # Edited back to what's already showing, nothing to send
+                self._pending.popleft()
+                message.queued = False
+                continue
+
+            # Take the message off the queue only once the channel has room, so output
+            # queued in the meantime can still be merged into it
+            await self.bucket.acquire()
+            self._pending.popleft()
+            message.queued = False
+            if self._unsent.get(message.origin) is message:
+                del self._unsent[message.origin]
+            content = self._fit(message)
+            try:
+                with metrics.tracing(message.trace) if message.trace is not None else nullcontext():
+                    if not message.sent:
+                        message.sent = True
+                        with metrics.timed(metrics.discord_send_latency, operation="send"):
+                            message.future.set_result(await self.channel.send(content))
+                    else:
+                        target = await message.future
+                        if target is not None:
+                            with metrics.timed(metrics.discord_send_latency, operation="edit"):
+                                await target.edit(content=content)
+            except Exception as e:
+                logger.error(f"Error sending message: {e}")
+                if not message.future.done():
+                    message.future.set_result(None)
+            message.rendered = content
+
+    def _fit(self, message):
+        # If edits have grown a coalesced message past the limit, move its trailing blocks
+        # into a new message that goes out next
+        content = message.render()
+        if len(content) > DISCORD_MESSAGE_LIMIT and len(message.blocks) > 1:
+            size = len(message.blocks[0].content)
+            keep = 1
+            while keep < len(message.blocks) and size + 1 + len(message.blocks[keep].content) <= DISCORD_MESSAGE_LIMIT:
+                size += 1 + len(message.blocks[keep].content)
+                keep += 1
+            overflow = _Message(message.blocks[keep:], message.origin, message.trace)
+            for block in overflow.blocks:
+                block.message = overflow
+            message.blocks = message.blocks[:keep]
+            overflow.queued = True
+            self._pending.appendleft(overflow)
+            if message.origin is not None:
+                # Later output from the same origin can still join the overflow, which goes out next
+                self._unsent.setdefault(message.origin, overflow)
+            content = message.render()
+        return content[:DISCORD_MESSAGE_LIMIT]
+
+
+class TranscriptSender:
+    """
+    Stand-in for ChannelSender when there is no Discord channel, e.g. batch runs. Keeps
+    the messages that would have been posted, with edits applied, in self.messages.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, content, origin=None):
+        self.messages.append(content)
+        return len(self.messages) - 1
+
+    def edit(self, message, content):
+        self.messages[message] = content
+        return message
+
+    def room(self, message):
+        return DISCORD_MESSAGE_LIMIT
+
+    async def drain(self):
+        return
+
+    def text(self):
+        return "\n".join(self.messages)
+
+
+# Weak, so a sender is dropped once its queue is empty and nothing holds on to it any more;
+# while a worker is sending its task keeps the sender alive
+_senders = weakref.WeakValueDictionary()
+
+
+class OriginSender:
+    """A view of a ChannelSender whose send() calls all use one origin, e.g. for one session"""
+
+    def __init__(self, sender, origin):
+        self.sender = sender
+        self.origin = origin
+
+    def send(self, content):
+        return self.sender.send(content, self.origin)
+
+    def edit(self, block, content):
+        return self.sender.edit(block, content)
+
+    def room(self, block):
+        return self.sender.room(block)
+
+    async def drain(self):
+        await self.sender.drain()
+
+
+def sender_for(channel, origin=None):
+    """
+    The shared ChannelSender for a channel, so all output to it stays in order. With an
+    origin, a view of it that only coalesces output from that origin.
+    """
+    sender = _senders.get(channel.id)
+    if sender is None:
+        sender = _senders[channel.id] = ChannelSender(channel)
+    if origin is not None:
+        return OriginSender(sender, origin)
+    return sender
+
+
+class StreamRenderer:
+    """
+    Shows a streamed agent response in Discord. The first chunk posts a message right away,
+    later chunks are batched into edits at most every STREAM_EDIT_INTERVAL seconds, and
+    text that doesn't fit in the message continues in a new one, split like split_message.
+    All output goes through a ChannelSender, so feeding chunks never waits on Discord.
+    """
+
+    def __init__(self, sender, header, footer=""):
+        self.sender = sender
+        self.header = header
+        self.footer = footer
+        self.text = ""
+        self.offset = 0
+        self.current = None
+        self.rendered = None
+        self.show_header = True
+        # Reopens a code block that was cut off at the end of the previous message
+        self.carry = ""
+        self.last_flush = 0.0
+
+    def feed(self, chunk):
+        self.text += chunk
+        if time.monotonic() - self.last_flush >= STREAM_EDIT_INTERVAL:
+            self.flush()
+
+    def flush(self, final=False):
+        tail = self.footer if final else ""
+        while True:
+            head = (self.header if self.show_header else "") + self.carry
+            body = self.text[self.offset:]
+            # Output coalesced into the same message leaves less room for this response. If
+            # that's most of the message, the sender moves this response into one of its own
+            limit = DISCORD_MESSAGE_LIMIT
+            if self.current is not None:
+                limit = max(self.sender.room(self.current), DISCORD_MESSAGE_LIMIT // 2)
+            room = limit - len(head) - len(tail)
+            if len(body) <= room:
+                break
+            # Close off the current message and carry the rest over to a new one
+            cut = find_split_point(body, room - len(CODE_FENCE) - 1)
+            part = head + body[:cut]
+            self.carry = ""
+            if part.count(CODE_FENCE) % 2:
+                part += "\n" + CODE_FENCE
+                self.carry = CODE_FENCE + "\n"
+            self._show(part)
+            self.offset += cut
+            self.current = None
+            self.show_header = False
+
+        content = head + body + tail
+        if content.strip():
+            self._show(content)
+        self.last_flush = time.monotonic()
+
+    def _show(self, content):
+        if self.current is None:
+            self.current = self.sender.send(content)
+        elif content != self.rendered:
+            self.sender.edit(self.current, content)
+        self.rendered = content
@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger("discord")
+
+# Kept below the Mistral client's concurrency cap so short commands always find a free slot
+MAX_RUNNING_JOBS = 2
+MAX_QUEUED_JOBS = 50
+MAX_JOBS_PER_USER = 3
+MAX_RUNNING_PER_USER = 1
+
+
+class JobQueueFull(Exception):
+    """Raised when a job can't be accepted because of backpressure limits"""
+
+
+class Job:
+    def __init__(self, job_id, user_id, key, factory, priority):
+        self.id = job_id
+        self.user_id = user_id
+        self.key = key
+        self.factory = factory
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.task = None
+        self.cancelled = False
+
+    @property
+    def running(self):
+        return self.task is not None
+
+    def __lt__(self, other):
+        return (self.priority, self.id) < (other.priority, other.id)
+
+
+class JobQueue:
+    """
+    Runs long jobs (multiagent sessions) on a bounded number of slots.
+
+    Queued jobs are ordered by priority, which is the number of jobs their user already has,
+    so a user's first job goes ahead of someone else's third. Each user may only have
+    max_running_per_user jobs running and max_per_user in total, and the queue as a whole
+    holds at most max_queued jobs. Submitting a job whose key matches one that is already
+    queued or running returns the existing job instead of starting a duplicate.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 max_per_user=MAX_JOBS_PER_USER, max_running_per_user=MAX_RUNNING_PER_USER):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.max_running_per_user = max_running_per_user
+        self._queue = []
+        self._by_key = {}
+        self._running = set()
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def user_jobs(self, user_id):
+        return [job for job in self._by_key.values() if job.user_id == user_id and not job.cancelled]
+
+    def submit(self, user_id, key, factory):
+        """
+        Queue factory() to run as a job. Returns (job, is_new); is_new is False when an
+        identical job was already in progress and that one is returned instead.
+        """
+        existing = self._by_key.get(key)
+        if existing is not None:
+            return existing, False
+
+        user_count = len(self.user_jobs(user_id))
+        if user_count >= self.max_per_user:
+            raise JobQueueFull(f"You already have {user_count} runs in progress.")
+        if len(self._queue) >= self.max_queued:
+            raise JobQueueFull("The bot is busy right now, please try again in a few minutes.")
+
+        job = Job(next(self._ids), user_id, key, factory, priority=user_count)
+        self._by_key[key] = job
+        heapq.heappush(self._queue, job)
+        self._dispatch()
+        return job, True
+
+    def position(self, job):
+        """1-based place in the queue, or 0 if the job is already running"""
+        if job.running:
+            return 0
+        return 1 + sum(1 for other in self._queue if other < job)
+
+    def cancel_user(self, user_id):
+        """Cancel every queued or running job of a user, returns how many were cancelled"""
+        jobs = self.user_jobs(user_id)
+        for job in jobs:
+            self._cancel(job)
+        return len(jobs)
+
+    def _cancel(self, job):
+        job.cancelled = True
+        # Forget the key right away, so the same question can be asked again while a
+        # cancelled job is still winding down
+        self._forget(job)
+        if job.task is not None:
+            # Cancelling the task aborts whatever LLM or search call it is awaiting
+            job.task.cancel()
+        else:
+            # Take it out of the queue so it no longer counts towards its length or max_queued
+            if job in self._queue:
+                self._queue.remove(job)
+                heapq.heapify(self._queue)
+            if not job.future.done():
+                job.future.cancel()
+
+    def _dispatch(self):
+        deferred = []
+        while self._queue and len(self._running) < self.max_running:
+            job = heapq.heappop(self._queue)
+            running_for_user = sum(1 for other in self._running if other.user_id == job.user_id)
+            if running_for_user >= self.max_running_per_user:
+                deferred.append(job)
+                continue
+            self._start(job)
+        for job in deferred:
+            heapq.heappush(self._queue, job)
+
+    def _start(self, job):
+        self._running.add(job)
+        job.task = asyncio.create_task(job.factory())
+        job.task.add_done_callback(lambda task: self._finish(job, task))
+
+    def _finish(self, job, task):
+        self._running.discard(job)
+        self._forget(job)
+        if not job.future.done():
+            if task.cancelled():
+                job.future.cancel()
+            elif task.exception() is not None:
+                job.future.set_exception(task.exception())
+            else:
+                job.future.set_result(task.result())
+        self._dispatch()
+
+    def _forget(self, job):
+        # A newer job may have taken the key over since this one was cancelled
+        if self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    async def wait(self, job):
+        """Wait for a job without cancelling it if the waiter itself is cancelled"""
+        return await asyncio.shield(job.future)
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class LoadingCache:
+    """
+    In-memory LRU cache with a TTL per entry, for values that are slow to load. Concurrent
+    loads of the same key share one task, and the first one to finish stores its value.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached value for key, or None if there is none or it has expired"""
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        expires, value = cached
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def load(self, key, loader):
+        """
+        Return (task, merged): a task for key's value, started as loader() unless a load
+        for key is already in flight, which is returned with merged True instead. loader is
+        an async callable returning (value, ttl); ttl None means the cache's default. A
+        value is only stored if loader returns, exceptions propagate to every waiter.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            return task, True
+        task = asyncio.create_task(self._load(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task, False
+
+    async def _load(self, key, loader):
+        value, ttl = await loader()
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict, deque
+
+from tokens import estimate_tokens, extend_summary, truncate_to_tokens
+
+MAX_MEMORY_LENGTH = 10
+MAX_MEMORY_TOKENS = 1500
+MAX_ENTRY_TOKENS = 600
+MAX_SUMMARY_TOKENS = 200
+MAX_TOTAL_TOKENS = 2_000_000
+IDLE_TIMEOUT = 6 * 60 * 60
+
+
+class UserMemory:
+    """One user's recent turns, bounded by an estimated token budget"""
+
+    def __init__(self):
+        self.entries = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.last_used = time.monotonic()
+
+    def total_tokens(self):
+        return self.tokens + estimate_tokens(self.summary)
+
+
+class MemoryStore:
+    """
+    Per-user conversation memory. Each user keeps at most max_entries turns and
+    max_tokens estimated tokens, trimmed oldest first. Users idle for longer than
+    idle_timeout are dropped, and if the store as a whole goes over max_total_tokens
+    the least recently used users are evicted.
+
+    With compact=True, turns that fall out of the window are folded into a short rolling
+    summary (the first sentence of each) instead of being dropped outright.
+
+    With a StateStore, every change is saved write-behind and evicted users stay on disk.
+    Call hydrate(user_id) before reading or adding, which loads the user from the store
+    the first time they are seen since startup or eviction.
+    """
+
+    def __init__(self, max_entries=MAX_MEMORY_LENGTH, max_tokens=MAX_MEMORY_TOKENS,
+                 max_entry_tokens=MAX_ENTRY_TOKENS, max_total_tokens=MAX_TOTAL_TOKENS,
+                 idle_timeout=IDLE_TIMEOUT, compact=False, max_summary_tokens=MAX_SUMMARY_TOKENS,
+                 store=None):
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.max_entry_tokens = max_entry_tokens
+        self.max_total_tokens = max_total_tokens
+        self.idle_timeout = idle_timeout
+        self.compact = compact
+        self.max_summary_tokens = max_summary_tokens
+        self.store = store
+        self._users = OrderedDict()
+        self._total_tokens = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    async def hydrate(self, user_id):
+        """Load a user's memory from the store if it isn't in memory yet"""
+        if self.store is None or user_id in self._users:
+            return
+        stored = await self.store.load_memory(user_id)
+        # Another command may have added to this user while the load was running
+        if stored is None or user_id in self._users:
+            return
+        entries, summary = stored
+        memory = UserMemory()
+        for entry in entries:
+            tokens = estimate_tokens(entry)
+            memory.entries.append((entry, tokens))
+            memory.tokens += tokens
+        memory.summary = summary
+        self._users[user_id] = memory
+        self._total_tokens += memory.total_tokens()
+        self.evict()
+
+    def get(self, user_id):
+        """Return the user's memory as a list of 'Role: content' lines, oldest first"""
+        memory = self._users.get(user_id)
+        if memory is None:
+            return []
+        self._touch(user_id, memory)
+        log = [entry for entry, _ in memory.entries]
+        if memory.summary:
+            log.insert(0, f"Summary of earlier conversation: {memory.summary}")
+        return log
+
+    def add(self, user_id, role, content):
+        memory = self._users.get(user_id)
+        if memory is None:
+            memory = UserMemory()
+            self._users[user_id] = memory
+        self._touch(user_id, memory)
+
+        before = memory.total_tokens()
+        entry = f"{role}: {truncate_to_tokens(content, self.max_entry_tokens)}"
+        tokens = estimate_tokens(entry)
+        memory.entries.append((entry, tokens))
+        memory.tokens += tokens
+
+        while memory.entries and (len(memory.entries) > self.max_entries or memory.tokens > self.max_tokens):
+            dropped, dropped_tokens = memory.entries.popleft()
+            memory.tokens -= dropped_tokens
+            if self.compact:
+                self._fold_into_summary(memory, dropped)
+
+        self._total_tokens += memory.total_tokens() - before
+        if self.store is not None:
+            self.store.save_memory(user_id, [entry for entry, _ in memory.entries], memory.summary)
+        self.evict()
+
+    def clear(self, user_id):
+        """Forget a user's memory, returns False if there was nothing to clear"""
+        if self.store is not None:
+            self.store.delete_memory(user_id)
+        return self._drop(user_id)
+
+    def _drop(self, user_id):
+        memory = self._users.pop(user_id, None)
+        if memory is None:
+            return False
+        self._total_tokens -= memory.total_tokens()
+        return True
+
+    def evict(self):
+        """Drop idle users, then least recently used users while over the global token cap"""
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._users:
+            user_id, memory = next(iter(self._users.items()))
+            if memory.last_used >= cutoff and self._total_tokens <= self.max_total_tokens:
+                break
+            # Only dropped from memory, a stored copy is hydrated again on next use
+            self._drop(user_id)
+
+    def _touch(self, user_id, memory):
+        memory.last_used = time.monotonic()
+        self._users.move_to_end(user_id)
+
+    def _fold_into_summary(self, memory, entry):
+        # Keeps the most recent part of the summary when it outgrows its budget
+        memory.summary = extend_summary(memory.summary, [entry], max_tokens=self.max_summary_tokens)
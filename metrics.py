@@ -0,0 +1,222 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("discord")
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge that is either set directly or read from a function at scrape time"""
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.values = {}
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.fn is not None:
+            lines.append(f"{self.name} {self.fn()}")
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., sum, count]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def summary(self, **labels):
+        """Return (count, mean) for one label set"""
+        series = self.values.get(_label_key(labels))
+        if series is None or not series[-1]:
+            return 0, 0.0
+        return series[-1], series[-2] / series[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self.values.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help, fn=None):
+        return self._add(Gauge(name, help, fn))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+llm_latency = REGISTRY.histogram("bot_llm_request_seconds", "Mistral completion latency by role")
+llm_first_token = REGISTRY.histogram("bot_llm_first_token_seconds", "Time to first streamed token by role")
+llm_tokens = REGISTRY.counter("bot_llm_tokens_total", "Tokens reported by Mistral usage, by role and kind")
+llm_escalations = REGISTRY.counter("bot_llm_escalations_total", "Small model responses retried on the large model, by role")
+llm_errors = REGISTRY.counter("bot_llm_errors_total", "Failed Mistral requests by role")
+llm_timeouts = REGISTRY.counter("bot_llm_timeouts_total", "Mistral calls that ran past their deadline, by role")
+llm_hedges = REGISTRY.counter("bot_llm_hedges_total", "Hedged duplicate requests by role and outcome (sent, won)")
+search_latency = REGISTRY.histogram("bot_search_seconds", "Search backend lookup latency")
+search_requests = REGISTRY.counter("bot_search_requests_total", "Search lookups by result (hit, merged, miss)")
+discord_send_latency = REGISTRY.histogram("bot_discord_send_seconds", "Discord REST latency by operation")
+discord_coalesced = REGISTRY.counter("bot_discord_coalesced_total", "Output merged into a pending message instead of sent on its own")
+multiagent_exits = REGISTRY.counter("bot_multiagent_exits_total", "Multiagent runs by how they ended (converged, moderator, limit, deadline)")
+command_latency = REGISTRY.histogram("bot_command_seconds", "End to end command latency", buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+
+# Per-request tracing: when a Trace is active in the current task, every timed() block
+# also appends a span to it and record_usage() adds to its token counts
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.tokens = {"prompt": 0, "completion": 0}
+
+    def format(self):
+        lines = []
+        for name, labels, start, duration in sorted(self.spans, key=lambda span: span[2]):
+            label_text = " ".join(f"{k}={v}" for k, v in labels.items())
+            lines.append(f"{(start - self.start) * 1000:8.0f}ms {duration * 1000:8.0f}ms  {name} {label_text}".rstrip())
+        return "\n".join(lines)
+
+
+def current_trace():
+    """The Trace active in the current task, or None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(trace=None):
+    """
+    Collect a timing trace of everything timed inside this block. Pass an existing trace to
+    add to it, e.g. for work a background task does on a request's behalf.
+    """
+    if trace is None:
+        trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe how long the block takes into histogram, and record it in the active trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        histogram.observe(duration, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((histogram.name, labels, start, duration))
+
+
+def record_usage(usage, **labels):
+    """Count the prompt and completion tokens from a Mistral response's usage field"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    llm_tokens.inc(prompt_tokens, kind="prompt", **labels)
+    llm_tokens.inc(completion_tokens, kind="completion", **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens["prompt"] += prompt_tokens
+        trace.tokens["completion"] += completion_tokens
+
+
+async def start_http_server(host, port, registry=REGISTRY):
+    """Serve registry on http://host:port/metrics"""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
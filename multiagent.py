@@ -0,0 +1,201 @@
+import logging
+from collections import namedtuple
+
+import metrics
+from agent import DeadlineExceeded
+from compaction import SUMMARY_WORDS, compact_log
+from convergence import ConvergenceDetector
+from deadlines import SESSION_TIMEOUT, deadline_scope
+from discord_output import StreamRenderer
+from prompts import (
+    ModeratorDecision, PromptBuilder, is_valid_moderator_decision, is_valid_search_decision,
+    parse_moderator_decision, summary_messages
+)
+from retrieval import gather_evidence
+
+logger = logging.getLogger("discord")
+
+# How a run ended ("converged", "moderator" or "limit"), its final answer and the
+# number of iterations it took
+MultiagentResult = namedtuple("MultiagentResult", ["ending", "answer", "iterations"])
+
+
+async def stream_role(app, user_id, sender, role, prompt, footer=""):
+    """Stream one agent's response into the channel and return the full text"""
+    renderer = StreamRenderer(sender, f"**{role}:**\n", footer)
+    async for chunk in app.agent.complete_stream(prompt, user_id=user_id, role=role):
+        renderer.feed(chunk)
+    renderer.flush(final=True)
+    return renderer.text
+
+
+async def summarize_turns(app, user_id, previous_summary, turns):
+    """Fold older multiagent turns into the running summary with the Summarizer agent"""
+    messages = summary_messages(previous_summary, turns, SUMMARY_WORDS)
+    return await app.agent.complete(messages, user_id=user_id, role="Summarizer")
+
+
+def show_role(sender, role, text, footer=""):
+    """Send an already complete agent response, split the same way streamed ones are"""
+    renderer = StreamRenderer(sender, f"**{role}:**\n", footer)
+    renderer.feed(text)
+    renderer.flush(final=True)
+
+
+def build_search_context(log, iteration, iteration_limit):
+    """
+    First prompt: The Search Agent decides if it needs to do a Google search.
+    It may respond with 'DO_SEARCH: <query>' if it wants you to gather info,
+    or it may respond with a direct answer if no search is needed.
+    """
+    return log.messages("Search", iteration, iteration_limit)
+
+
+def build_search_results_context(log, evidence, iteration, iteration_limit):
+    """
+    Second prompt: The Search Agent processes and organizes search results
+    to produce a comprehensive, insight-driven summary.
+    evidence is the ranked passages from gather_evidence, best first.
+    """
+    user_question = log.last_user_question()
+    parts = [f"[Original Question]\n{user_question}\n\n", "[Processed Search Results]\n"]
+
+    parts.append("Sources:\n")
+    sources = {}
+    for item in evidence:
+        sources.setdefault(item.source, item)
+    for source, item in sorted(sources.items()):
+        parts.append(f"[{source}] {item.title} ({item.url})\n")
+
+    parts.append("\nEvidence, most relevant first:\n")
+    for item in evidence:
+        parts.append(f"- [{item.source}] {item.text}\n")
+    parts.append("\n")
+
+    return log.messages("SearchSummary", iteration, iteration_limit, extra="".join(parts))
+
+async def search_evidence(app, question, search_query):
+    """Search, then fetch and rank the result pages against the question and the query"""
+    raw_results = await app.search_service.search(search_query, num_results=5)
+    return await gather_evidence(f"{question} {search_query}", raw_results, app.page_fetcher)
+
+
+def build_brainstormer_context(log, iteration, iteration_limit):
+    return log.messages("Brainstormer", iteration, iteration_limit)
+
+
+def build_critic_context(log, iteration, iteration_limit):
+    return log.messages("Critic", iteration, iteration_limit)
+
+
+def build_synthesizer_context(log, iteration, iteration_limit):
+    return log.messages("Synthesizer", iteration, iteration_limit)
+
+
+def build_moderator_context(log, iteration, iteration_limit):
+    return log.messages("Moderator", iteration, iteration_limit)
+
+
+async def run_session(app, user_id, sender, question, use_search):
+    """
+    Run one multiagent conversation, writing its output to sender, and return a
+    MultiagentResult. Every agent call in it shares the session deadline on top of its
+    own timeout.
+    """
+    try:
+        with deadline_scope(SESSION_TIMEOUT):
+            return await run_multiagent(app, user_id, sender, question, use_search)
+    except DeadlineExceeded:
+        metrics.multiagent_exits.inc(reason="deadline")
+        raise
+
+
+async def run_multiagent(app, user_id, sender, question, use_search):
+    conversation_log = PromptBuilder([f"User: {question}"])
+    iteration_limit = 3
+    current_iteration = 1
+
+    sender.send("**Starting multi-agent conversation...**")
+    
+    if use_search:
+        sender.send("**Searching for information first...**")
+        search_prompt = build_search_context(conversation_log, 1, 2)
+        search_decision = await app.agent.complete(search_prompt, user_id=user_id, role="Search", validate=is_valid_search_decision)
+        
+        if "DO_SEARCH:" in search_decision:
+            search_query = search_decision.split("DO_SEARCH:")[1].strip()
+            sender.send(f"**Search Agent**: Performing Google search for: `{search_query}`")
+            
+            try:
+                evidence = await search_evidence(app, question, search_query)
+            except Exception as e:
+                logger.error(f"Error running search: {e}")
+                evidence = None
+                sender.send("**Search Agent**: The search failed, continuing without search results.")
+            
+            if evidence is not None:
+                search_results_prompt = build_search_results_context(
+                    conversation_log, evidence, 2, 2
+                )
+                search_summary = await app.agent.complete(search_results_prompt, user_id=user_id, role="SearchSummary")
+                
+                search_date = "as of today's date"
+                search_preamble = f"[The following information was gathered from a Google search {search_date} and should be considered accurate factual information]"
+                conversation_log.append(f"SearchResults: {search_preamble}\n{search_summary}")
+                sender.send(f"**Search Results**:\n{search_summary}")
+
+    divider = "\n--------------------------------\n"
+    convergence = ConvergenceDetector()
+    # Older turns are folded into a running summary whenever the history outgrows its token budget
+    summarize = lambda previous_summary, turns: summarize_turns(app, user_id, previous_summary, turns)
+    
+    while current_iteration <= iteration_limit:
+        sender.send(f"**Iteration {current_iteration} of {iteration_limit}**")
+        
+        await compact_log(conversation_log, summarize)
+        brainstormer_prompt = build_brainstormer_context(conversation_log, current_iteration, iteration_limit)
+        brainstormer_response = await stream_role(app, user_id, sender, "Brainstormer", brainstormer_prompt, divider)
+        conversation_log.append(f"Brainstormer: {brainstormer_response}")
+        
+        await compact_log(conversation_log, summarize)
+        critic_prompt = build_critic_context(conversation_log, current_iteration, iteration_limit)
+        critic_response = await stream_role(app, user_id, sender, "Critic", critic_prompt, divider)
+        conversation_log.append(f"Critic: {critic_response}")
+        
+        await compact_log(conversation_log, summarize)
+        synthesizer_prompt = build_synthesizer_context(conversation_log, current_iteration, iteration_limit)
+        synthesizer_response = await stream_role(app, user_id, sender, "Synthesizer", synthesizer_prompt, divider)
+        conversation_log.append(f"Synthesizer: {synthesizer_response}")
+        
+        # Once the Synthesizer gives essentially the same answer twice, more rounds won't change
+        # it, so end here without spending a Moderator call to confirm it
+        if convergence.observe(synthesizer_response):
+            metrics.multiagent_exits.inc(reason="converged")
+            sender.send("```\n== FINAL RESPONSE ==\n```\n**The agents have converged on the Synthesizer's answer above.**\n```\nEnd of multi-agent conversation\n```")
+            return MultiagentResult("converged", synthesizer_response, current_iteration)
+        
+        await compact_log(conversation_log, summarize)
+        moderator_prompt = build_moderator_context(conversation_log, current_iteration, iteration_limit)
+        # The Moderator's decision runs on a small model and isn't streamed, so a malformed
+        # answer can be escalated to the large model before anything is shown
+        moderator_response = await app.agent.complete(
+            moderator_prompt, user_id=user_id, role="Moderator", validate=is_valid_moderator_decision
+        )
+        decision = parse_moderator_decision(moderator_response)
+        if decision is None:
+            # Even the large model didn't return usable JSON, treat the reply as thoughts and carry on
+            decision = ModeratorDecision(False, moderator_response.strip(), "")
+        show_role(sender, "Moderator", decision.thoughts, divider)
+        conversation_log.append(f"Moderator: {decision.thoughts}")
+        
+        if decision.done:
+            metrics.multiagent_exits.inc(reason="moderator")
+            summary_text = decision.summary or "Conversation complete. No detailed summary provided."
+            sender.send("```\n== FINAL RESPONSE ==\n```\n**" + summary_text + "**\n```\nEnd of multi-agent conversation\n```")
+            return MultiagentResult("moderator", decision.summary or synthesizer_response, current_iteration)
+
+        current_iteration += 1
+    
+    metrics.multiagent_exits.inc(reason="limit")
+    sender.send("**All iterations complete.**")
+    return MultiagentResult("limit", synthesizer_response, iteration_limit)
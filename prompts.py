@@ -0,0 +1,252 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+from tokens import estimate_tokens
+
+# Static instructions for each role. These never change during a conversation, so the
+# system message built from them is computed once per (role, iteration limit) and reused.
+ROLE_INSTRUCTIONS = {
+    "Search": (
+        "You are the Search agent. Your role is to determine if a web search is required "
+        "to gather factual information. If you decide to do a search, respond with a line "
+        "starting with 'DO_SEARCH:' followed by the query terms. If no search is needed, "
+        "just provide a direct answer.\n"
+        "Iteration limit: {iteration_limit}.\n"
+    ),
+    "SearchSummary": (
+        "You are the Search agent. Below is organized information returned by your Google search. "
+        "Synthesize a comprehensive answer that directly addresses the user's original question. "
+        "Focus on extracting key insights and presenting them in a logical flow. "
+        "Provide specific details and facts from multiple sources when available. "
+        "Your response should be 3-5 sentences, coherent and complete. "
+    ),
+    "Brainstormer": (
+        "You are the Brainstormer agent. Your task is to generate creative and analytical ideas "
+        "to address the user's query. Use the full conversation history below to build on previous ideas and refine your suggestions. "
+        "If search results are included in the conversation, treat them as accurate and current information. "
+        "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+        "Don't overcomplicate problems - when an answer is clear, answer directly without trying to find hidden meanings. "
+        "Only use deeper reasoning when questions are genuinely complex or difficult. "
+        "You have an iteration limit of {iteration_limit} rounds; if this is the final round, provide a summary of your best proposals.\n"
+    ),
+    "Critic": (
+        "You are the Critic agent. Your task is to evaluate the brainstormed ideas, flag any flaws or inaccuracies, "
+        "and suggest improvements. Use the full conversation history below to ensure your feedback is thorough and relevant. "
+        "If search results are included in the conversation, treat them as accurate and current information - do not question their validity. "
+        "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+        "Don't overcomplicate problems - when an answer is clear, focus on direct feedback without trying to find hidden meanings. "
+        "Only use deeper critical analysis when questions are genuinely complex or difficult. "
+        "The iteration limit is {iteration_limit} rounds; if this is the final round, emphasize the key points that need to be resolved.\n"
+    ),
+    "Synthesizer": (
+        "You are the Synthesizer agent. Your task is to transform the brainstormed ideas and critiques into concrete, "
+        "actionable steps or solutions. Focus on practicality and implementation details. "
+        "Consider both the creative suggestions from the Brainstormer and the concerns raised by the Critic. "
+        "If search results are included in the conversation, incorporate this factual information into your synthesis. "
+        "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+        "Prioritize specific, implementable solutions over theoretical discussions. "
+        "If technical details are relevant, include them concisely."
+        "The iteration limit is {iteration_limit} rounds; if this is the final round, focus on the most viable solution.\n"
+    ),
+    "Moderator": (
+        "You are the Moderator agent. Your role is to manage the dialogue between the Brainstormer and Critic and Synthesizer agents. "
+        "Review the full conversation history below and determine who should contribute next. Ensure that the conversation stays "
+        "on track and converges to a coherent answer. "
+        "If search results are included in the conversation, ensure they are properly incorporated as factual information. "
+        "Keep your response to 5 sentences or less, written in a single paragraph without bullet points or headings. "
+        "You don't need to use all iterations - if a clear answer has been reached, end the conversation early. It is critical that you do not overcomplicate or over-iterate, "
+        "but also do not end the conversation prematurely if what the Synthesizer provided is not yet complete."
+        "The iteration limit is {iteration_limit} rounds.\n"
+        "Reply with a single JSON object and nothing else, with these keys: "
+        "\"decision\": \"continue\" if the conversation should continue or \"end\" if it is complete; "
+        "\"thoughts\": your thoughts on the conversation so far; "
+        "\"summary\": only when ending, your summary of the key points and conclusion. "
+        "If the question was simple, keep the summary to 1-2 sentences. If the question was complex/technical, you can write 5-6 sentences. "
+        "Note that the summary is displayed to the user, so you shouldn't mention things about the thought process, just the answer. "
+        "Example: {{\"decision\": \"continue\", \"thoughts\": \"...\", \"summary\": \"\"}}"
+    ),
+    "Summarizer": (
+        "You are the Summarizer agent. You compress earlier rounds of a discussion between a Brainstormer, "
+        "a Critic, a Synthesizer and a Moderator into a short running summary that later rounds will rely on "
+        "instead of the full text. Keep the concrete proposals, the objections raised against them, the "
+        "decisions reached and any facts from search results. Drop repetition and filler. "
+        "Write a single plain paragraph."
+    ),
+}
+
+# The name each role's own turns are logged under in the conversation
+ROLE_SPEAKERS = {
+    "Search": "SearchAgent",
+    "SearchSummary": "SearchAgent",
+    "Brainstormer": "Brainstormer",
+    "Critic": "Critic",
+    "Synthesizer": "Synthesizer",
+    "Moderator": "Moderator",
+    "Summarizer": "Summary",
+}
+
+ModeratorDecision = namedtuple("ModeratorDecision", ["done", "thoughts", "summary"])
+
+ROLE_LABELS = {
+    "Search": "Search Agent",
+    "SearchSummary": "Search Agent",
+}
+
+
+@lru_cache(maxsize=None)
+def system_message(role, iteration_limit):
+    """The static system message for a role, built once and shared between conversations"""
+    return {"role": "system", "content": ROLE_INSTRUCTIONS[role].format(iteration_limit=iteration_limit)}
+
+
+class PromptBuilder:
+    """
+    Builds structured chat messages for each agent role from a growing conversation log.
+
+    Each role keeps its own message list: the cached system message followed by the log
+    entries, where the role's own earlier turns are assistant messages and everyone else's
+    are user messages. New log entries are appended to those lists the next time the
+    role is prompted, so nothing already built is re-joined or copied, and each role's
+    message prefix stays identical across calls, which lets provider-side prompt caching apply.
+    """
+
+    def __init__(self, log=()):
+        self.log = []
+        self.tokens = 0
+        self._messages = {}
+        for entry in log:
+            self.append(entry)
+
+    def __iter__(self):
+        return iter(self.log)
+
+    def __len__(self):
+        return len(self.log)
+
+    def append(self, entry):
+        """Add a 'Speaker: content' entry to the conversation"""
+        self.log.append(entry)
+        self.tokens += estimate_tokens(entry)
+
+    def reset(self, log):
+        """Replace the whole log, e.g. after compaction. Every role's prefix is rebuilt on its next turn"""
+        self.log = []
+        self.tokens = 0
+        self._messages = {}
+        for entry in log:
+            self.append(entry)
+
+    def last_user_question(self):
+        for entry in reversed(self.log):
+            if entry.startswith("User:"):
+                return entry[len("User:"):].strip()
+        return ""
+
+    def messages(self, role, iteration, iteration_limit, extra=""):
+        """Return the messages to send for role's next turn"""
+        key = (role, iteration_limit)
+        history = self._messages.get(key)
+        if history is None:
+            history = self._messages[key] = _History(system_message(role, iteration_limit))
+
+        speaker = ROLE_SPEAKERS[role] + ":"
+        for entry in self.log[history.built:]:
+            if entry.startswith(speaker):
+                history.add("assistant", entry[len(speaker):].strip())
+            else:
+                history.add("user", entry)
+        history.built = len(self.log)
+
+        label = ROLE_LABELS.get(role, role)
+        turn = f"{extra}[Iteration Info]\nCurrent iteration: {iteration} of {iteration_limit}.\n{label}:"
+        return history.render(turn)
+
+
+class _History:
+    """
+    One role's messages so far. User and assistant turns have to alternate, so consecutive
+    entries from the same side are grouped. Finished groups become messages once; the open
+    group at the end is kept as a list and joined only when a prompt is rendered.
+    """
+
+    __slots__ = ("messages", "role", "parts", "built")
+
+    def __init__(self, system):
+        self.messages = [system]
+        self.role = None
+        self.parts = []
+        # How many log entries have been added
+        self.built = 0
+
+    def add(self, role, content):
+        if role != self.role:
+            self._close()
+            self.role = role
+        self.parts.append(content)
+
+    def _close(self):
+        if self.parts:
+            self.messages.append({"role": self.role, "content": "\n".join(self.parts)})
+            self.parts = []
+
+    def render(self, turn):
+        """The messages for a prompt ending in the user message turn"""
+        messages = list(self.messages)
+        if self.role == "user":
+            messages.append({"role": "user", "content": "\n".join(self.parts + [turn])})
+        else:
+            if self.parts:
+                messages.append({"role": self.role, "content": "\n".join(self.parts)})
+            messages.append({"role": "user", "content": turn})
+        return messages
+
+
+def summary_messages(previous_summary, turns, max_words):
+    """Messages asking the Summarizer to fold turns into the previous running summary"""
+    parts = []
+    if previous_summary:
+        parts.append(f"[Running Summary So Far]\n{previous_summary}\n")
+    parts.append("[Turns To Fold In]\n")
+    parts.append("\n".join(turns))
+    parts.append(f"\nUse at most {max_words} words.\nSummary:")
+    return [system_message("Summarizer", None), {"role": "user", "content": "".join(parts)}]
+
+
+def is_valid_search_decision(response):
+    """The Search agent must either answer directly or give a non-empty DO_SEARCH query"""
+    if not response or not response.strip():
+        return False
+    if "DO_SEARCH:" in response:
+        return bool(response.split("DO_SEARCH:")[1].strip())
+    return True
+
+
+def parse_moderator_decision(response):
+    """
+    Parse the Moderator's JSON reply into a ModeratorDecision, or None if it isn't a JSON
+    object with a valid decision. Text around the object (e.g. a code fence) is ignored.
+    """
+    if not response:
+        return None
+    start, end = response.find("{"), response.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    decision = str(data.get("decision", "")).strip().lower()
+    if decision not in ("continue", "end"):
+        return None
+    thoughts = str(data.get("thoughts") or "").strip()
+    summary = str(data.get("summary") or "").strip()
+    return ModeratorDecision(decision == "end", thoughts, summary)
+
+
+def is_valid_moderator_decision(response):
+    """The Moderator must reply with a parseable decision, and ending must come with a summary"""
+    decision = parse_moderator_decision(response)
+    return decision is not None and (decision.summary or not decision.done)
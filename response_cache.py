@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_TTL = 24 * 60 * 60
+MAX_MEMORY_ENTRIES = 512
+MAX_DISK_BYTES = 50 * 1024 * 1024
+
+
+def cache_key(model, role, messages):
+    """Hash of the model, role and messages with whitespace normalized"""
+    normalized = [(m["role"], " ".join(m["content"].split())) for m in messages]
+    payload = json.dumps([model, role, normalized], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two tier cache of completed responses. Lookups check an in-memory LRU first, then a
+    SQLite table on disk that survives restarts. Entries expire after ttl seconds and the
+    disk tier drops least recently used rows once it grows past max_disk_bytes.
+    All SQLite work runs on a single background thread so the event loop never waits on disk.
+    Pass path=None for a memory-only cache.
+    """
+
+    def __init__(self, path, ttl=CACHE_TTL, max_memory_entries=MAX_MEMORY_ENTRIES, max_disk_bytes=MAX_DISK_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._db = None
+        self._disk_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    async def get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.time():
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+
+        if self.path is not None:
+            row = await self._run(self._disk_get, key)
+            if row is not None:
+                expires, value = row
+                self._remember(key, expires, value)
+                self.stats["disk_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key, value):
+        expires = time.time() + self.ttl
+        self._remember(key, expires, value)
+        if self.path is not None:
+            await self._run(self._disk_put, key, expires, value)
+
+    def _remember(self, key, expires, value):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, "
+                "last_used REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._db
+
+    def _disk_get(self, key):
+        db = self._connect()
+        row = db.execute("SELECT expires, value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[0] <= time.time():
+            self._disk_delete(db, key)
+            db.commit()
+            return None
+        db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        db.commit()
+        return row
+
+    def _disk_put(self, key, expires, value):
+        db = self._connect()
+        size = len(key) + len(value.encode("utf-8"))
+        self._disk_delete(db, key)
+        db.execute(
+            "INSERT INTO responses (key, value, expires, last_used, size) VALUES (?, ?, ?, ?, ?)",
+            (key, value, expires, time.time(), size),
+        )
+        self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes:
+            oldest = db.execute("SELECT key FROM responses ORDER BY last_used LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for (old_key,) in oldest:
+                self._disk_delete(db, old_key)
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+        db.commit()
+
+    def _disk_delete(self, db, key):
+        row = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._disk_bytes -= row[0]
+
+    def close(self):
+        if self._db is not None:
+            self._executor.submit(self._db.close).result()
+            self._db = None
+        self._executor.shutdown(wait=False)
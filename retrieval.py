@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import math
+import re
+from collections import Counter, namedtuple
+from html.parser import HTMLParser
+
+import aiohttp
+
+from loading_cache import LoadingCache
+from tokens import estimate_tokens, split_sentences
+
+logger = logging.getLogger("discord")
+
+FETCH_TOP_RESULTS = 3
+FETCH_TIMEOUT = 5
+MAX_PAGE_BYTES = 512 * 1024
+PAGE_CACHE_SIZE = 128
+PAGE_CACHE_TTL = 60 * 60
+# Pages that failed to load are retried after this long rather than on every search
+FAILED_PAGE_TTL = 5 * 60
+PASSAGE_WORDS = 60
+MAX_PASSAGES = 6
+EVIDENCE_TOKENS = 700
+# Passages sharing this much of their vocabulary with one already chosen are skipped
+DUPLICATE_OVERLAP = 0.7
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+Evidence = namedtuple("Evidence", ["source", "title", "url", "text", "score"])
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords, the terms BM25 indexes and queries on"""
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+class _MainTextParser(HTMLParser):
+    """Collects the text of content blocks, skipping scripts, navigation and page chrome"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "button", "select"}
+    BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "pre", "blockquote", "dd", "dt",
+                  "div", "section", "article", "main", "br", "tr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._current = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._end_block()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._end_block()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+    def _end_block(self):
+        block = " ".join(" ".join(self._current).split())
+        self._current = []
+        # Menus, bylines and buttons are short; real content blocks are sentences
+        if len(block.split()) >= 8:
+            self.blocks.append(block)
+
+    def close(self):
+        super().close()
+        self._end_block()
+
+
+def extract_main_text(html):
+    """The readable body text of an HTML page, one content block per line"""
+    parser = _MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"Error parsing page: {e}")
+    return "\n".join(parser.blocks)
+
+
+def split_passages(text, max_words=PASSAGE_WORDS):
+    """Split text into passages of whole sentences, each at most about max_words long"""
+    passages = []
+    for block in text.split("\n"):
+        current = []
+        length = 0
+        for sentence in split_sentences(block):
+            words = len(sentence.split())
+            if current and length + words > max_words:
+                passages.append(" ".join(current))
+                current, length = [], 0
+            current.append(sentence)
+            length += words
+        if current:
+            passages.append(" ".join(current))
+    return passages
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of passages. Term frequencies, document lengths and IDF are
+    computed once when the index is built and stored as an inverted index, so scoring a query
+    only walks the postings of the query's own terms instead of rescanning every passage.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for i, passage in enumerate(passages):
+            terms = tokenize(passage)
+            self.lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                self.postings.setdefault(term, []).append((i, count))
+        n = len(passages)
+        self.average_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def scores(self, query):
+        """BM25 score of every passage that shares a term with the query, by passage index"""
+        scores = {}
+        average_length = self.average_length or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, count in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / average_length)
+                scores[i] = scores.get(i, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        return scores
+
+    def top(self, query, n):
+        """The n best (index, score) pairs for query, best first"""
+        scores = self.scores(query)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class PageFetcher:
+    """
+    Downloads result pages with aiohttp. Each fetch has a total timeout and stops reading
+    after max_bytes, non-HTML responses are skipped, and extracted text is kept in an LRU
+    cache with a TTL keyed by URL. Concurrent fetches of the same URL share one download.
+    Failures are logged and return an empty string.
+    """
+
+    def __init__(self, timeout=FETCH_TIMEOUT, max_bytes=MAX_PAGE_BYTES,
+                 cache_size=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._session = None
+        self._cache = LoadingCache(cache_size, ttl)
+        self.stats = {"fetched": 0, "cached": 0, "merged": 0, "failed": 0, "truncated": 0}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            # The total timeout covers connecting and reading the (capped) body
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": "Mozilla/5.0 (compatible; discord-agent-bot)"},
+            )
+        return self._session
+
+    async def fetch(self, url):
+        """The main text of the page at url, or "" if it couldn't be fetched"""
+        text = self._cache.get(url)
+        if text is not None:
+            self.stats["cached"] += 1
+            return text
+
+        task, merged = self._cache.load(url, lambda: self._load(url))
+        if merged:
+            self.stats["merged"] += 1
+        # Shield so one caller being cancelled doesn't cancel the download others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, url):
+        try:
+            html = await self._download(url)
+        except Exception as e:
+            html = None
+            logger.info(f"Could not fetch {url}: {e!r}")
+
+        if html is None:
+            self.stats["failed"] += 1
+            return "", FAILED_PAGE_TTL
+        # Parsing a large page takes a few milliseconds, so keep it off the event loop
+        text = await asyncio.get_running_loop().run_in_executor(None, extract_main_text, html)
+        self.stats["fetched"] += 1
+        return text, None
+
+    async def _download(self, url):
+        async with self._get_session().get(url) as response:
+            if response.status != 200 or "html" not in response.headers.get("Content-Type", ""):
+                return None
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(16 * 1024):
+                body.extend(chunk)
+                if len(body) >= self.max_bytes:
+                    self.stats["truncated"] += 1
+                    break
+            return bytes(body[:self.max_bytes]).decode(response.charset or "utf-8", errors="replace")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+async def gather_evidence(question, results, fetcher, top_results=FETCH_TOP_RESULTS,
+                          max_passages=MAX_PASSAGES, max_tokens=EVIDENCE_TOKENS):
+    """
+    Fetch the top results' pages concurrently, then rank them and every result's snippet
+    against question with rank_passages. Results whose pages fail to load still contribute
+    their snippet.
+    """
+    results = list(results)
+    pages = await asyncio.gather(*(fetcher.fetch(res.url) for res in results[:top_results]))
+    # Indexing a few hundred KB of text is too slow to run on the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, rank_passages, question, results, pages, max_passages, max_tokens
+    )
+
+
+def rank_passages(question, results, pages, max_passages=MAX_PASSAGES, max_tokens=EVIDENCE_TOKENS):
+    """
+    Split the snippets and fetched pages (pages[i] belongs to results[i]) into passages and
+    return the ones that best answer question by BM25 as Evidence tuples, best first, within
+    max_passages and about max_tokens. Each passage is cut down to its sentences that share a
+    term with the question, and near-duplicates of a passage already chosen are skipped.
+    """
+    passages = []
+    owners = []
+    for source, res in enumerate(results, 1):
+        snippet = f"{res.title}. {res.description}".strip()
+        page = pages[source - 1] if source <= len(pages) else ""
+        for passage in [snippet] + split_passages(page):
+            passages.append(passage)
+            owners.append(source)
+
+    index = BM25Index(passages)
+    query_terms = set(tokenize(question))
+    evidence = []
+    chosen_terms = []
+    used_tokens = 0
+    for i, score in index.top(question, len(passages)):
+        # Keep only the sentences that actually mention the question
+        sentences = split_sentences(passages[i])
+        text = " ".join(s for s in sentences if query_terms & set(tokenize(s))) or passages[i]
+        tokens = estimate_tokens(text)
+        if used_tokens + tokens > max_tokens:
+            continue
+        terms = set(tokenize(text))
+        if any(len(terms & other) >= DUPLICATE_OVERLAP * min(len(terms), len(other)) for other in chosen_terms):
+            continue
+        chosen_terms.append(terms)
+        used_tokens += tokens
+        res = results[owners[i] - 1]
+        evidence.append(Evidence(owners[i], res.title, res.url, text, score))
+        if len(evidence) >= max_passages:
+            break
+
+    if not evidence:
+        # Nothing in the question matched, fall back to the snippets in search order
+        evidence = [Evidence(source, res.title, res.url, f"{res.title}. {res.description}".strip(), 0.0)
+                    for source, res in enumerate(results[:max_passages], 1)]
+    return evidence
@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("discord")
+
+# With a store, only reminders due within this window are kept in the heap
+LOAD_WINDOW = timedelta(hours=1)
+LOAD_RETRY_DELAY = 5
+
+
+class ReminderScheduler:
+    """
+    Keeps pending reminders in a min-heap ordered by due time and sleeps exactly until
+    the earliest one is due. Adding a reminder that is sooner than the current head wakes
+    the loop early. Due reminders are delivered concurrently as separate tasks.
+
+    With a StateStore, reminders are saved when added and deleted once delivered, so they
+    survive restarts. Stored reminders are paged in one window at a time by due time rather
+    than all loaded at startup.
+    """
+
+    def __init__(self, deliver, store=None, window=LOAD_WINDOW):
+        # deliver is an async callable that receives the reminder dict
+        self.deliver = deliver
+        self.store = store
+        self.window = window
+        # Everything due before this is in the heap; None until the first window is loaded
+        self._loaded_until = None
+        self._scheduled = set()
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._pending_deliveries = set()
+        # With a store, every pending reminder including those not paged in yet: the stored
+        # count read on the first page-in, plus reminders added since, minus those delivered
+        self._stored = 0
+        self._counted = False
+
+    def __len__(self):
+        if self.store is not None:
+            return self._stored
+        return len(self._heap)
+
+    def add(self, reminder):
+        """Schedule a reminder dict with a 'due_time' datetime"""
+        if self.store is not None:
+            reminder.setdefault('id', uuid.uuid4().hex)
+            self.store.save_reminder(reminder)
+            self._stored += 1
+            if self._loaded_until is not None and reminder['due_time'] >= self._loaded_until:
+                # Paged in with its window later
+                return
+        self._push(reminder)
+
+    def _push(self, reminder):
+        if 'id' in reminder:
+            if reminder['id'] in self._scheduled:
+                return
+            self._scheduled.add(reminder['id'])
+        entry = (reminder['due_time'], next(self._counter), reminder)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the scheduler loop, safe to call more than once (e.g. on reconnect)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and cancel deliveries still in flight; stored ones are delivered after a restart"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        deliveries = list(self._pending_deliveries)
+        for task in deliveries:
+            task.cancel()
+        await asyncio.gather(*deliveries, return_exceptions=True)
+
+    async def _page_in(self):
+        """Load stored reminders due before the end of the next window"""
+        start = self._loaded_until
+        # Advance before awaiting so reminders added meanwhile go straight into the heap;
+        # any that the load also returns are skipped by id
+        self._loaded_until = datetime.now() + self.window
+        try:
+            if not self._counted:
+                # The count covers everything added before the call; later adds are counted by add()
+                added = self._stored
+                self._stored += await self.store.count_reminders() - added
+                self._counted = True
+            reminders = await self.store.load_reminders(start, self._loaded_until)
+        except Exception as e:
+            logger.error(f"Error loading reminders: {e}")
+            self._loaded_until = start
+            await asyncio.sleep(LOAD_RETRY_DELAY)
+            return
+        for reminder in reminders:
+            self._push(reminder)
+
+    def _next_page_time(self):
+        return self._loaded_until - self.window / 2
+
+    async def _run(self):
+        while True:
+            if self.store is not None and (self._loaded_until is None or datetime.now() >= self._next_page_time()):
+                await self._page_in()
+                continue
+
+            due = self._heap[0][0] if self._heap else None
+            if self.store is not None:
+                page_time = self._next_page_time()
+                due = page_time if due is None else min(due, page_time)
+
+            if due is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = (due - datetime.now()).total_seconds()
+            if delay > 0:
+                self._wakeup.clear()
+                # asyncio.wait rather than wait_for, which can swallow a stop() cancellation
+                # that lands just as add() sets the event
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait([waiter], timeout=delay)
+                finally:
+                    waiter.cancel()
+                continue
+
+            now = datetime.now()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, reminder = heapq.heappop(self._heap)
+                task = asyncio.create_task(self._deliver_one(reminder))
+                self._pending_deliveries.add(task)
+                task.add_done_callback(self._pending_deliveries.discard)
+
+    async def _deliver_one(self, reminder):
+        try:
+            await self.deliver(reminder)
+        except Exception as e:
+            # Not sent, so a stored reminder is kept and tried again after the next restart
+            logger.error(f"Error sending reminder {reminder.get('id', '')}: {e!r}")
+            delivered = False
+        else:
+            delivered = True
+        finally:
+            # Also reached when stop() cancels the delivery, which likewise leaves it stored
+            if 'id' in reminder:
+                self._scheduled.discard(reminder['id'])
+        if delivered and 'id' in reminder and self.store is not None:
+            self.store.delete_reminder(reminder['id'])
+            self._stored -= 1
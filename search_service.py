@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from loading_cache import LoadingCache
+
+SEARCH_WORKERS = 4
+SEARCH_TIMEOUT = 10
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60 * 60
+
+
+def google_backend(query, num_results):
+    """Blocking Google lookup, runs on the search thread pool"""
+    from googlesearch import search
+    return list(search(query, num_results=num_results, advanced=True))
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class SearchService:
+    """
+    Runs blocking search lookups on a bounded thread pool so they never block the event loop.
+    Identical queries that are already in flight share one lookup, and finished results are
+    kept in an LRU cache with a TTL keyed by the normalized query.
+    The backend is any callable (query, num_results) -> list, so a local fake can be swapped in.
+    """
+
+    def __init__(self, backend=google_backend, max_workers=SEARCH_WORKERS, timeout=SEARCH_TIMEOUT,
+                 cache_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.backend = backend
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self._cache = LoadingCache(cache_size, ttl)
+        self.stats = {"hits": 0, "misses": 0, "merged": 0, "errors": 0}
+
+    async def search(self, query, num_results=5):
+        key = (normalize_query(query), num_results)
+
+        results = self._cache.get(key)
+        if results is not None:
+            self.stats["hits"] += 1
+            metrics.search_requests.inc(result="hit")
+            return results
+
+        task, merged = self._cache.load(key, lambda: self._lookup(key))
+        if merged:
+            self.stats["merged"] += 1
+            metrics.search_requests.inc(result="merged")
+        else:
+            self.stats["misses"] += 1
+            metrics.search_requests.inc(result="miss")
+
+        # Shield so one caller being cancelled doesn't cancel the lookup others are waiting on
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key):
+        query, num_results = key
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timed(metrics.search_latency):
+                results = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, self.backend, query, num_results),
+                    self.timeout,
+                )
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        return results, None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger("discord")
+
+# How long writes are held back so they can be committed together
+FLUSH_INTERVAL = 0.5
+
+
+class StateStore:
+    """
+    Durable bot state (pending reminders and per-user memory) in SQLite running in WAL mode.
+
+    Writes are write-behind: save/delete calls only record the change in memory and return
+    immediately, and a background flush commits everything pending in one transaction every
+    FLUSH_INTERVAL seconds. Repeated saves of the same user's memory collapse into one row
+    write. Reads go through the same single database thread, so the event loop never blocks
+    on disk. Reminders are indexed by due time so the scheduler can page them in by window.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-store")
+        self._pending_memories = {}
+        self._pending_reminders = {}
+        self._flush_task = None
+        self._commit_task = None
+        self._closed = False
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reminders ("
+                "id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, "
+                "message TEXT NOT NULL, due_time REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS reminders_due_time ON reminders (due_time)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS memories ("
+                "user_id INTEGER PRIMARY KEY, entries TEXT NOT NULL, summary TEXT NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    # Reminders
+
+    def save_reminder(self, reminder):
+        self._pending_reminders[reminder['id']] = reminder
+        self._schedule_flush()
+
+    def delete_reminder(self, reminder_id):
+        self._pending_reminders[reminder_id] = None
+        self._schedule_flush()
+
+    async def load_reminders(self, start, end):
+        """Reminders with start <= due_time < end, oldest first. start may be None for no lower bound"""
+        await self.flush()
+        rows = await self._run(self._select_reminders, start, end)
+        return [
+            {
+                'id': reminder_id,
+                'user_id': user_id,
+                'channel_id': channel_id,
+                'message': message,
+                'due_time': datetime.fromtimestamp(due_time),
+            }
+            for reminder_id, user_id, channel_id, message, due_time in rows
+        ]
+
+    async def count_reminders(self):
+        """How many reminders are stored, including writes made before this call"""
+        await self.flush()
+        return await self._run(self._count_reminders)
+
+    def _count_reminders(self):
+        return self._connect().execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+
+    def _select_reminders(self, start, end):
+        db = self._connect()
+        if start is None:
+            query = "SELECT id, user_id, channel_id, message, due_time FROM reminders WHERE due_time < ? ORDER BY due_time"
+            return db.execute(query, (end.timestamp(),)).fetchall()
+        query = ("SELECT id, user_id, channel_id, message, due_time FROM reminders "
+                 "WHERE due_time >= ? AND due_time < ? ORDER BY due_time")
+        return db.execute(query, (start.timestamp(), end.timestamp())).fetchall()
+
+    # Memories
+
+    def save_memory(self, user_id, entries, summary):
+        self._pending_memories[user_id] = (json.dumps(entries), summary)
+        self._schedule_flush()
+
+    def delete_memory(self, user_id):
+        self._pending_memories[user_id] = None
+        self._schedule_flush()
+
+    async def load_memory(self, user_id):
+        """Return (entries, summary) for a user, or None if nothing is stored"""
+        if user_id in self._pending_memories:
+            pending = self._pending_memories[user_id]
+            return None if pending is None else (json.loads(pending[0]), pending[1])
+        row = await self._run(self._select_memory, user_id)
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _select_memory(self, user_id):
+        return self._connect().execute(
+            "SELECT entries, summary FROM memories WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+    # Write-behind flushing
+
+    def _schedule_flush(self):
+        if self._closed:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Keeps going while there is something pending, which covers writes made while a
+        # flush was in flight and batches put back after a failed write
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._pending_memories and not self._pending_reminders:
+                return
+
+    async def flush(self):
+        """Commit every pending write now. If that fails, the writes stay pending and are retried"""
+        if not self._pending_memories and not self._pending_reminders:
+            return
+        memories, self._pending_memories = self._pending_memories, {}
+        reminders, self._pending_reminders = self._pending_reminders, {}
+        # Shielded so a batch is still committed, or put back, if close() cancels the flush task
+        self._commit_task = asyncio.ensure_future(self._commit(memories, reminders))
+        await asyncio.shield(self._commit_task)
+
+    async def _commit(self, memories, reminders):
+        try:
+            await self._run(self._write, memories, reminders)
+        except Exception as e:
+            logger.error(f"Error saving bot state: {e}")
+            # Put the batch back without overwriting anything written for the same key since
+            for user_id, value in memories.items():
+                self._pending_memories.setdefault(user_id, value)
+            for reminder_id, reminder in reminders.items():
+                self._pending_reminders.setdefault(reminder_id, reminder)
+            self._schedule_flush()
+
+    def _write(self, memories, reminders):
+        db = self._connect()
+        with db:
+            for user_id, value in memories.items():
+                if value is None:
+                    db.execute("DELETE FROM memories WHERE user_id = ?", (user_id,))
+                else:
+                    db.execute(
+                        "INSERT OR REPLACE INTO memories (user_id, entries, summary) VALUES (?, ?, ?)",
+                        (user_id, value[0], value[1]),
+                    )
+            for reminder_id, reminder in reminders.items():
+                if reminder is None:
+                    db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+                else:
+                    db.execute(
+                        "INSERT OR REPLACE INTO reminders (id, user_id, channel_id, message, due_time) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (reminder_id, reminder['user_id'], reminder['channel_id'], reminder['message'],
+                         reminder['due_time'].timestamp()),
+                    )
+
+    async def close(self):
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._commit_task is not None:
+            await self._commit_task
+        await self.flush()
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agent import MistralAgent
+from ratelimit import TokenBucket
+from response_cache import ResponseCache
+
+
+class FakeChat:
+    """Stands in for client.chat: reply(model, messages) gives each completion's text"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def complete_async(self, model, messages, response_format=None):
+        self.calls.append(model)
+        content = await self.reply(model, messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+
+@pytest.fixture
+def make_agent():
+    """Build a MistralAgent whose completions come from reply, with no rate limit and a memory-only cache"""
+    agents = []
+
+    def make(reply):
+        agent = MistralAgent()
+        agent.cache.close()
+        agent.cache = ResponseCache(None)
+        agent.request_bucket = TokenBucket(1000, 1000)
+        agent.client = SimpleNamespace(chat=FakeChat(reply))
+        agents.append(agent)
+        return agent
+
+    yield make
+    for agent in agents:
+        agent.cache.close()
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from agent import MODEL_TIERS, ROLE_TIERS, parse_role_tiers
+
+
+def test_parse_role_tiers_strips_and_validates():
+    assert parse_role_tiers(" Search = small , Critic=large,ignored") == {"Search": "small", "Critic": "large"}
+    with pytest.raises(ValueError, match="tiny"):
+        parse_role_tiers("Search=tiny")
+
+
+def test_roles_are_routed_to_their_tier(make_agent):
+    async def reply(model, messages):
+        return "ok"
+
+    async def run():
+        agent = make_agent(reply)
+        await agent.complete([{"role": "user", "content": "hi"}], role="Search")
+        await agent.complete([{"role": "user", "content": "hi"}], role="Brainstormer")
+        await agent.close()
+        return agent.client.chat.calls
+
+    assert ROLE_TIERS["Search"] == "small"
+    assert asyncio.run(run()) == [MODEL_TIERS["small"], MODEL_TIERS["large"]]
+
+
+def test_invalid_small_model_reply_escalates_to_the_large_model(make_agent):
+    async def reply(model, messages):
+        return "DO_SEARCH:" if model == MODEL_TIERS["small"] else "DO_SEARCH: planning"
+
+    async def run():
+        agent = make_agent(reply)
+        response = await agent.complete([{"role": "user", "content": "hi"}], role="Search",
+                                        validate=lambda text: bool(text.split("DO_SEARCH:")[1].strip()))
+        await agent.close()
+        return response, agent.client.chat.calls
+
+    response, calls = asyncio.run(run())
+    assert response == "DO_SEARCH: planning"
+    assert calls == [MODEL_TIERS["small"], MODEL_TIERS["large"]]
+
+
+def test_valid_small_model_reply_is_not_escalated(make_agent):
+    async def reply(model, messages):
+        return "direct answer"
+
+    async def run():
+        agent = make_agent(reply)
+        response = await agent.complete([{"role": "user", "content": "hi"}], role="Search", validate=bool)
+        await agent.close()
+        return response, agent.client.chat.calls
+
+    assert asyncio.run(run()) == ("direct answer", [MODEL_TIERS["small"]])
+
+
+def test_invalid_replies_are_not_cached(make_agent):
+    replies = iter(["", "second"])
+
+    async def reply(model, messages):
+        return next(replies)
+
+    async def run():
+        agent = make_agent(reply)
+        messages = [{"role": "user", "content": "hi"}]
+        first = await agent.complete(messages, role="Critic", use_cache=True, validate=bool)
+        second = await agent.complete(messages, role="Critic", use_cache=True, validate=bool)
+        third = await agent.complete(messages, role="Critic", use_cache=True, validate=bool)
+        await agent.close()
+        return first, second, third, len(agent.client.chat.calls)
+
+    assert asyncio.run(run()) == ("", "second", "second", 2)
@@ -0,0 +1,29 @@
+import json
+
+from batch import percentile, read_questions
+
+
+def test_read_questions_defaults_and_error_records(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"id": "q1", "question": "Plan a project?", "search": True}),
+        "",
+        json.dumps("Just a string question"),
+        "not json",
+        json.dumps({"question": ""}),
+        json.dumps(["a", "list"]),
+    ]) + "\n", encoding="utf-8")
+
+    items = list(read_questions(path, use_search=False))
+    assert items[0] == ({"id": "q1", "question": "Plan a project?", "search": True, "line": 1}, None)
+    assert items[1] == ({"question": "Just a string question", "id": 3, "search": False, "line": 3}, None)
+    errors = items[2:]
+    assert [item for item, _ in errors] == [{"id": 4}, {"id": 5}, {"id": 6}]
+    assert all(error.startswith(f"Invalid line {item['id']}:") for item, error in errors)
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile([7], 99) == 7
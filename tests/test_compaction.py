@@ -0,0 +1,73 @@
+import asyncio
+
+from compaction import compact_log, extractive_summary
+from prompts import PromptBuilder
+
+
+def turn(role, n):
+    return f"{role}: Point number {n} is important. " + "Further detail follows here. " * 20
+
+
+def conversation(iterations=4):
+    log = PromptBuilder(["User: How should we plan the project?"])
+    for n in range(iterations):
+        for role in ("Brainstormer", "Critic", "Synthesizer", "Moderator"):
+            log.append(turn(role, n))
+    return log
+
+
+def test_under_budget_is_left_alone():
+    log = conversation(1)
+    before = list(log)
+    assert not asyncio.run(compact_log(log, budget=log.tokens))
+    assert list(log) == before
+
+
+def test_over_budget_keeps_question_and_recent_turns():
+    log = conversation()
+    recent = list(log)[-2:]
+    budget = log.tokens // 3
+
+    async def summarize(previous, turns):
+        return f"{len(turns)} turns folded."
+
+    assert asyncio.run(compact_log(log, summarize, budget=budget))
+    entries = list(log)
+    assert entries[0] == "User: How should we plan the project?"
+    assert entries[1].startswith("Summary: ") and "turns folded." in entries[1]
+    assert entries[-2:] == recent
+    assert log.tokens <= budget
+
+
+def test_failed_summarizer_falls_back_to_extractive_summary():
+    log = conversation()
+
+    async def summarize(previous, turns):
+        raise RuntimeError("model unavailable")
+
+    assert asyncio.run(compact_log(log, summarize, budget=log.tokens // 3))
+    summary = next(entry for entry in log if entry.startswith("Summary:"))
+    assert "Point number 0 is important." in summary
+
+
+def test_summary_is_carried_into_the_next_compaction():
+    log = conversation()
+    seen = []
+
+    async def summarize(previous, turns):
+        seen.append(previous)
+        return f"summary {len(seen)}."
+
+    budget = log.tokens // 3
+    asyncio.run(compact_log(log, summarize, budget=budget))
+    for n in range(4, 8):
+        log.append(turn("Brainstormer", n))
+    asyncio.run(compact_log(log, summarize, budget=budget))
+    assert seen == ["", "summary 1."]
+    assert sum(1 for entry in log if entry.startswith("Summary:")) == 1
+
+
+def test_extractive_summary_keeps_first_sentences_and_newest_words():
+    turns = ["Critic: The plan is late. It needs more people.", "Synthesizer: Hire two people! Then replan."]
+    assert extractive_summary("Earlier.", turns) == "Earlier. Critic: The plan is late. Synthesizer: Hire two people!"
+    assert extractive_summary("Earlier.", turns, max_words=4) == "Synthesizer: Hire two people!"
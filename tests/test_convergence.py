@@ -0,0 +1,30 @@
+import pytest
+
+from convergence import ConvergenceDetector, cosine_similarity, stem, term_vector
+
+
+def test_stem_strips_common_inflections_only_from_longer_words():
+    assert stem("milestones") == stem("milestone") == "milestone"
+    assert stem("planning") == stem("planned") == "plann"
+    assert stem("bus") == "bus"
+
+
+def test_cosine_similarity():
+    vector = term_vector("weekly milestones and risk reviews")
+    assert cosine_similarity(vector, vector) == pytest.approx(1.0)
+    assert cosine_similarity(vector, term_vector("lunch menu")) == 0.0
+    assert cosine_similarity({}, vector) == 0.0
+
+
+def test_first_answer_never_converges():
+    detector = ConvergenceDetector(threshold=0.1)
+    assert not detector.observe("Set weekly milestones and review risks.")
+    assert detector.similarity == 0.0
+
+
+def test_repeated_answer_converges_and_a_new_direction_does_not():
+    detector = ConvergenceDetector(threshold=0.7)
+    detector.observe("Set weekly milestones, review the risks with the team and publish a shared plan.")
+    assert detector.observe("Publish a shared plan, set weekly milestone reviews and review risks with the team.")
+    assert not detector.observe("Hire a contractor to build the mobile app in a new language.")
+    assert detector.similarity < 0.7
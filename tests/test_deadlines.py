@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from agent import DeadlineExceeded
+from deadlines import Deadline, HedgePolicy, deadline_scope, effective_deadline
+
+
+def test_inner_scope_can_only_shorten_the_deadline():
+    with deadline_scope(10) as outer:
+        assert effective_deadline(60) is outer
+        with deadline_scope(1) as inner:
+            assert inner is not outer
+            assert inner.remaining() <= 1
+        with deadline_scope(60) as longer:
+            assert longer is outer
+    assert effective_deadline(5).remaining() > 4
+
+
+def test_deadline_expires():
+    deadline = Deadline(0)
+    assert deadline.expired
+    assert deadline.remaining() == 0.0
+
+
+def test_hedge_policy_waits_for_samples_then_uses_the_percentile():
+    policy = HedgePolicy(percentile="90", budget=0.5, min_samples=10, window=100)
+    assert policy.delay("Critic") is None
+    for i in range(10):
+        policy.observe("Critic", float(i + 1))
+    delay = policy.delay("Critic")
+    assert 10.0 <= delay <= 11.0
+    assert HedgePolicy(percentile="").delay("Critic") is None
+
+
+def test_hedge_budget_limits_duplicates():
+    policy = HedgePolicy(percentile="50", budget=0.1, window=20)
+    assert policy.try_acquire()
+    assert not policy.try_acquire()
+    # Every request adds a tenth of a hedge to the budget
+    for _ in range(11):
+        policy.delay("Critic")
+    assert policy.try_acquire()
+
+
+def test_call_past_its_deadline_raises(make_agent):
+    async def reply(model, messages):
+        await asyncio.sleep(1)
+        return "late"
+
+    async def run():
+        agent = make_agent(reply)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await agent.complete([{"role": "user", "content": "hi"}], role="Critic", timeout=0.05)
+            # The session's deadline applies even when the call's own timeout is longer
+            with deadline_scope(0.05):
+                with pytest.raises(DeadlineExceeded):
+                    await agent.complete([{"role": "user", "content": "hi"}], role="Critic", timeout=10)
+        finally:
+            await agent.close()
+
+    asyncio.run(run())
+
+
+def test_hedged_request_wins_and_the_slow_one_is_cancelled(make_agent):
+    async def run():
+        agent = make_agent(None)
+        agent.hedging = HedgePolicy(percentile="50", budget=1.0, min_samples=1)
+        agent.hedging.observe("key", 0.01)
+        attempts = []
+        cancelled = []
+
+        async def attempt(sent):
+            number = len(attempts)
+            attempts.append(number)
+            sent.set()
+            try:
+                await asyncio.sleep(1 if number == 0 else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(number)
+                raise
+            return f"attempt {number}"
+
+        result = await agent._hedged("Critic", "key", attempt)
+        await asyncio.sleep(0)
+        await agent.close()
+        return result, attempts, cancelled
+
+    assert asyncio.run(run()) == ("attempt 1", [0, 1], [0])
+
+
+def test_unused_finished_results_are_discarded(make_agent):
+    async def run():
+        agent = make_agent(None)
+        agent.hedging = HedgePolicy(percentile="50", budget=1.0, min_samples=1)
+        agent.hedging.observe("key", 0.01)
+        release = asyncio.Event()
+        attempts = []
+        discarded = []
+
+        async def attempt(sent):
+            number = len(attempts)
+            attempts.append(number)
+            sent.set()
+            # The hedge releases both, so they finish together and only one result is used
+            if number == 1:
+                release.set()
+            await release.wait()
+            return f"attempt {number}"
+
+        async def discard(value):
+            discarded.append(value)
+
+        result = await agent._hedged("Critic", "key", attempt, discard=discard)
+        await agent.close()
+        return result, discarded
+
+    assert asyncio.run(run()) == ("attempt 0", ["attempt 1"])
+
+
+def test_all_attempts_failing_reports_the_first_error(make_agent):
+    async def run():
+        agent = make_agent(None)
+        agent.hedging = HedgePolicy(percentile="50", budget=1.0, min_samples=1)
+        agent.hedging.observe("key", 0.01)
+        count = []
+
+        async def attempt(sent):
+            count.append(1)
+            sent.set()
+            await asyncio.sleep(0.03 if len(count) == 1 else 0.0)
+            raise RuntimeError(f"attempt {len(count)}")
+
+        try:
+            with pytest.raises(RuntimeError, match="attempt"):
+                await agent._hedged("Critic", "key", attempt)
+        finally:
+            await agent.close()
+
+    asyncio.run(run())
@@ -0,0 +1,196 @@
+import asyncio
+import gc
+
+import metrics
+from discord_output import CODE_FENCE, DISCORD_MESSAGE_LIMIT, ChannelSender, StreamRenderer, _senders, sender_for, split_message
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None):
+        self.channel.calls.append(("edit", content))
+        self.content = content
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = []
+        self.calls = []
+
+    async def send(self, content):
+        await asyncio.sleep(0)
+        self.calls.append(("send", content))
+        message = FakeMessage(self, content)
+        self.messages.append(message)
+        return message
+
+
+def unpaced(channel):
+    return ChannelSender(channel, rate_limit=1000, rate_period=1.0, burst=100)
+
+
+def test_split_message_fits_limit_and_keeps_text():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 80 for i in range(30))
+    parts = split_message(text)
+    assert len(parts) > 1
+    assert all(len(part) <= DISCORD_MESSAGE_LIMIT for part in parts)
+    assert "".join(parts) == text
+
+
+def test_split_message_short_text_is_one_part():
+    assert split_message("hello") == ["hello"]
+
+
+def test_split_message_reopens_code_fences():
+    text = "Intro\n" + CODE_FENCE + "python\n" + "x = 1\n" * 600 + CODE_FENCE
+    parts = split_message(text)
+    assert len(parts) > 1
+    for part in parts:
+        assert part.count(CODE_FENCE) % 2 == 0
+        assert len(part) <= DISCORD_MESSAGE_LIMIT
+    assert parts[1].startswith(CODE_FENCE)
+
+
+def test_channel_sender_keeps_order_and_applies_edits():
+    async def run():
+        channel = FakeChannel()
+        sender = unpaced(channel)
+        first = sender.send("one")
+        sender.send("two")
+        sender.edit(first, "one edited")
+        sender.send("three")
+        await sender.drain()
+        return channel
+
+    channel = asyncio.run(run())
+    text = "\n".join(message.content for message in channel.messages)
+    assert text.index("one edited") < text.index("two") < text.index("three")
+
+
+def test_channel_sender_splits_long_sends():
+    async def run():
+        channel = FakeChannel()
+        sender = unpaced(channel)
+        sender.send("word " * 1000)
+        await sender.drain()
+        return channel
+
+    channel = asyncio.run(run())
+    assert len(channel.messages) == 3
+    assert all(len(message.content) <= DISCORD_MESSAGE_LIMIT for message in channel.messages)
+
+
+def test_channel_sender_coalesces_only_within_an_origin():
+    async def run():
+        channel = FakeChannel()
+        sender = ChannelSender(channel, rate_limit=3, rate_period=0.3, burst=1)
+        # The first send takes the only token, so everything after it waits and can coalesce
+        sender.send("start", "a")
+        await asyncio.sleep(0.01)
+        for i in range(3):
+            sender.send(f"a{i}", "a")
+            sender.send(f"b{i}", "b")
+            sender.send(f"n{i}")
+        await sender.drain()
+        return channel
+
+    channel = asyncio.run(run())
+    contents = [message.content for message in channel.messages]
+    assert contents[:3] == ["start", "a0\na1\na2", "b0\nb1\nb2"]
+    assert contents[3:] == ["n0", "n1", "n2"]
+
+
+def test_send_returns_before_discord_is_called():
+    async def run():
+        channel = FakeChannel()
+        sender = unpaced(channel)
+        block = sender.send("hello")
+        sent_before = list(channel.calls)
+        message = await block
+        await sender.drain()
+        return sent_before, message
+
+    sent_before, message = asyncio.run(run())
+    assert sent_before == []
+    assert message.content == "hello"
+
+
+def test_failed_sends_resolve_to_none_and_later_output_still_goes_out():
+    class BrokenOnce(FakeChannel):
+        async def send(self, content):
+            if not self.calls:
+                self.calls.append(("failed", content))
+                raise RuntimeError("Discord unavailable")
+            return await super().send(content)
+
+    async def run():
+        channel = BrokenOnce()
+        sender = unpaced(channel)
+        first = sender.send("lost")
+        await first
+        second = sender.send("kept")
+        await sender.drain()
+        return await first, await second
+
+    first, second = asyncio.run(run())
+    assert first is None
+    assert second.content == "kept"
+
+
+def test_stream_renderer_continues_long_responses_in_new_messages():
+    async def run():
+        channel = FakeChannel()
+        sender = unpaced(channel)
+        renderer = StreamRenderer(sender, "**Agent:** ", footer=" (done)")
+        text = "".join(f"Sentence number {i} of the answer. " for i in range(200))
+        for i in range(0, len(text), 50):
+            renderer.feed(text[i:i + 50])
+        renderer.flush(final=True)
+        await sender.drain()
+        return text, [message.content for message in channel.messages]
+
+    text, contents = asyncio.run(run())
+    assert len(contents) > 1
+    assert all(len(content) <= DISCORD_MESSAGE_LIMIT for content in contents)
+    assert contents[0].startswith("**Agent:** ")
+    assert contents[-1].endswith(" (done)")
+    assert "".join(contents)[len("**Agent:** "):-len(" (done)")] == text
+
+
+def test_channel_sender_records_spans_in_the_queuing_trace():
+    async def session(sender, name, delay):
+        await asyncio.sleep(delay)
+        with metrics.tracing() as trace:
+            block = sender.send(name, name)
+            await block
+            sender.edit(block, name + " edited")
+            await sender.drain()
+        return [span[1]["operation"] for span in trace.spans]
+
+    async def run():
+        sender = unpaced(FakeChannel())
+        return await asyncio.gather(session(sender, "a", 0), session(sender, "b", 0.001))
+
+    assert asyncio.run(run()) == [["send", "edit"], ["send", "edit"]]
+
+
+def test_idle_senders_are_not_kept():
+    async def run():
+        channel = FakeChannel()
+        channel.id = 1
+        sender = sender_for(channel, "origin")
+        sender.send("hello")
+        del sender
+        gc.collect()
+        # Still sending, so a second lookup gets the same queue
+        assert 1 in _senders
+        await sender_for(channel).drain()
+        gc.collect()
+        return channel
+
+    channel = asyncio.run(run())
+    assert [message.content for message in channel.messages] == ["hello"]
+    assert 1 not in _senders
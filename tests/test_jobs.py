@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from jobs import JobQueue, JobQueueFull
+
+
+def test_jobs_run_in_fair_order_and_deduplicate():
+    async def run():
+        queue = JobQueue(max_running=1, max_running_per_user=1)
+        started = []
+        release = asyncio.Event()
+
+        def job(name):
+            async def factory():
+                started.append(name)
+                await release.wait()
+                return name
+            return factory
+
+        first, _ = queue.submit(1, "a1", job("a1"))
+        queue.submit(1, "a2", job("a2"))
+        queue.submit(2, "b1", job("b1"))
+        same, is_new = queue.submit(1, "a1", job("duplicate"))
+        assert same is first and not is_new
+        await asyncio.sleep(0)
+        release.set()
+        results = [await queue.wait(job) for job in queue.user_jobs(1) + queue.user_jobs(2)]
+        while len(queue) or queue._running:
+            await asyncio.sleep(0)
+        return started, results
+
+    started, results = asyncio.run(run())
+    # The second user's first job goes ahead of the first user's second job
+    assert started == ["a1", "b1", "a2"]
+    assert results == ["a1", "a2", "b1"]
+
+
+def test_submit_enforces_limits():
+    async def run():
+        queue = JobQueue(max_running=0, max_queued=2, max_per_user=2)
+
+        async def factory():
+            return None
+
+        queue.submit(1, "a1", factory)
+        queue.submit(1, "a2", factory)
+        with pytest.raises(JobQueueFull):
+            queue.submit(1, "a3", factory)
+        with pytest.raises(JobQueueFull):
+            queue.submit(2, "b1", factory)
+
+    asyncio.run(run())
+
+
+def test_cancelled_queued_jobs_free_their_place():
+    async def run():
+        queue = JobQueue(max_running=0, max_queued=2)
+
+        async def factory():
+            return None
+
+        queue.submit(1, "a1", factory)
+        late, _ = queue.submit(2, "b1", factory)
+        assert queue.position(late) == 2
+        assert queue.cancel_user(1) == 1
+        assert len(queue) == 1
+        assert queue.position(late) == 1
+        queue.submit(3, "c1", factory)
+        assert len(queue) == 2
+
+    asyncio.run(run())
+
+
+def test_cancelling_a_running_job_cancels_its_task():
+    async def run():
+        queue = JobQueue(max_running=1)
+
+        async def factory():
+            await asyncio.sleep(10)
+
+        job, _ = queue.submit(1, "a1", factory)
+        await asyncio.sleep(0)
+        assert job.running
+        queue.cancel_user(1)
+        with pytest.raises(asyncio.CancelledError):
+            await queue.wait(job)
+        return queue.user_jobs(1)
+
+    assert asyncio.run(run()) == []
+
+
+def test_cancelled_running_job_frees_its_key_before_it_finishes():
+    async def run():
+        queue = JobQueue(max_running=2)
+        stopping = asyncio.Event()
+
+        async def slow_to_stop():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                await stopping.wait()
+                raise
+
+        async def factory():
+            return "again"
+
+        job, _ = queue.submit(1, "a1", slow_to_stop)
+        await asyncio.sleep(0)
+        assert queue.cancel_user(1) == 1
+        await asyncio.sleep(0)
+        assert job.running and job.cancelled
+        assert queue.user_jobs(1) == []
+        # Still winding down, but asking again starts a new job rather than joining it
+        retry, is_new = queue.submit(1, "a1", factory)
+        assert is_new and retry is not job
+        stopping.set()
+        with pytest.raises(asyncio.CancelledError):
+            await queue.wait(job)
+        # The old job finishing must not drop the new one's key
+        assert queue.user_jobs(1) == [retry]
+        return await queue.wait(retry)
+
+    assert asyncio.run(run()) == "again"
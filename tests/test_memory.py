@@ -0,0 +1,48 @@
+import time
+
+from memory import MemoryStore
+
+
+def test_keeps_at_most_max_entries():
+    store = MemoryStore(max_entries=3)
+    for n in range(5):
+        store.add(1, "User", f"message {n}")
+    assert store.get(1) == ["User: message 2", "User: message 3", "User: message 4"]
+
+
+def test_dropped_turns_fold_into_summary_when_compacting():
+    store = MemoryStore(max_entries=2, compact=True)
+    store.add(1, "User", "First question. With detail.")
+    store.add(1, "Assistant", "First answer.")
+    store.add(1, "User", "Second question.")
+    log = store.get(1)
+    assert log[0] == "Summary of earlier conversation: User: First question."
+    assert log[1:] == ["Assistant: First answer.", "User: Second question."]
+
+
+def test_least_recently_used_user_is_evicted_over_the_total_cap():
+    store = MemoryStore(max_total_tokens=30)
+    store.add(1, "User", "a fairly long message from the first user")
+    store.add(2, "User", "a fairly long message from the second user")
+    assert 1 in store and 2 in store
+    store.get(1)
+    store.add(3, "User", "a fairly long message from the third user")
+    assert 1 in store and 3 in store
+    assert 2 not in store
+
+
+def test_idle_users_are_evicted():
+    store = MemoryStore(idle_timeout=60)
+    store.add(1, "User", "hello")
+    store._users[1].last_used = time.monotonic() - 120
+    store.add(2, "User", "hello")
+    assert 1 not in store
+    assert len(store) == 1
+
+
+def test_clear():
+    store = MemoryStore()
+    store.add(1, "User", "hello")
+    assert store.clear(1)
+    assert not store.clear(1)
+    assert store.get(1) == []
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import metrics
+
+
+def test_registry_renders_prometheus_text():
+    registry = metrics.Registry()
+    requests = registry.counter("test_requests_total", "Requests")
+    latency = registry.histogram("test_seconds", "Latency", buckets=(0.1, 1))
+    registry.gauge("test_depth", "Depth", fn=lambda: 3)
+    requests.inc(role="Critic")
+    requests.inc(2, role="Critic")
+    latency.observe(0.5, role="Critic")
+
+    text = registry.render()
+    assert 'test_requests_total{role="Critic"} 3' in text
+    assert 'test_seconds_bucket{role="Critic",le="0.1"} 0' in text
+    assert 'test_seconds_bucket{role="Critic",le="1"} 1' in text
+    assert 'test_seconds_count{role="Critic"} 1' in text
+    assert "test_depth 3" in text
+    assert latency.summary(role="Critic") == (1, 0.5)
+    assert latency.summary(role="Moderator") == (0, 0.0)
+
+
+def test_timed_and_usage_are_recorded_in_the_active_trace():
+    histogram = metrics.Registry().histogram("test_step_seconds", "Step")
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+    with metrics.tracing() as trace:
+        with metrics.timed(histogram, step="one"):
+            pass
+        metrics.record_usage(usage, role="Critic")
+    with metrics.timed(histogram, step="untraced"):
+        pass
+
+    assert [(span[0], span[1]) for span in trace.spans] == [("test_step_seconds", {"step": "one"})]
+    assert trace.tokens == {"prompt": 120, "completion": 30}
+    assert histogram.summary(step="untraced")[0] == 1
+    assert "test_step_seconds step=one" in trace.format()
+
+
+def test_tracing_can_add_to_an_existing_trace():
+    histogram = metrics.Registry().histogram("test_step_seconds", "Step")
+    with metrics.tracing() as trace:
+        pass
+    with metrics.tracing(trace):
+        assert metrics.current_trace() is trace
+        with metrics.timed(histogram):
+            pass
+    assert metrics.current_trace() is None
+    assert len(trace.spans) == 1
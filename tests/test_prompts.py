@@ -0,0 +1,68 @@
+from prompts import PromptBuilder, is_valid_moderator_decision, parse_moderator_decision
+
+
+def test_prompt_builder_alternates_roles():
+    log = PromptBuilder(["User: question"])
+    log.append("Brainstormer: idea")
+    log.append("Critic: flaw")
+    messages = log.messages("Critic", 1, 3)
+    roles = [message["role"] for message in messages]
+    assert roles == ["system", "user", "assistant", "user"]
+    assert messages[1]["content"] == "User: question\nBrainstormer: idea"
+    assert messages[2]["content"] == "flaw"
+    assert messages[3]["content"].endswith("Critic:")
+
+
+def test_prompt_builder_reuses_its_prefix():
+    log = PromptBuilder(["User: question"])
+    first = log.messages("Brainstormer", 1, 3)
+    log.append("Brainstormer: idea")
+    log.append("Critic: flaw")
+    second = log.messages("Brainstormer", 2, 3)
+    assert second[0] is first[0]
+    assert [message["role"] for message in second] == ["system", "user", "assistant", "user"]
+    assert second[3]["content"].startswith("Critic: flaw\n")
+
+
+def test_prompt_builder_reset_rebuilds_history():
+    log = PromptBuilder(["User: question", "Brainstormer: idea"])
+    log.messages("Critic", 1, 3)
+    log.reset(["User: question", "Summary: short"])
+    messages = log.messages("Critic", 2, 3)
+    assert messages[1]["content"].startswith("User: question\nSummary: short\n")
+    assert "Brainstormer: idea" not in "".join(message["content"] for message in messages)
+    assert len(log) == 2
+
+
+def test_system_message_is_shared_between_conversations():
+    first = PromptBuilder(["User: one"]).messages("Critic", 1, 3)
+    second = PromptBuilder(["User: two"]).messages("Critic", 1, 3)
+    assert first[0] is second[0]
+
+
+def test_parse_moderator_decision_end():
+    decision = parse_moderator_decision('{"decision": "end", "thoughts": "done", "summary": "Answer."}')
+    assert decision.done
+    assert decision.thoughts == "done"
+    assert decision.summary == "Answer."
+
+
+def test_parse_moderator_decision_continue_in_code_fence():
+    response = '```json\n{"decision": " Continue ", "thoughts": "more"}\n```'
+    decision = parse_moderator_decision(response)
+    assert not decision.done
+    assert decision.summary == ""
+
+
+def test_parse_moderator_decision_rejects_invalid():
+    assert parse_moderator_decision("") is None
+    assert parse_moderator_decision("CONVO_OVER. SUMMARY: text") is None
+    assert parse_moderator_decision('{"decision": "maybe"}') is None
+    assert parse_moderator_decision('{"decision": "end",}') is None
+    assert parse_moderator_decision('["end"]') is None
+
+
+def test_ending_without_a_summary_is_not_a_valid_decision():
+    assert is_valid_moderator_decision('{"decision": "continue"}')
+    assert is_valid_moderator_decision('{"decision": "end", "summary": "Answer."}')
+    assert not is_valid_moderator_decision('{"decision": "end", "summary": ""}')
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from ratelimit import FairSemaphore, TokenBucket, backoff_delay
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        semaphore = FairSemaphore(1)
+        await semaphore.acquire("a")
+        waiter = asyncio.create_task(semaphore.acquire("b"))
+        await asyncio.sleep(0)
+        assert semaphore.waiting() == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert semaphore.waiting() == 0
+        semaphore.release()
+        return semaphore.active
+
+    assert asyncio.run(run()) == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def run():
+        semaphore = FairSemaphore(1)
+        await semaphore.acquire("a")
+        first = asyncio.create_task(semaphore.acquire("b"))
+        second = asyncio.create_task(semaphore.acquire("c"))
+        await asyncio.sleep(0)
+        # The slot goes to first, which is cancelled before it gets to run
+        semaphore.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+        assert semaphore.active == 1
+        semaphore.release()
+        return semaphore.active
+
+    assert asyncio.run(run()) == 0
+
+
+def test_waiters_are_served_round_robin_by_key():
+    async def run():
+        semaphore = FairSemaphore(1)
+        order = []
+
+        async def worker(key, n):
+            async with semaphore.slot(key):
+                order.append(f"{key}{n}")
+                await asyncio.sleep(0)
+
+        await semaphore.acquire("hold")
+        tasks = [asyncio.create_task(worker("a", n)) for n in range(3)]
+        tasks.append(asyncio.create_task(worker("b", 0)))
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Two tokens are there at once, the other two take 1/20s each
+    assert 0.08 <= asyncio.run(run()) < 0.3
+
+
+def test_token_bucket_pause_holds_every_caller():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        await asyncio.gather(bucket.acquire(), bucket.acquire())
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.1
+
+
+def test_backoff_delay_is_capped_and_honours_retry_after():
+    assert backoff_delay(3, 1.0, 30.0, retry_after=7) == 7
+    assert all(0 <= backoff_delay(10, 1.0, 5.0) <= 5.0 for _ in range(100))
@@ -0,0 +1,88 @@
+import asyncio
+
+from response_cache import ResponseCache, cache_key
+
+
+def messages(text):
+    return [{"role": "system", "content": "You are helpful."}, {"role": "user", "content": text}]
+
+
+def test_cache_key_ignores_whitespace_but_not_content():
+    key = cache_key("model", "Critic", messages("plan  a\nproject"))
+    assert key == cache_key("model", "Critic", messages("plan a project"))
+    assert key != cache_key("model", "Critic", messages("plan a party"))
+    assert key != cache_key("model", "Brainstormer", messages("plan a project"))
+    assert key != cache_key("other-model", "Critic", messages("plan a project"))
+
+
+def test_memory_tier_hits_and_lru_eviction():
+    async def run():
+        cache = ResponseCache(None, max_memory_entries=2)
+        await cache.put("a", "A")
+        await cache.put("b", "B")
+        assert await cache.get("a") == "A"
+        await cache.put("c", "C")
+        values = [await cache.get(key) for key in ("a", "b", "c")]
+        cache.close()
+        return values, cache.stats
+
+    values, stats = asyncio.run(run())
+    # "b" was least recently used when "c" went in
+    assert values == ["A", None, "C"]
+    assert stats == {"memory_hits": 3, "disk_hits": 0, "misses": 1}
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def write():
+        cache = ResponseCache(path)
+        await cache.put("key", "value")
+        cache.close()
+
+    async def read():
+        cache = ResponseCache(path)
+        first = await cache.get("key")
+        second = await cache.get("key")
+        cache.close()
+        return first, second, cache.stats
+
+    asyncio.run(write())
+    first, second, stats = asyncio.run(read())
+    assert first == second == "value"
+    # The disk hit is promoted to memory, so the second lookup doesn't touch disk
+    assert stats == {"memory_hits": 1, "disk_hits": 1, "misses": 0}
+
+
+def test_entries_expire(tmp_path):
+    async def run():
+        cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=0.05)
+        await cache.put("key", "value")
+        await asyncio.sleep(0.1)
+        value = await cache.get("key")
+        cache.close()
+        return value
+
+    assert asyncio.run(run()) is None
+
+
+def test_disk_tier_evicts_least_recently_used_past_its_size(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        # Room for about two 100 byte entries
+        cache = ResponseCache(path, max_memory_entries=1, max_disk_bytes=250)
+        await cache.put("a", "x" * 100)
+        await cache.put("b", "y" * 100)
+        await cache.get("a")
+        await cache.put("c", "z" * 100)
+        cache.close()
+
+        cache = ResponseCache(path)
+        values = {key: await cache.get(key) for key in ("a", "b", "c")}
+        cache.close()
+        return values
+
+    values = asyncio.run(run())
+    assert values["b"] is None
+    assert values["a"] == "x" * 100 and values["c"] == "z" * 100
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from loading_cache import LoadingCache
+from retrieval import BM25Index, extract_main_text, rank_passages, split_passages, tokenize
+
+
+def result(title, description, url="https://example.com"):
+    return SimpleNamespace(title=title, description=description, url=url)
+
+
+def test_extract_main_text_skips_page_chrome_and_short_blocks():
+    html = """
+    <html><head><style>p { color: red }</style><script>var x = "tracking code here";</script></head>
+    <body>
+      <nav>Home About Contact Pricing Blog Careers Login Signup</nav>
+      <h1>Planning</h1>
+      <p>Small teams plan projects best by agreeing on a short list of goals first.</p>
+      <p>Share &amp; review the risks with everyone before committing to any deadline.</p>
+      <footer>Copyright 2024 Example Corporation all rights reserved worldwide forever</footer>
+    </body></html>
+    """
+    assert extract_main_text(html).split("\n") == [
+        "Small teams plan projects best by agreeing on a short list of goals first.",
+        "Share & review the risks with everyone before committing to any deadline.",
+    ]
+
+
+def test_extract_main_text_survives_broken_html():
+    text = extract_main_text("<p>Unclosed paragraph with enough words to count as real content <b")
+    assert text.startswith("Unclosed paragraph with enough words to count as real content")
+
+
+def test_tokenize_drops_stopwords_and_single_letters():
+    assert tokenize("How should a Team plan the 2025 project?") == ["team", "plan", "2025", "project"]
+
+
+def test_split_passages_keeps_whole_sentences():
+    text = " ".join(f"Sentence {i} has five words." for i in range(10))
+    passages = split_passages(text, max_words=12)
+    assert all(len(passage.split()) <= 12 for passage in passages)
+    assert " ".join(passages) == text
+
+
+def test_bm25_prefers_rare_terms_and_shorter_passages():
+    index = BM25Index([
+        "The project plan covers goals, risks and deadlines for the team.",
+        "The team met to discuss lunch options and the office party.",
+        "Risk review: list every risk, rate it and assign an owner before the deadline, "
+        "then review the risk register weekly with the whole team and all stakeholders involved.",
+        "Risk review.",
+    ])
+    ranked = [i for i, _ in index.top("risk review", 4)]
+    assert ranked[:2] == [3, 2]
+    assert 1 not in ranked
+    assert index.scores("unrelated words") == {}
+
+
+def test_bm25_on_no_passages():
+    assert BM25Index([]).top("anything", 3) == []
+
+
+def test_rank_passages_returns_relevant_sentences_from_pages():
+    results = [result("Planning guide", "How to plan.", "https://a"), result("Office news", "Lunch menu.", "https://b")]
+    pages = [
+        "Careful planning matters. Teams should run a risk review before deadlines. The weather was nice.",
+        "The cafeteria serves soup on Mondays and pasta on Fridays for everyone in the office.",
+    ]
+    evidence = rank_passages("risk review before deadlines", results, pages)
+    assert evidence[0].source == 1
+    assert evidence[0].url == "https://a"
+    assert evidence[0].text == "Teams should run a risk review before deadlines."
+    assert all("cafeteria" not in item.text for item in evidence)
+
+
+def test_rank_passages_skips_near_duplicates_and_respects_limits():
+    sentence = "Run a risk review with the whole team before every deadline."
+    results = [result(f"Copy {i}", "", f"https://{i}") for i in range(4)]
+    evidence = rank_passages("risk review deadline", results, [sentence] * 4, max_passages=3)
+    assert len(evidence) == 1
+    # Nothing fits in the token budget, so only the (empty) snippets are left
+    tight = rank_passages("risk review deadline", results, [sentence] * 4, max_passages=3, max_tokens=5)
+    assert [item.title for item in tight] == ["Copy 0", "Copy 1", "Copy 2"]
+    assert all(item.score == 0.0 for item in tight)
+
+
+def test_rank_passages_falls_back_to_snippets():
+    results = [result("First", "One."), result("Second", "Two.")]
+    evidence = rank_passages("zebra", results, ["", ""])
+    assert [item.text for item in evidence] == ["First. One.", "Second. Two."]
+    assert all(item.score == 0.0 for item in evidence)
+
+
+def test_loading_cache_merges_loads_and_honours_ttl():
+    async def run():
+        cache = LoadingCache(size=2, ttl=60)
+        calls = []
+
+        async def load(value, ttl=None):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value, ttl
+
+        first, merged_first = cache.load("a", lambda: load("A"))
+        second, merged_second = cache.load("a", lambda: load("A"))
+        assert (merged_first, merged_second) == (False, True)
+        assert await first == await second == "A"
+        assert cache.get("a") == "A"
+
+        await cache.load("short", lambda: load("S", ttl=0.01))[0]
+        await asyncio.sleep(0.02)
+        assert cache.get("short") is None
+        return calls
+
+    assert asyncio.run(run()) == ["A", "S"]
+
+
+def test_loading_cache_does_not_store_failures():
+    async def run():
+        cache = LoadingCache(size=2, ttl=60)
+
+        async def fail():
+            raise RuntimeError("down")
+
+        task, _ = cache.load("a", fail)
+        with pytest.raises(RuntimeError):
+            await task
+        return cache.get("a"), len(cache)
+
+    assert asyncio.run(run()) == (None, 0)
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from scheduler import ReminderScheduler
+from state_store import StateStore
+
+
+def reminder(seconds, message):
+    return {"user_id": 1, "channel_id": 2, "message": message, "due_time": datetime.now() + timedelta(seconds=seconds)}
+
+
+def test_reminders_are_delivered_in_due_order():
+    async def run():
+        delivered = []
+
+        async def deliver(item):
+            delivered.append(item["message"])
+
+        scheduler = ReminderScheduler(deliver)
+        scheduler.start()
+        scheduler.add(reminder(0.2, "later"))
+        scheduler.add(reminder(0.05, "sooner"))
+        assert len(scheduler) == 2
+        await asyncio.sleep(0.4)
+        await scheduler.stop()
+        return delivered, len(scheduler)
+
+    assert asyncio.run(run()) == (["sooner", "later"], 0)
+
+
+def test_adding_a_sooner_reminder_wakes_the_loop():
+    async def run():
+        delivered = []
+
+        async def deliver(item):
+            delivered.append(item["message"])
+
+        scheduler = ReminderScheduler(deliver)
+        scheduler.start()
+        scheduler.add(reminder(3600, "next hour"))
+        await asyncio.sleep(0.01)
+        scheduler.add(reminder(0.05, "soon"))
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        return delivered, len(scheduler)
+
+    assert asyncio.run(run()) == (["soon"], 1)
+
+
+def test_failed_delivery_does_not_stop_the_loop():
+    async def run():
+        delivered = []
+
+        async def deliver(item):
+            if item["message"] == "broken":
+                raise RuntimeError("channel gone")
+            delivered.append(item["message"])
+
+        scheduler = ReminderScheduler(deliver)
+        scheduler.start()
+        scheduler.add(reminder(0.02, "broken"))
+        scheduler.add(reminder(0.05, "fine"))
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        return delivered
+
+    assert asyncio.run(run()) == ["fine"]
+
+
+def test_stored_reminders_are_paged_in_by_window(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def save():
+        store = StateStore(path)
+        scheduler = ReminderScheduler(None, store=store)
+        scheduler.add(reminder(0.2, "first window"))
+        scheduler.add(reminder(0.7, "later window"))
+        scheduler.add(reminder(3600, "next hour"))
+        await store.close()
+
+    async def run():
+        store = StateStore(path)
+        delivered = []
+
+        async def deliver(item):
+            delivered.append(item["message"])
+
+        scheduler = ReminderScheduler(deliver, store=store, window=timedelta(seconds=0.4))
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        # Only the current window is in the heap, but every pending reminder is counted
+        assert len(scheduler._heap) == 1
+        assert len(scheduler) == 3
+        await asyncio.sleep(0.9)
+        await scheduler.stop()
+        await store.close()
+        return delivered, len(scheduler)
+
+    asyncio.run(save())
+    assert asyncio.run(run()) == (["first window", "later window"], 1)
+
+    async def restart():
+        store = StateStore(path)
+        scheduler = ReminderScheduler(None, store=store)
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        await store.close()
+        return len(scheduler)
+
+    assert asyncio.run(restart()) == 1
+
+
+def test_stop_keeps_undelivered_reminders_stored(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def run():
+        store = StateStore(path)
+
+        async def deliver(item):
+            await asyncio.sleep(10)
+
+        scheduler = ReminderScheduler(deliver, store=store)
+        scheduler.add(reminder(0, "in flight"))
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        await store.close()
+
+        store = StateStore(path)
+        stored = await store.load_reminders(None, datetime.now() + timedelta(hours=1))
+        await store.close()
+        return [item["message"] for item in stored]
+
+    assert asyncio.run(run()) == ["in flight"]
+
+
+def test_failed_delivery_keeps_the_reminder_stored(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def run():
+        store = StateStore(path)
+
+        async def deliver(item):
+            if item["message"] == "unsent":
+                raise RuntimeError("channel not found")
+
+        scheduler = ReminderScheduler(deliver, store=store)
+        scheduler.add(reminder(0, "unsent"))
+        scheduler.add(reminder(0, "sent"))
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        await store.close()
+
+        store = StateStore(path)
+        stored = await store.load_reminders(None, datetime.now() + timedelta(hours=1))
+        await store.close()
+        return [item["message"] for item in stored], len(scheduler)
+
+    assert asyncio.run(run()) == (["unsent"], 1)
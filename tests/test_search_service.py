@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from search_service import SearchService, normalize_query
+
+
+class Backend:
+    """Blocking fake search backend that counts its calls"""
+
+    def __init__(self, latency=0.05, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, num_results):
+        with self._lock:
+            self.calls.append(query)
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("search failed")
+        return [f"{query} result {i}" for i in range(num_results)]
+
+
+def test_normalize_query():
+    assert normalize_query("  Project   PLANNING ") == "project planning"
+
+
+def test_concurrent_identical_queries_share_one_lookup():
+    async def run():
+        backend = Backend()
+        service = SearchService(backend)
+        results = await asyncio.gather(*(service.search("Project planning", 3) for _ in range(5)),
+                                       service.search("project   PLANNING", 3))
+        service.shutdown()
+        return backend, service, results
+
+    backend, service, results = asyncio.run(run())
+    assert backend.calls == ["project planning"]
+    assert all(result == results[0] for result in results)
+    assert service.stats["misses"] == 1
+    assert service.stats["merged"] == 5
+
+
+def test_results_are_cached_until_the_ttl_expires():
+    async def run():
+        backend = Backend(latency=0)
+        service = SearchService(backend, ttl=0.1)
+        await service.search("query")
+        await service.search("query")
+        await asyncio.sleep(0.15)
+        await service.search("query")
+        service.shutdown()
+        return backend, service
+
+    backend, service = asyncio.run(run())
+    assert len(backend.calls) == 2
+    assert service.stats["hits"] == 1
+
+
+def test_least_recently_used_results_are_evicted():
+    async def run():
+        backend = Backend(latency=0)
+        service = SearchService(backend, cache_size=2)
+        for query in ("a", "b", "a", "c", "a", "b"):
+            await service.search(query)
+        service.shutdown()
+        return backend
+
+    # "b" was the least recently used when "c" came in, so only it is looked up again
+    assert asyncio.run(run()).calls == ["a", "b", "c", "b"]
+
+
+def test_failures_are_not_cached():
+    async def run():
+        backend = Backend(latency=0, fail=True)
+        service = SearchService(backend)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await service.search("query")
+        service.shutdown()
+        return backend, service
+
+    backend, service = asyncio.run(run())
+    assert len(backend.calls) == 2
+    assert service.stats["errors"] == 2
+
+
+def test_slow_lookups_time_out():
+    async def run():
+        service = SearchService(Backend(latency=0.3), timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await service.search("query")
+        service.shutdown()
+
+    asyncio.run(run())
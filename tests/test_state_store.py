@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from memory import MemoryStore
+from state_store import StateStore
+
+
+def test_memory_round_trips_through_the_store(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def write():
+        store = StateStore(path)
+        memories = MemoryStore(store=store)
+        memories.add(1, "User", "hello")
+        memories.add(1, "Assistant", "hi there")
+        memories.add(2, "User", "forget me")
+        memories.clear(2)
+        await store.close()
+
+    async def read():
+        store = StateStore(path)
+        memories = MemoryStore(store=store)
+        await memories.hydrate(1)
+        await memories.hydrate(2)
+        logs = memories.get(1), memories.get(2)
+        await store.close()
+        return logs
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == (["User: hello", "Assistant: hi there"], [])
+
+
+def test_hydrate_does_not_overwrite_newer_turns(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def run():
+        store = StateStore(path)
+        MemoryStore(store=store).add(1, "User", "stored")
+        await store.flush()
+
+        memories = MemoryStore(store=store)
+        memories.add(1, "User", "new")
+        await memories.hydrate(1)
+        log = memories.get(1)
+        await store.close()
+        return log
+
+    assert asyncio.run(run()) == ["User: new"]
+
+
+def test_pending_writes_are_visible_before_they_are_flushed(tmp_path):
+    async def run():
+        store = StateStore(str(tmp_path / "state.sqlite3"), flush_interval=60)
+        store.save_memory(1, ["User: hello"], "summary")
+        memory = await store.load_memory(1)
+        store.save_reminder({"id": "r1", "user_id": 1, "channel_id": 2, "message": "m",
+                             "due_time": datetime.now() + timedelta(minutes=5)})
+        reminders = await store.load_reminders(None, datetime.now() + timedelta(hours=1))
+        count = await store.count_reminders()
+        await store.close()
+        return memory, [reminder["id"] for reminder in reminders], count
+
+    assert asyncio.run(run()) == ((["User: hello"], "summary"), ["r1"], 1)
+
+
+def test_reminders_load_by_due_time_window(tmp_path):
+    async def run():
+        store = StateStore(str(tmp_path / "state.sqlite3"))
+        now = datetime.now()
+        for name, minutes in (("soon", 5), ("later", 90), ("tomorrow", 60 * 24)):
+            store.save_reminder({"id": name, "user_id": 1, "channel_id": 2, "message": name,
+                                 "due_time": now + timedelta(minutes=minutes)})
+        store.delete_reminder("tomorrow")
+        first = await store.load_reminders(None, now + timedelta(hours=1))
+        second = await store.load_reminders(now + timedelta(hours=1), now + timedelta(days=2))
+        await store.close()
+        return [r["id"] for r in first], [r["id"] for r in second]
+
+    assert asyncio.run(run()) == (["soon"], ["later"])
+
+
+def test_failed_flush_keeps_writes_pending_and_retries(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def run():
+        store = StateStore(path, flush_interval=0.01)
+        write = store._write
+        failures = []
+
+        def flaky_write(memories, reminders):
+            if not failures:
+                failures.append(memories)
+                raise OSError("disk full")
+            write(memories, reminders)
+
+        store._write = flaky_write
+        store.save_memory(1, ["User: first"], "")
+        store.save_memory(2, ["User: other"], "")
+        flushing = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+        # Saved while the failing batch is in flight, so it must win over the put back one
+        store.save_memory(1, ["User: newer"], "")
+        await flushing
+        await asyncio.sleep(0.1)
+        assert not store._pending_memories
+        await store.close()
+
+        store = StateStore(path)
+        loaded = await store.load_memory(1), await store.load_memory(2)
+        await store.close()
+        return failures, loaded
+
+    failures, loaded = asyncio.run(run())
+    assert len(failures) == 1
+    assert loaded == ((["User: newer"], ""), (["User: other"], ""))
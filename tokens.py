@@ -0,0 +1,53 @@
+import re
+
+# Mistral's tokenizer averages a little under 4 characters per token on English text
+CHARS_PER_TOKEN = 4
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Cheap local estimate of how many tokens text will use, without calling the tokenizer"""
+    if not text:
+        return 0
+    # Take the larger of a character based and a word based guess so code and
+    # punctuation heavy text isn't underestimated
+    return max(len(text) // CHARS_PER_TOKEN, len(_WORD_RE.findall(text))) + 1
+
+
+def truncate_to_tokens(text, max_tokens, marker=" [...]"):
+    """Cut text down to roughly max_tokens, ending on a word boundary"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(marker))
+    cut = text.rfind(" ", 0, limit)
+    if cut <= 0:
+        cut = limit
+    return text[:cut] + marker
+
+
+def split_sentences(text):
+    """Split text after sentence ending punctuation"""
+    return _SENTENCE_END_RE.split(text)
+
+
+def first_sentence(text):
+    """text up to the end of its first sentence"""
+    return _SENTENCE_END_RE.split(text, maxsplit=1)[0]
+
+
+def extend_summary(summary, texts, max_words=None, max_tokens=None):
+    """
+    Local extractive summary: summary followed by the first sentence of each of texts,
+    keeping only the newest words once it is over max_words words or max_tokens tokens
+    """
+    words = " ".join([summary, *(first_sentence(text) for text in texts)]).split()
+    if max_words is not None:
+        words = words[-max_words:]
+    if max_tokens is not None:
+        start = 0
+        while start < len(words) - 1 and estimate_tokens(" ".join(words[start:])) > max_tokens:
+            start += 1
+        words = words[start:]
+    return " ".join(words)